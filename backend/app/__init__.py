@@ -1,6 +1,14 @@
-"""Flask application factory"""
+"""Flask application factory
+
+The application is created on first access of ``app.app``, not when the package is imported, so
+modules of the package can be imported without database work. Under gunicorn with
+``preload_app`` (see ``gunicorn.conf.py``) it is created once in the master process and the
+workers share it copy-on-write, so they boot without touching the database.
+"""
 import logging
+import threading
 
+from app.commands import register_commands
 from app.database import close_db_session, init_db
 from config import config
 from flask import Flask, jsonify
@@ -24,7 +32,7 @@ def create_app():
             "details": str(error)
         }), 503
 
-    # Initialize database tables
+    # Apply pending migrations, or check the schema version (MIGRATE_ON_STARTUP)
     init_db()
 
     # Load configuration
@@ -45,12 +53,44 @@ def create_app():
              supports_credentials = True)
 
     flask_app.register_blueprint(api_bp, url_prefix='/api')
+    flask_app.teardown_appcontext(close_db_session)
+    register_commands(flask_app)
+
+    # Build the in-memory leaderboard of the active challenge before serving requests
+    if config.LIVE_LEADERBOARD_ENABLED:
+        from app.services import live  # pylint: disable=import-outside-toplevel
+
+        with flask_app.app_context():
+            try:
+                live.warm_up()
+            except SQLAlchemyError as e:
+                logger.warning("Live leaderboard not built at startup, it will be built on first request: %s", e)
+            finally:
+                close_db_session()
 
     return flask_app
 
 
-app = create_app()
-app.teardown_appcontext(close_db_session)
+_app: Flask | None = None
+_app_lock = threading.Lock()
+
+
+def get_app() -> Flask:
+    """Get the application, created on first use."""
+    global _app  # pylint: disable=global-statement
+
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+        return _app
+
+
+def __getattr__(name: str):
+    """Create the application lazily on access of ``app.app``, e.g. ``from app import app``."""
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    app.run()
+    get_app().run()
@@ -0,0 +1,84 @@
+"""HTTP caching helpers shared by the API routes."""
+import json
+
+from datetime import datetime
+
+from app.models.data_version import DataVersion
+from app.models.snapshot import Snapshot
+from config import config
+from flask import Response, jsonify, request
+
+
+def _variant(filters: dict[str, str | None]) -> str:
+    """Part of an ETag identifying the query filters of the request."""
+    return "-".join(f"{name}={value}" for name, value in sorted(filters.items()) if value)
+
+
+def versioned_etag(scope: str, data_version: DataVersion | None, filters: dict[str, str | None]) -> str:
+    """Build the ETag of a response computed from versioned data.
+
+    Args:
+        scope (str): Name of the data, e.g. "challenge-12".
+        data_version (DataVersion | None): Current version of the data, None if it never changed.
+        filters (dict[str, str | None]): Query filters of the request.
+    """
+    etag = f"{scope}-v{data_version.version if data_version else 0}"
+    return f"{etag}-{variant}" if (variant := _variant(filters)) else etag
+
+
+def with_validators(response: Response, etag: str, last_modified: datetime | None, weak: bool = True) -> Response:
+    """Attach ``ETag`` and ``Last-Modified`` headers, asking clients to revalidate before reuse."""
+    response.set_etag(etag, weak=weak)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+
+    return response
+
+
+def not_modified(etag: str, last_modified: datetime | None) -> Response | None:
+    """Answer a conditional GET with 304 when the client's copy is still current.
+
+    Args:
+        etag (str): The current ETag of the resource.
+        last_modified (datetime | None): When the resource last changed, if known.
+
+    Returns:
+        Response | None: An empty 304 response, or None when the resource must be sent.
+    """
+    if request.if_none_match:
+        matches = request.if_none_match.contains_weak(etag)
+    else:
+        matches = bool(last_modified and request.if_modified_since and
+                       last_modified.replace(microsecond=0) <= request.if_modified_since)
+
+    return with_validators(Response(status=304), etag, last_modified) if matches else None
+
+
+def snapshot_response(snapshot: Snapshot, filters: dict[str, str | None], predicate=None) -> Response:
+    """Serve a frozen snapshot with a strong ETag and a long Cache-Control.
+
+    Answers ``If-None-Match`` with 304 without touching the payload.
+
+    Args:
+        snapshot (Snapshot): The snapshot to serve.
+        filters (dict[str, str | None]): Query filters of the request, they are part of the ETag.
+        predicate (callable | None): Optional filter applied to the items of a list payload.
+
+    Returns:
+        Response: The JSON response, or an empty 304 response.
+    """
+    etag = f"{snapshot.etag}-{variant}" if (variant := _variant(filters)) else snapshot.etag
+
+    if request.if_none_match.contains(etag):    # type: ignore
+        response = Response(status=304)
+    else:
+        payload = json.loads(snapshot.payload)  # type: ignore
+        response = jsonify([item for item in payload if predicate(item)] if predicate else payload)
+
+    response.set_etag(etag)
+    response.last_modified = snapshot.created_at    # type: ignore
+    response.cache_control.public = True
+    response.cache_control.max_age = config.SNAPSHOT_MAX_AGE
+
+    return response
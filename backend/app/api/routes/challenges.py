@@ -1,13 +1,23 @@
 """This route handles individual challenges and their results."""
 from datetime import datetime, timezone
 
+import app.services.backfill as backfill_service
 import app.services.challenge as challenge_service
+import app.services.live as live_service
 import app.services.segment as segment_service
 
+from app.api.caching import not_modified, snapshot_response, versioned_etag, with_validators
 from app.api.routes import api_bp
+from app.auth import requires_admin
 from app.helpers import Gender, TimeSpan
+from app.services.broadcast import broadcaster
+from app.services.data_version import DataVersionRepository, challenge_version_key
+from app.services.jobs import BACKFILL_CHALLENGE, JobRepository
+from app.services.rate_limit import RateLimitDeferred
 from app.services.results import ResultService
-from flask import jsonify, request
+from app.services.snapshot import SnapshotRepository, challenge_results_key
+from config import config
+from flask import Response, current_app, jsonify, request
 
 
 @api_bp.post('/challenges')
@@ -20,7 +30,13 @@ def create_challenge():
 
     challenge_repo = challenge_service.ChallengeRepository()
 
-    if challenge_repo.add(data) is None:
+    try:
+        challenge = challenge_repo.add(data)
+    except RateLimitDeferred as e:
+        retry_after = max(int((e.retry_at - datetime.now(timezone.utc)).total_seconds()), 1)
+        return jsonify({"success": False, "error": "Strava rate limit reached, try again later"}), 429, {"Retry-After": str(retry_after)}
+
+    if challenge is None:
         return jsonify({"success": False, "error": "Failed to create challenge"}), 400
 
     return jsonify({"success": True, "message": "Challenge created successfully."}), 201
@@ -41,7 +57,9 @@ def get_challenges():
         return jsonify({"success": False, "error": "No challenges found"}), 404
     # Convert challenges to a list of dictionaries
 
-    segment_repo = segment_service.SegmentRepository()
+    segments = segment_service.SegmentRepository().get_many(
+        segment_id for challenge in challenges for segment_id in (challenge.sprint_segment_id, challenge.climb_segment_id)  # type: ignore
+    )
 
     response = []
 
@@ -49,12 +67,10 @@ def get_challenges():
         now = datetime.now(timezone.utc)
         time_span = TimeSpan(challenge.start_date, challenge.end_date)  # type: ignore
 
-        segments = segment_repo.get_for_challenge(challenge)
-
         segment_dicts = []
 
-        for segment, segment_type in zip(segments, ['sprint', 'climb']):
-            segment_dict = segment_service.SegmentRepository.to_dict(segment) if segment else {}
+        for segment_id, segment_type in zip([challenge.sprint_segment_id, challenge.climb_segment_id], ['sprint', 'climb']):
+            segment_dict = dict(segments.get(segment_id, {}))  # type: ignore
             segment_dict["type"] = segment_type
             segment_dicts.append(segment_dict)
 
@@ -81,12 +97,13 @@ def get_challenge_by_id(challenge_id):
     if not challenge:
         return jsonify({"success": False, "error": "Challenge not found"}), 404
 
-    segments = segment_service.SegmentRepository().get_for_challenge(challenge)
+    segment_ids = [challenge.sprint_segment_id, challenge.climb_segment_id]
+    segments = segment_service.SegmentRepository().get_many(segment_ids)  # type: ignore
 
     segment_dicts = []
 
-    for segment, segment_type in zip(segments, ['sprint', 'climb']):
-        segment_dict = segment_service.SegmentRepository.to_dict(segment) if segment else {}
+    for segment_id, segment_type in zip(segment_ids, ['sprint', 'climb']):
+        segment_dict = dict(segments.get(segment_id, {}))  # type: ignore
         segment_dict["type"] = segment_type
         segment_dicts.append(segment_dict)
 
@@ -105,6 +122,26 @@ def get_challenge_by_id(challenge_id):
     return jsonify(response), 200
 
 
+@api_bp.post('/challenges/<int:challenge_id>/backfill')
+@requires_admin
+def backfill_challenge(_admin, challenge_id):
+    """Import efforts of all athletes missed by the webhook into a challenge, in the background"""
+    if not challenge_service.ChallengeRepository().get_by_id(challenge_id):
+        return jsonify({"success": False, "error": "Challenge not found"}), 404
+
+    if config.JOB_QUEUE_ENABLED:
+        job_repo = JobRepository()
+        queued = job_repo.enqueue(BACKFILL_CHALLENGE, {"challenge_id": challenge_id}, dedup_key=f"backfill:{challenge_id}")
+        job_repo.session.commit()
+
+        if not queued:
+            return jsonify({"success": True, "message": f"Backfill of challenge {challenge_id} already queued."}), 202
+    elif not backfill_service.start_backfill(current_app._get_current_object(), challenge_id):  # type: ignore # pylint: disable=protected-access
+        return jsonify({"success": True, "message": f"Backfill of challenge {challenge_id} already running."}), 202
+
+    return jsonify({"success": True, "message": f"Backfill of challenge {challenge_id} started."}), 202
+
+
 @api_bp.get('/challenges/<int:challenge_id>/results')
 def get_challenge_results(challenge_id):
     """Get results for a specific challenge"""
@@ -118,18 +155,85 @@ def get_challenge_results(challenge_id):
     if gender and gender not in Gender.values():
         return jsonify({"success": False, "error": "Invalid or no gender"}), 400
 
+    filters = {"segment_type": segment_type, "gender": gender}
+
+    def result_filter(result: dict) -> bool:
+        return (not segment_type or result["segment_type"] == segment_type) and \
+               (not gender or result["athlete_gender"] == gender)
+
+    # Answer polls of unchanged results before querying any efforts
+    data_version = DataVersionRepository().get(challenge_version_key(challenge_id))
+    etag = versioned_etag(f"challenge-{challenge_id}", data_version, filters)
+    last_modified = data_version.updated_at if data_version else None
+
+    # Versions are only stored for existing challenges, an unknown one must not be answered with v0
+    if data_version is None and not challenge_service.ChallengeRepository().get_by_id(challenge_id):
+        return jsonify({"success": False, "error": "Challenge not found"}), 404
+
+    if response := not_modified(etag, last_modified):  # type: ignore
+        return response
+
+    segment_types = [segment_type] if segment_type else ['climb', 'sprint']
+    genders = [Gender(gender)] if gender else list(Gender)
+    version = data_version.version if data_version else 0
+
+    # Results of the active challenge are kept in memory, serve them without querying efforts
+    if config.LIVE_LEADERBOARD_ENABLED and (results := live_service.get_results(challenge_id, version, segment_types, genders)) is not None:  # type: ignore
+        return with_validators(jsonify(results), etag, last_modified), 200  # type: ignore
+
+    # Results of completed challenges are frozen, serve them without ranking
+    snapshot_repo = SnapshotRepository()
+    if snapshot := snapshot_repo.get(challenge_results_key(challenge_id)):
+        return snapshot_response(snapshot, filters, result_filter)
+
     try:
         result_service = ResultService(challenge_id)
         result_service.query_from_db()
     except ValueError as e:
         return jsonify({"success": False, "error": str(e)}), 404
 
-    segment_types = [segment_type] if segment_type else ['climb', 'sprint']
-    genders = [gender] if gender else Gender.values()
+    if result_service.is_completed:
+        results = [
+            result
+            for segment_type_ in ['climb', 'sprint']
+            for gender_ in Gender.values()
+            for result in result_service.yield_results(segment_type_, Gender(gender_))
+        ]
+        snapshot = snapshot_repo.save(challenge_results_key(challenge_id), results)
+        return snapshot_response(snapshot, filters, result_filter)
+
+    if config.LIVE_LEADERBOARD_ENABLED and result_service.is_active:
+        live_service.store_leaderboard(result_service, version)  # type: ignore
 
     results = []
     for segment_type in segment_types:
         for gender in genders:
-            results.extend(result_service.yield_results(segment_type, Gender(gender)))
+            results.extend(result_service.yield_results(segment_type, gender))
+
+    return with_validators(jsonify(results), etag, last_modified), 200  # type: ignore
+
+
+@api_bp.get('/challenges/<int:challenge_id>/results/stream')
+def stream_challenge_results(challenge_id):
+    """Stream rank changes of a challenge as server-sent events.
+
+    A ``delta`` event lists the changed results after each ingested effort, a ``reset`` event asks the
+    client to reload the results. Event IDs are the data versions of the challenge. The stream holds
+    no database session, idle connections only cost a queue in the broadcaster.
+    """
+    if not challenge_service.ChallengeRepository().get_by_id(challenge_id):
+        return jsonify({"success": False, "error": "Challenge not found"}), 404
 
-    return jsonify(results), 200
+    def generate():
+        subscription = broadcaster.subscribe(challenge_id)
+        try:
+            yield f"retry: {config.SSE_RETRY * 1000}\n\n"
+            while True:
+                yield subscription.get(timeout=config.SSE_HEARTBEAT) or ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Disable response buffering of reverse proxies
+    })
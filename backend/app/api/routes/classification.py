@@ -1,8 +1,13 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+from app.api.caching import not_modified, snapshot_response, versioned_etag, with_validators
 from app.api.routes import api_bp
 from app.helpers import Gender, TimeSpan
 from app.services.classification import ClassificationService
+from app.services.data_version import DataVersionRepository, season_version_key
+from app.services.snapshot import SnapshotRepository, season_classification_key
+from app.services.standings import StandingsRepository
+from config import config
 from flask import jsonify, request
 
 
@@ -17,18 +22,51 @@ def get_classification():
     if gender and gender not in Gender.values():
         return jsonify({"success": False, "error": "Invalid or no gender"}), 400
 
-    genders = [Gender(gender)] if gender else Gender
+    filters = {"gender": gender}
 
-    season_time_span = TimeSpan(
-        start=datetime(year, 1, 1, tzinfo=timezone.utc),
-        end=datetime(year, 12, 31, tzinfo=timezone.utc)
-    )
+    def classification_filter(athlete_data: dict) -> bool:
+        return not gender or athlete_data["gender"] == gender
 
-    classification_service = ClassificationService(season_time_span)
-    classification_service.query_from_db()
-    classification_data = []
+    # Answer polls of an unchanged classification before querying any efforts
+    data_version = DataVersionRepository().get(season_version_key(year))
+    etag = versioned_etag(f"season-{year}", data_version, filters)
+    last_modified = data_version.updated_at if data_version else None
 
-    for gender in genders:
-        classification_data.extend(classification_service.yield_classification(gender))
+    if response := not_modified(etag, last_modified):  # type: ignore
+        return response
 
-    return jsonify(classification_data), 200
+    # Classification of a finished season is frozen, serve it without recomputing
+    snapshot_repo = SnapshotRepository()
+    if snapshot := snapshot_repo.get(season_classification_key(year)):
+        return snapshot_response(snapshot, filters, classification_filter)
+
+    # Challenges of the season accept late uploads until the grace period after the season has passed
+    grace_period = timedelta(seconds=config.LATE_EFFORT_GRACE_PERIOD)
+    season_completed = datetime(year + 1, 1, 1, tzinfo=timezone.utc) + grace_period < datetime.now(timezone.utc)
+    genders = [Gender(gender)] if gender and not season_completed else Gender
+
+    # Standings are served once materialized, until the first rebuild of the season they are computed
+    if config.STANDINGS_ENABLED and (standings_repo := StandingsRepository()).has_season(year):
+        classification_data = []
+
+        for gender_ in genders:
+            classification_data.extend(standings_repo.get_classification(year, gender_))
+
+    else:
+        season_time_span = TimeSpan(
+            start=datetime(year, 1, 1, tzinfo=timezone.utc),
+            end=datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)  # Same season as ChallengeRepository.get_by_year
+        )
+
+        classification_service = ClassificationService(season_time_span)
+        classification_service.query_from_db()
+        classification_data = []
+
+        for gender_ in genders:
+            classification_data.extend(classification_service.yield_classification(gender_))
+
+    if season_completed:
+        snapshot = snapshot_repo.save(season_classification_key(year), classification_data)
+        return snapshot_response(snapshot, filters, classification_filter)
+
+    return with_validators(jsonify(classification_data), etag, last_modified), 200  # type: ignore
@@ -1,12 +1,10 @@
 """Module for handling Strava OAuth token exchange"""
 import logging
 
-import requests
-
 from app.api.routes import api_bp
 from app.auth import set_auth_cookie
 from app.services import athlete as athlete_service
-from config import config
+from app.services import strava
 from flask import jsonify, request
 
 logger = logging.getLogger(__name__)
@@ -29,20 +27,7 @@ def exchange_token():
     if "activity:read" not in scopes:
         return jsonify({"success": False, "error": "Missing read access for activities"}), 403
 
-    token_url = "https://www.strava.com/oauth/token"
-    token_data = {
-        'client_id': config.CLIENT_ID,
-        'client_secret': config.CLIENT_SECRET,
-        'code': code,
-        'grant_type': 'authorization_code'
-    }
-
-    response = requests.post(
-        url     = token_url,
-        data    = token_data,
-        timeout = 100,
-        verify  = config.SSL_ENABLE
-    )
+    response = strava.client.exchange_token(code)  # type: ignore
     if not response.ok:
         return jsonify({"success": False, "error": "Could not exchange token: STRAVA didn't respond"}), 500
 
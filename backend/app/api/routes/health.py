@@ -2,6 +2,7 @@ import logging
 
 from app.api.routes import api_bp
 from app.database import get_db_session
+from app.services import strava
 from flask import jsonify
 from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
@@ -49,3 +50,15 @@ def database_health_check():
             "message": "Health check error",
             "error": str(e)
         }), 500
+
+
+@api_bp.route('/health/strava', methods=['GET'])
+def strava_health_check():
+    """Strava rate limit usage as seen by this process"""
+    metrics = strava.client.rate_limiter.metrics()
+    exhausted = any(window["remaining"] == 0 for window in metrics["windows"].values())
+
+    return jsonify({
+        "status": "throttled" if exhausted else "healthy",
+        **metrics
+    }), 200
@@ -8,8 +8,7 @@ import app.services.effort as effort_service
 
 from app.api.routes import api_bp
 from app.auth import clear_auth_cookie, requires_auth
-from app.services.utilities import decrypt_token
-from config import config
+from app.services import strava
 from flask import jsonify, request
 
 logger = logging.getLogger(__name__)
@@ -29,12 +28,7 @@ def _deauthorize_with_strava(access_token: str) -> None:
         requests.HTTPError: When Strava returns a non-2xx response.
         requests.RequestException: On any network-level failure.
     """
-    response = http_requests.post(
-        url     = "https://www.strava.com/oauth/deauthorize",
-        headers = {"Authorization": f"Bearer {access_token}"},
-        timeout = 10,
-        verify  = config.SSL_ENABLE,
-    )
+    response = strava.client.deauthorize(access_token)
     response.raise_for_status()
 
 
@@ -71,7 +65,8 @@ def delete_me(athlete):
             athlete record and historical efforts.
 
     Behaviour:
-        1. Retrieve the athlete's plaintext access token.
+        1. Retrieve the athlete's plaintext access token, refreshed if expired.
+           Return 401 if it cannot be refreshed.
         2. Call Strava's ``POST /oauth/deauthorize`` endpoint. Abort and return
            503 if the call fails — this keeps our database consistent with
            Strava's authorisation state.
@@ -82,18 +77,20 @@ def delete_me(athlete):
         5. Clear the ``auth_session`` cookie so the browser session ends.
 
     Returns:
-        200 JSON on success, 503 JSON if the Strava API call fails.
+        200 JSON on success, 401 JSON if the session expired, 503 JSON if the
+        Strava API call fails.
     """
     athlete_id = athlete.id
     hard = request.args.get('hard', 'false').lower() == 'true'
 
     athlete_repo = athlete_service.AthleteRepository()
 
-    # Retrieve the plaintext access token before we potentially delete the record
-    access_token = decrypt_token(athlete.access_token)
-
     # Deauthorize with Strava first — abort if Strava rejects the request
     try:
+        # Retrieve the plaintext access token before we potentially delete the record
+        if (access_token := athlete.get_access_token()) is None:
+            return jsonify({"success": False, "error": "Session expired, please log in again"}), 401
+
         _deauthorize_with_strava(access_token)
     except http_requests.exceptions.RequestException as exc:
         logger.error("Failed to deauthorize athlete %d with Strava: %s", athlete_id, exc)
@@ -1,12 +1,16 @@
 """This route handles Strava webhook events and subscription callbacks."""
 import logging
 
-import app.services.athlete as athlete_service
-import app.services.effort as effort_service
+from datetime import datetime, timezone
+
+import app.services.webhook as webhook_service
 
 from app.api.routes import api_bp
+from app.database import get_db_session
+from app.services.jobs import WEBHOOK_EVENT, WEBHOOK_EVENTS, JobRepository
+from app.services.rate_limit import RateLimitDeferred
 from config import config
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 
 logger = logging.getLogger(__name__)
 
@@ -35,84 +39,37 @@ def webhook():
 
     logger.info("Received webhook data: %s", data)
 
-    object_type = data.get('object_type')
-    aspect_type = data.get('aspect_type')
-    athlete_id = data.get('owner_id')
-
-    # handle activity-related events
-    if object_type == 'activity':
-        activity_id = data.get('object_id')
-        effort_repo = effort_service.EffortRepository()
-
-        if aspect_type == 'create':
-            effort_added = effort_repo.add(activity_id, athlete_id)
-
-            msg = f"New activity {activity_id} of athlete {athlete_id} registered. "
-
-            if effort_added:
-                msg += "Segment effort added to the database."
-                status_code = 201
-            else:
-                msg += "No segment effort was added."
-                status_code = 200
-
-            return jsonify({"success": True, "message": msg}), status_code
-
-        if aspect_type == 'update':
-            updates = data.get('updates', {})
-            private = updates.get('private', False)
-
-            if private and private == "true":
-                deleted_efforts = effort_repo.delete_efforts_by_activity_id(activity_id)
-
-                msg = f"Setting activity {activity_id} to private registered. "
-
-                msg += f"{deleted_efforts} related efforts were deleted." if deleted_efforts else "No efforts to delete from leaderboard."
-
-                return jsonify({"success": True, "message": msg}), 200
-
-            if private and private == "false":
-                effort_added = effort_repo.add(activity_id, athlete_id)
-
-                msg = f"Setting activity {activity_id} to public registered. "
-
-                if effort_added:
-                    msg += "Segment effort added to the database."
-                    status_code = 201
-                else:
-                    msg += "No segment effort was added."
-                    status_code = 200
-
-                return jsonify({"success": True, "message": msg}), status_code
-
-        if aspect_type == 'delete':
-            deleted_efforts = effort_repo.delete_efforts_by_activity_id(activity_id)
-
-            msg = f"Deletion of activity {activity_id} registered."
-            msg += f"{deleted_efforts} efforts deleted." if deleted_efforts else "No efforts to delete."
-
-            return jsonify({"success": True, "message": msg}), 200
+    try:
+        webhook_service.check_event(data)
+    except webhook_service.UnsupportedEvent as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
-        return jsonify({"success": False, "error": "Unsupported aspect type for activity"}), 400
+    # Acknowledge at once, Strava expects a reply within 2 seconds
+    if config.JOB_QUEUE_ENABLED:
+        job_repo = JobRepository()
 
-    # handle athlete-related events
-    if object_type == 'athlete':
-        if aspect_type == 'update':
-            effort_repo = effort_service.EffortRepository()
-            athlete_repo = athlete_service.AthleteRepository()
-            updates = data.get('updates', {})
+        # Merge bursts of events of one activity into a single job
+        if config.WEBHOOK_COALESCE_WINDOW and (key := webhook_service.coalescing_key(data)):
+            queued = job_repo.coalesce(WEBHOOK_EVENTS, key, data, delay=config.WEBHOOK_COALESCE_WINDOW)
+            msg = "queued" if queued else "merged into a queued event"
+        else:
+            queued = job_repo.enqueue(WEBHOOK_EVENT, data, dedup_key=webhook_service.dedup_key(data))
+            msg = "queued" if queued else "already queued"
 
-            # handles the event of athlete deathorizating the application
-            if (authorized := updates.get('authorized', False)) and authorized == "false":
-                athlete_deleted = athlete_repo.delete_by_id(athlete_id)
-                deleted_efforts = effort_repo.delete_efforts_by_athlete_id(athlete_id)
+        job_repo.session.commit()  # The event must be durable before it is acknowledged
 
-                msg = f"Athlete {athlete_id} deauthorized the application. "
-                msg += "Athlete record deleted. " if athlete_deleted else "No athlete record to delete. "
-                msg += f"{deleted_efforts} his/her efforts deleted." if deleted_efforts else "No efforts to delete."
+        return jsonify({"success": True, "message": f"Event of {data.get('object_type')} {data.get('object_id')} {msg}."}), 200
 
-                return jsonify({"success": True, "message": msg}), 200
+    if config.WEBHOOK_ASYNC:
+        webhook_service.dispatcher.submit(current_app._get_current_object(), data)  # type: ignore # pylint: disable=protected-access
+        return jsonify({"success": True, "message": f"Event of {data.get('object_type')} {data.get('object_id')} queued."}), 200
 
-        return jsonify({"success": False, "error": "Unsupported aspect type for athlete"}), 400
+    try:
+        msg, status_code = webhook_service.handle_event(data)
+    except RateLimitDeferred as e:
+        # Strava delivers the event again, by then the budget may be available
+        get_db_session().rollback()
+        retry_after = max(int((e.retry_at - datetime.now(timezone.utc)).total_seconds()), 1)
+        return jsonify({"success": False, "error": "Strava rate limit reached, try again later"}), 429, {"Retry-After": str(retry_after)}
 
-    return jsonify({"success": False, "error": "Unsupported object type"}), 400
+    return jsonify({"success": True, "message": msg}), status_code
@@ -3,6 +3,8 @@
 This module provides:
 
   - ``requires_auth`` – a route decorator that enforces authentication.
+  - ``requires_admin`` – a route decorator that also requires the athlete to
+    be the administrator configured with ``ADMIN_ATHLETE_ID``.
   - ``set_auth_cookie`` / ``clear_auth_cookie`` – helpers used by the login
     endpoint to attach or remove the session cookie from a response.
 
@@ -13,12 +15,16 @@ After a successful Strava OAuth exchange the backend writes an HTTP-only
 protected request the decorator:
 
 1. Reads the cookie and decrypts the athlete ID.
-2. Loads the ``Athlete`` record from the database.
-3. Calls ``AthleteRepository.get_access_token()``, which transparently
-   refreshes the Strava access token when it has expired.
-4. Passes the ``Athlete`` model instance as the **first positional argument**
+2. Loads the profile of the athlete, from the session cache of
+   ``AthleteRepository.get_session_profile()`` or with a single query.
+   Athletes who signed out (revoked tokens) are rejected.
+3. Passes an ``AuthenticatedAthlete`` as the **first positional argument**
    to the wrapped route function.
 
+The Strava access token is only fetched, decrypted and, when expired,
+refreshed if the route calls ``athlete.get_access_token()``, so routes which
+do not call Strava cost at most one database query.
+
 Usage example::
 
     from app.auth import requires_auth
@@ -32,11 +38,10 @@ Usage example::
 import logging
 from functools import wraps
 
-import requests as http_requests
 from cryptography.exceptions import InvalidTag
 from flask import jsonify, request
 
-from app.services.athlete import AthleteRepository
+from app.services.athlete import AthleteProfile, AthleteRepository
 from app.services.utilities import decrypt_token, encrypt_token
 from config import config
 
@@ -126,6 +131,42 @@ def clear_auth_cookie(response):
     return response
 
 
+# ---------------------------------------------------------------------------
+# Authenticated athlete
+# ---------------------------------------------------------------------------
+
+class AuthenticatedAthlete:
+    """Athlete of the current session, passed to routes by ``requires_auth``.
+
+    Exposes the cached profile (``id``, ``firstname``, ``lastname``, ``sex``)
+    and fetches the Strava access token on first use only.
+    """
+
+    def __init__(self, profile: AthleteProfile):
+        self.id        = profile.id
+        self.firstname = profile.firstname
+        self.lastname  = profile.lastname
+        self.sex       = profile.sex
+        self._access_token: str | None = None
+        self._token_fetched = False
+
+    def get_access_token(self) -> str | None:
+        """Get a valid Strava access token, refreshed if it has expired.
+
+        The token is fetched once per request.
+
+        Returns:
+            The plaintext access token, or ``None`` if it cannot be refreshed.
+
+        Raises:
+            requests.RequestException: On a network failure of the refresh.
+        """
+        if not self._token_fetched:
+            self._access_token = AthleteRepository().get_access_token(self.id)
+            self._token_fetched = True
+        return self._access_token
+
+
 # ---------------------------------------------------------------------------
 # Authentication decorator
 # ---------------------------------------------------------------------------
@@ -133,18 +174,17 @@ def clear_auth_cookie(response):
 def requires_auth(f):
     """Route decorator that enforces a valid ``auth_session`` cookie.
 
-    The wrapped function receives the authenticated ``Athlete`` model instance
-    as its **first positional argument**.  All other route arguments (e.g.
-    URL path parameters) are forwarded unchanged.
+    The wrapped function receives the ``AuthenticatedAthlete`` as its
+    **first positional argument**.  All other route arguments (e.g. URL path
+    parameters) are forwarded unchanged.
 
     Returns HTTP 401 when:
     - The cookie is absent.
     - The cookie value cannot be decrypted (tampered / invalid).
-    - No athlete with the decrypted ID exists in the database.
-    - The Strava access token is expired *and* the silent refresh fails.
+    - No athlete with the decrypted ID exists in the database, or the
+      athlete signed out.
 
-    Returns HTTP 503 when:
-    - The Strava token-refresh API call raises a connection error.
+    Token refresh failures are left to the routes which request the token.
 
     Usage::
 
@@ -168,31 +208,33 @@ def requires_auth(f):
             logger.warning("Auth rejected: invalid cookie value")
             return jsonify({"error": "Invalid session"}), 401
 
-        # 3. Load athlete from database ----------------------------------
-        repo    = AthleteRepository()
-        athlete = repo.get_by_id(athlete_id)
-        if athlete is None:
-            logger.warning("Auth rejected: athlete %d not found in DB", athlete_id)
+        # 3. Load athlete profile, cached between requests ----------------
+        profile = AthleteRepository().get_session_profile(athlete_id)
+        if profile is None:
+            logger.warning("Auth rejected: athlete %d not found in DB or signed out", athlete_id)
             return jsonify({"error": "Invalid session"}), 401
 
-        # 4. Ensure we have a valid (possibly refreshed) access token ----
-        try:
-            access_token = repo.get_access_token(athlete_id)
-        except http_requests.exceptions.RequestException as exc:
-            logger.error("Auth: token refresh network error for athlete %d: %s", athlete_id, exc)
-            return jsonify({"error": "Authentication service unavailable"}), 503
+        logger.debug("Auth accepted for athlete %d (%s %s)", athlete_id, profile.firstname, profile.lastname)
 
-        if access_token is None:
-            logger.warning("Auth rejected: could not obtain access token for athlete %d", athlete_id)
-            return jsonify({"error": "Session expired, please log in again"}), 401
+        # 4. Inject athlete as first positional argument ----------------
+        return f(AuthenticatedAthlete(profile), *args, **kwargs)
+
+    return decorated
 
-        # Re-load athlete so any token updates made by get_access_token are reflected
-        athlete = repo.get_by_id(athlete_id)
 
-        if athlete:
-            logger.debug("Auth accepted for athlete %d (%s %s)", athlete_id, athlete.firstname, athlete.lastname)
+def requires_admin(f):
+    """Route decorator that enforces a valid session of the administrator.
+
+    Behaves like ``requires_auth`` and additionally returns HTTP 403 when the
+    authenticated athlete is not ``ADMIN_ATHLETE_ID``.
+    """
+    @wraps(f)
+    @requires_auth
+    def decorated(athlete, *args, **kwargs):
+        if not config.ADMIN_ATHLETE_ID or athlete.id != config.ADMIN_ATHLETE_ID:
+            logger.warning("Admin access rejected for athlete %d", athlete.id)
+            return jsonify({"error": "Administrator access required"}), 403
 
-        # 5. Inject athlete as first positional argument ----------------
         return f(athlete, *args, **kwargs)
 
     return decorated
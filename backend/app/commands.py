@@ -0,0 +1,152 @@
+"""Flask CLI commands for maintenance tasks.
+
+Run them from the ``backend`` directory, e.g.::
+
+    flask --app app rebuild-standings --year 2025
+"""
+import time
+
+from datetime import datetime, timedelta, timezone
+
+import click
+
+from flask import Flask
+
+
+def register_commands(flask_app: Flask) -> None:
+    """Register maintenance commands on the Flask CLI."""
+
+    @flask_app.cli.command('migrate')
+    @click.option('--target', type=int, default=None, help="Last migration version to apply, defaults to all.")
+    def migrate(target: int | None):
+        """Apply pending schema migrations."""
+        from app import migrations  # pylint: disable=import-outside-toplevel
+
+        applied = migrations.upgrade(target)
+        for migration in applied:
+            click.echo(f"Applied {migration.name}")
+        click.echo(f"{len(applied)} migration(s) applied.")
+
+    @flask_app.cli.command('migration-status')
+    def migration_status():
+        """List schema migrations and when they were applied."""
+        from app import migrations  # pylint: disable=import-outside-toplevel
+
+        for migration, applied_at in migrations.status():
+            state = applied_at.isoformat(timespec='seconds') if applied_at else "pending"
+            click.echo(f"{migration.name:<30} {state:<25} {migration.description}")
+
+    @flask_app.cli.command('rebuild-standings')
+    @click.option('--year', type=int, default=None, help="Season to rebuild, defaults to the current year.")
+    def rebuild_standings(year: int | None):
+        """Recompute the materialized standings of a season from raw efforts."""
+        from app.services.standings import StandingsRepository  # pylint: disable=import-outside-toplevel
+
+        year = year or datetime.now(timezone.utc).year
+        challenges_count = StandingsRepository().rebuild(year)
+        click.echo(f"Standings of season {year} rebuilt from {challenges_count} challenge(s).")
+
+    @flask_app.cli.command('rebuild-best-efforts')
+    @click.option('--year', type=int, default=None, help="Season to rebuild, defaults to all challenges.")
+    def rebuild_best_efforts(year: int | None):
+        """Recompute the best efforts of challenges from raw efforts, e.g. after enabling BEST_EFFORTS_ENABLED."""
+        from app.services.best_effort import BestEffortRepository  # pylint: disable=import-outside-toplevel
+        from app.services.challenge import ChallengeRepository  # pylint: disable=import-outside-toplevel
+
+        challenge_repo = ChallengeRepository()
+        challenges = challenge_repo.get_by_year(year) if year else challenge_repo.get_all()
+        BestEffortRepository().rebuild(challenges)
+        click.echo(f"Best efforts of {len(challenges)} challenge(s) rebuilt.")
+
+    @flask_app.cli.command('create-effort-partitions')
+    @click.option('--year', type=int, default=None, help="Season to create, defaults to the current and the next one.")
+    def create_effort_partitions(year: int | None):
+        """Create the partitions of the efforts table for upcoming seasons, e.g. from cron."""
+        from app.database import get_db_session  # pylint: disable=import-outside-toplevel
+        from app.services.partitions import ensure_partitions  # pylint: disable=import-outside-toplevel
+
+        current_year = datetime.now(timezone.utc).year
+        created = ensure_partitions(get_db_session(), [year] if year else [current_year, current_year + 1])
+        click.echo(f"{len(created)} partition(s) created{': ' + ', '.join(created) if created else '.'}")
+
+    @flask_app.cli.command('detach-effort-partition')
+    @click.option('--year', type=int, required=True, help="Season whose efforts to detach.")
+    @click.option('--drop', is_flag=True, help="Drop the detached partition instead of keeping it as a table.")
+    def detach_effort_partition(year: int, drop: bool):
+        """Remove the efforts of a past season from the leaderboard without deleting them row by row."""
+        from app.database import get_db_session  # pylint: disable=import-outside-toplevel
+        from app.services.partitions import detach_partition, partition_name  # pylint: disable=import-outside-toplevel
+
+        if not detach_partition(get_db_session(), year, drop):
+            click.echo(f"Season {year} has no attached partition.")
+        elif drop:
+            click.echo(f"Partition {partition_name(year)} detached and dropped.")
+        else:
+            click.echo(f"Partition {partition_name(year)} detached, archive it with pg_dump -t {partition_name(year)} and drop it.")
+
+    @flask_app.cli.command('run-worker')
+    @click.option('--concurrency', type=int, default=2, show_default=True, help="Number of worker threads.")
+    def run_worker(concurrency: int):
+        """Process jobs of the durable queue until interrupted."""
+        from app.services.worker import run_workers  # pylint: disable=import-outside-toplevel
+
+        run_workers(flask_app, concurrency)
+
+    @flask_app.cli.command('enqueue-token-refreshes')
+    @click.option('--within', type=int, default=3600, show_default=True, help="Refresh tokens expiring within this many seconds.")
+    def enqueue_token_refreshes(within: int):
+        """Queue refreshes of Strava tokens about to expire, e.g. from cron."""
+        from app.models.athlete import Athlete  # pylint: disable=import-outside-toplevel
+        from app.services.jobs import REFRESH_TOKEN, JobRepository  # pylint: disable=import-outside-toplevel
+
+        job_repo = JobRepository()
+        expiry = (datetime.now(timezone.utc) + timedelta(seconds=within)).timestamp()
+        athletes = job_repo.session.query(Athlete.id, Athlete.expires_at).filter(
+            Athlete.refresh_token.isnot(None),
+            Athlete.expires_at < expiry
+        ).all()
+
+        queued_count = sum(
+            job_repo.enqueue(REFRESH_TOKEN, {"athlete_id": athlete_id}, dedup_key=f"refresh_token:{athlete_id}:{expires_at}")
+            for athlete_id, expires_at in athletes
+        )
+        click.echo(f"{queued_count} token refresh(es) queued.")
+
+    @flask_app.cli.command('requeue-dead-jobs')
+    @click.option('--kind', default=None, help="Only requeue jobs of this kind.")
+    def requeue_dead_jobs(kind: str | None):
+        """Retry dead-lettered jobs of the durable queue."""
+        from app.services.jobs import JobRepository  # pylint: disable=import-outside-toplevel
+
+        click.echo(f"{JobRepository().requeue_dead(kind)} dead job(s) requeued.")
+
+    @flask_app.cli.command('backfill-challenge')
+    @click.option('--challenge-id', type=int, required=True, help="Challenge to import missed efforts into.")
+    @click.option('--workers', type=int, default=None, help="Athletes backfilled concurrently, defaults to BACKFILL_WORKERS.")
+    @click.option('--restart', is_flag=True, help="Discard checkpoints of earlier runs and backfill all athletes again.")
+    @click.option('--wait', is_flag=True, help="Wait for the Strava rate limit to reset and resume until done.")
+    def backfill_challenge(challenge_id: int, workers: int | None, restart: bool, wait: bool):
+        """Import efforts of all authorized athletes missed by the webhook into a challenge."""
+        from app.services.backfill import BackfillCheckpointRepository, ChallengeBackfill  # pylint: disable=import-outside-toplevel
+
+        if restart:
+            with flask_app.app_context():
+                click.echo(f"{BackfillCheckpointRepository().delete(challenge_id)} checkpoint(s) discarded.")
+
+        while True:
+            result = ChallengeBackfill(flask_app, challenge_id, workers).run()
+            click.echo(
+                f"{result.completed} athlete(s) backfilled with {result.efforts} effort(s), "
+                f"{result.skipped} already done, {result.failed} left."
+            )
+
+            if not result.deferred_until:
+                break
+
+            delay = max((result.deferred_until - datetime.now(timezone.utc)).total_seconds(), 0)
+            if not wait:
+                click.echo(f"Strava rate limit reached, run again after {result.deferred_until.isoformat()} to resume.")
+                break
+
+            click.echo(f"Strava rate limit reached, resuming in {int(delay)} s.")
+            time.sleep(delay)
@@ -4,6 +4,7 @@ import functools
 import logging
 import time
 
+from app.services.rate_limit import RateLimitDeferred
 from config import config
 from flask import g
 from sqlalchemy import create_engine
@@ -86,6 +87,8 @@ def retry_db_operation(max_retries=3, delay=1):
                         raise
                     logger.warning("Database operation failed (attempt %d/%d): %s", attempt + 1, max_retries, e)
                     time.sleep(delay * (2 ** attempt))  # Exponential backoff
+                except RateLimitDeferred:
+                    raise  # Not a database failure, handled by the caller
                 except Exception as e:
                     logger.error("Non-recoverable database error: %s", e)
                     raise
@@ -96,17 +99,19 @@ def retry_db_operation(max_retries=3, delay=1):
 
 @retry_db_operation(max_retries=3, delay=2)
 def init_db():
-    """Initialize database tables with retry logic"""
+    """Apply pending schema migrations, or only check the schema version, with retry logic"""
     try:
-        from app.models import Base
-        from app.models.athlete import Athlete
-        from app.models.challenge import Challenge
-        from app.models.effort import Effort
-        from app.models.segment import Segment
-
-        logger.info("Attempting to create database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
+        from app import migrations  # pylint: disable=import-outside-toplevel
+
+        if not config.MIGRATE_ON_STARTUP:
+            # Not raised, so that the CLI, which creates the application too, can still apply them
+            if pending_count := migrations.check():
+                logger.error("%d database migration(s) pending, run 'flask --app app migrate'", pending_count)
+            return
+
+        logger.info("Applying database migrations...")
+        applied = migrations.upgrade()
+        logger.info("Database schema up to date, %d migration(s) applied", len(applied))
     except Exception as e:
         logger.error("Failed to initialize database: %s", e)
         raise
@@ -0,0 +1,226 @@
+"""Versioned schema migrations.
+
+Each module ``vNNN_<name>.py`` of this package is one migration, applied once and in version
+order by ``upgrade``, and recorded in the ``schema_migrations`` table. A migration defines:
+
+- ``upgrade(connection)``, which changes the schema through the given connection.
+- ``TRANSACTIONAL`` (optional, default True). A transactional migration runs in one transaction
+  with its record, so it is applied completely or not at all. Statements which cannot run in a
+  transaction, e.g. ``CREATE INDEX CONCURRENTLY``, need ``TRANSACTIONAL = False``: each statement
+  is then committed on its own, and a migration interrupted half-way is run again from the start,
+  so it must be idempotent. ``create_index_concurrently`` and ``add_foreign_key`` are.
+
+Online changes keep production tables writable while they are upgraded: indexes are built
+concurrently and foreign keys are added ``NOT VALID`` and validated afterwards, without blocking
+writes. An advisory lock lets a single process apply migrations when several start at once.
+
+Run ``flask --app app migrate`` to apply pending migrations and ``flask --app app migration-status``
+to list them. With ``MIGRATE_ON_STARTUP`` disabled the application only runs ``check`` at startup,
+a single query of the schema version, and migrations are applied by the deployment instead.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+
+from datetime import datetime
+from types import ModuleType
+from typing import NamedTuple
+
+from app.database import engine
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_KEY = 7_262_201  # Arbitrary key of the PostgreSQL advisory lock held while migrating
+
+_module_name = re.compile(r'v(\d{3})_\w+')
+
+
+class Migration(NamedTuple):
+    """Schema migration module."""
+    version: int
+    name   : str  # Module name, e.g. "v002_effort_indexes"
+    module : ModuleType
+
+    @property
+    def description(self) -> str:
+        """First line of the module docstring."""
+        return (self.module.__doc__ or "").strip().split("\n")[0]
+
+    @property
+    def transactional(self) -> bool:
+        """Whether the migration runs in a single transaction."""
+        return getattr(self.module, 'TRANSACTIONAL', True)
+
+
+class MigrationStatus(NamedTuple):
+    """Migration with the time it was applied."""
+    migration : Migration
+    applied_at: datetime | None  # None if pending
+
+
+def discover() -> list[Migration]:
+    """Load the migrations of this package in version order.
+
+    Raises:
+        RuntimeError: If two migrations have the same version.
+    """
+    migrations: dict[int, Migration] = {}
+
+    for module_info in pkgutil.iter_modules(__path__):
+        if not (match := _module_name.fullmatch(module_info.name)):
+            continue
+
+        version = int(match[1])
+        if version in migrations:
+            raise RuntimeError(f"Migrations {migrations[version].name} and {module_info.name} have the same version")
+
+        migrations[version] = Migration(version, module_info.name, importlib.import_module(f"{__name__}.{module_info.name}"))
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def check() -> int:
+    """Count the migrations not applied yet with a single query of the schema version, without changing the schema."""
+    with engine.connect() as connection:
+        try:
+            version = connection.execute(text("SELECT max(version) FROM schema_migrations")).scalar() or 0
+        except ProgrammingError:
+            version = 0  # Table of applied migrations not created yet
+
+    return sum(migration.version > version for migration in discover())
+
+
+def status() -> list[MigrationStatus]:
+    """List all migrations with the time they were applied."""
+    with engine.connect() as connection:
+        _create_migrations_table(connection)
+        applied = _get_applied(connection)
+        connection.commit()
+
+    return [MigrationStatus(migration, applied.get(migration.version)) for migration in discover()]
+
+
+def upgrade(target: int | None = None) -> list[Migration]:
+    """Apply the pending migrations in version order.
+
+    Args:
+        target (int | None): Last version to apply, defaults to all.
+
+    Returns:
+        list[Migration]: Migrations applied.
+    """
+    applied_migrations = []
+
+    with engine.connect() as connection:
+        # Statements are committed one at a time, transactions are opened per migration
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.execute(text("SET statement_timeout = 0"))  # Index builds may take longer than the statement timeout of the pool
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+        try:
+            _create_migrations_table(connection)
+            applied = _get_applied(connection)
+
+            for migration in discover():
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+
+                logger.info("Applying migration %s", migration.name)
+
+                if migration.transactional:
+                    connection.commit()  # Ends the autobegun block, statements are already committed in autocommit mode
+                    connection.execution_options(isolation_level="READ COMMITTED")
+                    with connection.begin():
+                        migration.module.upgrade(connection)
+                        _record(connection, migration)
+                    connection.execution_options(isolation_level="AUTOCOMMIT")
+                else:
+                    migration.module.upgrade(connection)
+                    _record(connection, migration)
+
+                applied_migrations.append(migration)
+
+        finally:
+            connection.rollback()  # Nothing to undo in autocommit mode, or a failed transactional migration already rolled back
+            connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            connection.execute(text("RESET statement_timeout"))
+
+    return applied_migrations
+
+
+def create_index_concurrently(connection: Connection, name: str, table: str, columns: str, include: str | None = None) -> None:
+    """Build an index without blocking writes to the table.
+
+    An invalid index left behind by an interrupted build is dropped and built again. Must run
+    outside a transaction, i.e. in a migration with ``TRANSACTIONAL = False``.
+
+    Args:
+        connection (Connection): Connection in autocommit mode.
+        name (str): Name of the index.
+        table (str): Name of the indexed table.
+        columns (str): Key columns, e.g. "segment_id, start_date".
+        include (str | None): Non-key columns stored in the index, so queries reading only them skip the table.
+    """
+    valid = connection.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name}).scalar()
+
+    if valid:
+        return
+
+    if valid is False:
+        logger.warning("Rebuilding invalid index %s", name)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    include_clause = f" INCLUDE ({include})" if include else ""
+    connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}){include_clause}"))
+
+
+def add_foreign_key(connection: Connection, table: str, name: str, definition: str) -> None:
+    """Add a foreign key without blocking writes to the table while existing rows are checked.
+
+    The constraint is added ``NOT VALID``, which only checks new rows and takes a brief lock, then
+    validated, which scans the table while allowing writes.
+
+    Args:
+        connection (Connection): Connection in autocommit mode.
+        table (str): Name of the referencing table.
+        name (str): Name of the constraint.
+        definition (str): Constraint definition, e.g. "FOREIGN KEY (athlete_id) REFERENCES athletes (id)".
+    """
+    validated = connection.execute(text(
+        "SELECT convalidated FROM pg_constraint WHERE conname = :name AND conrelid = CAST(:table AS regclass)"
+    ), {"name": name, "table": table}).scalar()
+
+    if validated is None:
+        connection.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID"))
+
+    if not validated:
+        connection.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+
+
+def _create_migrations_table(connection: Connection) -> None:
+    """Create the table recording applied migrations."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version integer PRIMARY KEY, "
+        "name varchar(100) NOT NULL, "
+        "applied_at timestamptz NOT NULL DEFAULT now())"
+    ))
+
+
+def _get_applied(connection: Connection) -> dict[int, datetime]:
+    """Map the versions of applied migrations to the time they were applied."""
+    return dict(connection.execute(text("SELECT version, applied_at FROM schema_migrations")).tuples().all())
+
+
+def _record(connection: Connection, migration: Migration) -> None:
+    """Record a migration as applied."""
+    connection.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name}
+    )
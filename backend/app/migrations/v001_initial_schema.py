@@ -0,0 +1,25 @@
+"""Create the tables of all models.
+
+Baseline of the schema: on a new database the tables are created from the models, on a database
+created before migrations existed the existing tables are kept as they are.
+"""
+from sqlalchemy import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    """Create the missing tables."""
+    # pylint: disable=import-outside-toplevel,unused-import
+    from app.models import Base
+    from app.models.athlete import Athlete
+    from app.models.backfill_checkpoint import BackfillCheckpoint
+    from app.models.best_effort import BestEffort
+    from app.models.challenge import Challenge
+    from app.models.challenge_result import ChallengeResult
+    from app.models.data_version import DataVersion
+    from app.models.effort import Effort
+    from app.models.job import Job
+    from app.models.segment import Segment
+    from app.models.snapshot import Snapshot
+    from app.models.standing import Standing
+
+    Base.metadata.create_all(bind=connection)
@@ -0,0 +1,22 @@
+"""Index efforts and challenges on the columns of the hot queries.
+
+- Results, best efforts and standings read the efforts on a segment within a challenge window.
+  The index covers the columns they rank by, so they are answered from the index alone.
+- Webhook events delete the efforts of an activity, deauthorizations those of an athlete, and
+  the backfill lists the activities of an athlete within a window.
+- The classification reads the efforts of a season.
+- The challenges open at a date are looked up by their window.
+"""
+from app.migrations import create_index_concurrently
+from sqlalchemy import Connection
+
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+
+
+def upgrade(connection: Connection) -> None:
+    """Build the indexes without blocking writes."""
+    create_index_concurrently(connection, 'ix_efforts_segment_start_date', 'efforts', 'segment_id, start_date', include='athlete_id, elapsed_time, id, activity_id')
+    create_index_concurrently(connection, 'ix_efforts_activity_id', 'efforts', 'activity_id')
+    create_index_concurrently(connection, 'ix_efforts_athlete_start_date', 'efforts', 'athlete_id, start_date')
+    create_index_concurrently(connection, 'ix_efforts_start_date', 'efforts', 'start_date')
+    create_index_concurrently(connection, 'ix_challenges_start_end_date', 'challenges', 'start_date, end_date')
@@ -0,0 +1,38 @@
+"""Reference athletes from efforts and challenges from the data derived for them.
+
+- ``efforts.athlete_id`` is checked at commit, as deauthorizations delete the athlete before its
+  efforts in the same transaction.
+- Best efforts and backfill checkpoints are deleted with their challenge.
+
+Segments are not referenced: challenges and efforts may be stored before the segment details
+are fetched from Strava. Rows referencing missing athletes or challenges are never shown and are
+deleted first, so that the constraints can be validated.
+"""
+import logging
+
+from app.migrations import add_foreign_key
+from sqlalchemy import Connection, text
+
+TRANSACTIONAL = False  # Validation scans the tables without blocking writes once the constraints are committed
+
+logger = logging.getLogger(__name__)
+
+ORPHANS = {
+    'efforts'             : "athlete_id NOT IN (SELECT id FROM athletes)",
+    'best_efforts'        : "challenge_id NOT IN (SELECT id FROM challenges)",
+    'backfill_checkpoints': "challenge_id NOT IN (SELECT id FROM challenges)"
+}
+
+
+def upgrade(connection: Connection) -> None:
+    """Delete orphaned rows and add the foreign keys."""
+    for table, condition in ORPHANS.items():
+        if deleted_count := connection.execute(text(f"DELETE FROM {table} WHERE {condition}")).rowcount:
+            logger.warning("Deleted %d orphaned row(s) of %s", deleted_count, table)
+
+    add_foreign_key(connection, 'efforts', 'fk_efforts_athlete_id',
+                    "FOREIGN KEY (athlete_id) REFERENCES athletes (id) DEFERRABLE INITIALLY DEFERRED")
+    add_foreign_key(connection, 'best_efforts', 'fk_best_efforts_challenge_id',
+                    "FOREIGN KEY (challenge_id) REFERENCES challenges (id) ON DELETE CASCADE")
+    add_foreign_key(connection, 'backfill_checkpoints', 'fk_backfill_checkpoints_challenge_id',
+                    "FOREIGN KEY (challenge_id) REFERENCES challenges (id) ON DELETE CASCADE")
@@ -0,0 +1,70 @@
+"""Partition efforts by season.
+
+The table is rebuilt as a range-partitioned table on ``start_date``, with one partition per
+season holding efforts and a default partition (see ``app.services.partitions``). The primary key
+becomes (id, start_date), as the key of a partitioned table must include the partition column.
+
+Efforts are copied in the transaction of the migration under a SHARE lock: reads continue and
+writes wait until the migration commits. Reads wait only for the final swap of the tables. A
+database created with partitioned efforts only gets its partitions.
+"""
+from datetime import datetime, timezone
+
+from app.services.partitions import DEFAULT_PARTITION, ensure_partitions
+from sqlalchemy import Connection, text
+
+INDEXES = {
+    'ix_efforts_segment_start_date': "(segment_id, start_date) INCLUDE (athlete_id, elapsed_time, id, activity_id)",
+    'ix_efforts_activity_id'       : "(activity_id)",
+    'ix_efforts_athlete_start_date': "(athlete_id, start_date)",
+    'ix_efforts_start_date'        : "(start_date)"
+}
+
+
+def upgrade(connection: Connection) -> None:
+    """Rebuild the efforts table partitioned, or create the partitions of a partitioned one."""
+    current_year = datetime.now(timezone.utc).year
+    seasons = {current_year, current_year + 1}
+
+    relkind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('efforts')")).scalar()
+    if relkind == 'p':
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF efforts DEFAULT"))
+        ensure_partitions(connection, seasons)
+    else:
+        _partition(connection, seasons)
+
+
+def _partition(connection: Connection, seasons: set[int]) -> None:
+    """Replace the plain efforts table with a partitioned one holding the same rows."""
+    connection.execute(text("LOCK TABLE efforts IN SHARE MODE"))
+
+    years = connection.execute(text(
+        "SELECT DISTINCT CAST(extract(year FROM start_date AT TIME ZONE 'UTC') AS integer) FROM efforts"
+    )).scalars().all()
+
+    # Index names are unique per schema, the new indexes take over the names of the old ones
+    for name in INDEXES:
+        connection.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_unpartitioned"))
+
+    connection.execute(text(
+        "CREATE TABLE efforts_partitioned (LIKE efforts INCLUDING DEFAULTS, PRIMARY KEY (id, start_date)) "
+        "PARTITION BY RANGE (start_date)"
+    ))
+    # IDs are Strava's, the sequence of the serial column is never used and is dropped with the old table
+    connection.execute(text("ALTER TABLE efforts_partitioned ALTER COLUMN id DROP DEFAULT"))
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF efforts_partitioned DEFAULT"))
+    ensure_partitions(connection, {*years, *seasons}, parent='efforts_partitioned')
+
+    connection.execute(text("INSERT INTO efforts_partitioned SELECT * FROM efforts"))
+
+    # Built once the rows are copied, on every partition
+    for name, definition in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX {name} ON efforts_partitioned {definition}"))
+    connection.execute(text(
+        "ALTER TABLE efforts_partitioned ADD CONSTRAINT fk_efforts_athlete_id "
+        "FOREIGN KEY (athlete_id) REFERENCES athletes (id) DEFERRABLE INITIALLY DEFERRED"
+    ))
+
+    connection.execute(text("DROP TABLE efforts"))
+    connection.execute(text("ALTER TABLE efforts_partitioned RENAME TO efforts"))
+    connection.execute(text("ALTER TABLE efforts RENAME CONSTRAINT efforts_partitioned_pkey TO efforts_pkey"))
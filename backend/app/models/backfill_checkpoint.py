@@ -0,0 +1,15 @@
+"""Module containing the BackfillCheckpoint model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
+
+
+class BackfillCheckpoint(Base):
+    """Database model for an athlete whose activities were backfilled into a challenge."""
+    __tablename__ = 'backfill_checkpoints'
+
+    challenge_id  = Column(Integer, ForeignKey('challenges.id', name='fk_backfill_checkpoints_challenge_id', ondelete='CASCADE'), primary_key=True)  # Deleted with the challenge
+    athlete_id    = Column(Integer, primary_key=True)  # Foreign key to Athlete
+    efforts_count = Column(Integer, nullable=False, default=0)  # Efforts added by the backfill
+    completed_at  = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,22 @@
+"""Module containing the BestEffort model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer
+
+
+class BestEffort(Base):
+    """Database model for the fastest effort of an athlete on a segment of a challenge."""
+    __tablename__ = 'best_efforts'
+    __table_args__ = (
+        Index('ix_best_efforts_challenge_segment_time', 'challenge_id', 'segment_id', 'elapsed_time'),
+    )
+
+    challenge_id = Column(Integer, ForeignKey('challenges.id', name='fk_best_efforts_challenge_id', ondelete='CASCADE'), primary_key=True)  # Deleted with the challenge
+    segment_id   = Column(Integer, primary_key=True)  # Foreign key to Segment
+    athlete_id   = Column(Integer, primary_key=True)  # Foreign key to Athlete
+    effort_id    = Column(BigInteger, nullable=False)  # Foreign key to Effort
+    activity_id  = Column(BigInteger, nullable=False)  # Foreign key to Activity
+    start_date   = Column(DateTime(timezone=True), nullable=False)  # Start date of the effort
+    elapsed_time = Column(Integer, nullable=False)  # Elapsed time in seconds
+    updated_at   = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
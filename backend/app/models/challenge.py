@@ -2,12 +2,15 @@
 from datetime import datetime, timezone
 
 from app.models import Base
-from sqlalchemy import Column, DateTime, Integer
+from sqlalchemy import Column, DateTime, Index, Integer
 
 
 class Challenge(Base):
     """Database model for a challenge on the Cora Leaderboard."""
     __tablename__ = "challenges"
+    __table_args__ = (
+        Index('ix_challenges_start_end_date', 'start_date', 'end_date'),
+    )
 
     id                = Column(Integer, primary_key=True, autoincrement=True)
     climb_segment_id  = Column(Integer, nullable=False)
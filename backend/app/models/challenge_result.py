@@ -0,0 +1,22 @@
+"""Module containing the ChallengeResult model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import Column, DateTime, Index, Integer, String
+
+
+class ChallengeResult(Base):
+    """Database model for the materialized ranking of an athlete in a single challenge."""
+    __tablename__ = 'challenge_results'
+    __table_args__ = (
+        Index('ix_challenge_results_season_athlete', 'season', 'athlete_id', 'segment_type'),
+    )
+
+    challenge_id = Column(Integer, primary_key=True)
+    segment_type = Column(String(10), primary_key=True)  # "sprint" or "climb"
+    athlete_id   = Column(Integer, primary_key=True)
+    season       = Column(Integer, nullable=False)  # Year the challenge belongs to
+    gender       = Column(String(1), nullable=False)
+    position     = Column(Integer, nullable=False)  # Position within the gender
+    points       = Column(Integer, nullable=False)
+    updated_at   = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
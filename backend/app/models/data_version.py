@@ -0,0 +1,14 @@
+"""Module containing the DataVersion model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import Column, DateTime, Integer, String
+
+
+class DataVersion(Base):
+    """Database model for a version counter of data a response is computed from."""
+    __tablename__ = 'data_versions'
+
+    key        = Column(String(100), primary_key=True)  # e.g. "challenge:12" or "season:2025"
+    version    = Column(Integer, nullable=False, default=1)  # Incremented whenever related efforts change
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -2,17 +2,24 @@
 from datetime import datetime, timezone
 
 from app.models import Base
-from sqlalchemy import BigInteger, Column, DateTime, Integer
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer
 
 
 class Effort(Base):
     """Database model for athlete efforts."""
     __tablename__ = 'efforts'
+    __table_args__ = (  # Built concurrently on existing databases by migration v002
+        Index('ix_efforts_segment_start_date', 'segment_id', 'start_date', postgresql_include=['athlete_id', 'elapsed_time', 'id', 'activity_id']),
+        Index('ix_efforts_activity_id', 'activity_id'),
+        Index('ix_efforts_athlete_start_date', 'athlete_id', 'start_date'),
+        Index('ix_efforts_start_date', 'start_date'),
+        {'postgresql_partition_by': 'RANGE (start_date)'}  # One partition per season, see app.services.partitions
+    )
 
     id            = Column(BigInteger, primary_key=True)  # Unique identifier for the effort
-    athlete_id    = Column(Integer, nullable=False)  # Foreign key to Athlete
+    athlete_id    = Column(Integer, ForeignKey('athletes.id', name='fk_efforts_athlete_id', deferrable=True, initially='DEFERRED'), nullable=False)  # Checked at commit
     activity_id   = Column(BigInteger, nullable=False)  # Foreign key to Activity
     segment_id    = Column(Integer, nullable=False)  # Foreign key to Segment
-    start_date    = Column(DateTime(timezone=True), nullable=False)  # Start date of the effort
+    start_date    = Column(DateTime(timezone=True), primary_key=True)  # Start date of the effort, partition key
     elapsed_time  = Column(Integer, nullable=False)  # Elapsed time in seconds
     created_at    = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
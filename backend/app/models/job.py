@@ -0,0 +1,28 @@
+"""Module containing the Job model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class Job(Base):
+    """Database model for a unit of background work in the durable job queue."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_run_after', 'status', 'run_after'),
+        Index('ix_jobs_coalesce_key_pending', 'coalesce_key', unique=True, postgresql_where=text("status = 'pending'")),
+    )
+
+    id           = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind         = Column(String(50), nullable=False)  # e.g. "webhook_event", "fetch_segment" or "refresh_token"
+    payload      = Column(JSONB, nullable=False)
+    dedup_key    = Column(String(200), unique=True)  # Jobs with the same key are enqueued once, NULL is never deduplicated
+    coalesce_key = Column(String(200))  # Events with the same key are merged into the pending job, e.g. "activity:123"
+    status       = Column(String(20), nullable=False, default='pending')  # "pending", "running" or "dead"
+    attempts     = Column(Integer, nullable=False, default=0)
+    run_after    = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_until = Column(DateTime(timezone=True))  # Visibility timeout of a running job, it is retried once passed
+    last_error   = Column(Text)
+    created_at   = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at   = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,15 @@
+"""Module containing the Snapshot model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import Column, DateTime, String, Text
+
+
+class Snapshot(Base):
+    """Database model for frozen results of a completed challenge or season."""
+    __tablename__ = 'snapshots'
+
+    key        = Column(String(100), primary_key=True)  # e.g. "challenge:12:results" or "season:2024:classification"
+    payload    = Column(Text, nullable=False)  # Serialized JSON response
+    etag       = Column(String(64), nullable=False)  # SHA-256 of the payload
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
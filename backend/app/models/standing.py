@@ -0,0 +1,22 @@
+"""Module containing the Standing model for the Cora Leaderboard application."""
+from datetime import datetime, timezone
+
+from app.models import Base
+from sqlalchemy import Column, DateTime, Index, Integer, String
+
+
+class Standing(Base):
+    """Database model for the materialized season classification of an athlete in one category."""
+    __tablename__ = 'standings'
+    __table_args__ = (
+        Index('ix_standings_season_gender', 'season', 'gender'),
+    )
+
+    season          = Column(Integer, primary_key=True)
+    athlete_id      = Column(Integer, primary_key=True)
+    category        = Column(String(10), primary_key=True)  # "sprint" or "climb"
+    gender          = Column(String(1), nullable=False)
+    total_points    = Column(Integer, nullable=False, default=0)  # Sum of the counted results
+    completed_count = Column(Integer, nullable=False, default=0)
+    counted_count   = Column(Integer, nullable=False, default=0)
+    updated_at      = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
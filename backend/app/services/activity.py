@@ -0,0 +1,195 @@
+"""Streaming extraction of segment efforts from Strava activities.
+
+An activity fetched with ``include_all_efforts`` can be megabytes long for long rides, while only
+the efforts on the segments of open challenges matter. Instead of decoding the whole document,
+``iter_segment_efforts`` reads the response in chunks and walks the top-level object:
+
+- Values before ``segment_efforts``, e.g. the polyline of the map, are skipped by scanning for the
+  end of each one, without decoding them.
+- Elements of ``segment_efforts`` are decoded one at a time; only those on the wanted segments are
+  kept, as ``EffortRecord`` with a parsed start date.
+- Reading stops at the end of ``segment_efforts``, so splits, laps and best efforts following it
+  are never decoded.
+
+Only the consumed part of the document and the value being decoded are held in memory.
+"""
+import codecs
+import json
+import re
+
+from datetime import datetime
+from typing import Any, Collection, Iterable, Iterator, NamedTuple
+
+_decoder = json.JSONDecoder()
+_number = re.compile(r'[-+.eE0-9]*')
+_whitespace = re.compile(r'\s*')
+_structural = re.compile(r'["{}\[\]]')  # Characters delimiting strings, objects and arrays
+_string_body = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)  # Content of a string up to its closing quote
+
+
+class EffortRecord(NamedTuple):
+    """Segment effort of a Strava activity."""
+    id          : int
+    activity_id : int
+    athlete_id  : int
+    segment_id  : int
+    start_date  : datetime
+    elapsed_time: int  # Seconds
+
+    @classmethod
+    def from_json(cls, data: dict) -> "EffortRecord":
+        """Create a record from a segment effort of the STRAVA activity API."""
+        return cls(
+            id           = data['id'],
+            activity_id  = data.get('activity', {}).get('id'),
+            athlete_id   = data.get('athlete', {}).get('id'),
+            segment_id   = data.get('segment', {}).get('id'),
+            start_date   = datetime.fromisoformat(data['start_date']),  # ISO 8601, e.g. "2025-06-01T08:30:00Z"
+            elapsed_time = data.get('elapsed_time', 0)
+        )
+
+
+class _JSONReader:
+    """Incremental reader of a JSON document arriving in chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._pos = 0
+
+    def peek(self) -> str:
+        """Next non-whitespace character, an empty string at the end of the document."""
+        while True:
+            self._pos = _whitespace.match(self._buffer, self._pos).end()  # type: ignore
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be the given one.
+
+        Raises:
+            ValueError: If the document has another character there.
+        """
+        if (found := self.peek()) != char:
+            raise ValueError(f"Malformed activity JSON: expected {char!r}, found {found!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next value, reading chunks until it is complete.
+
+        Raises:
+            json.JSONDecodeError: If the value is malformed or the document ends within it.
+        """
+        self.peek()
+        while True:
+            # A number is complete only once another character follows it, e.g. "15" of "1500.0"
+            if _number.match(self._buffer, self._pos).end() == len(self._buffer) and self._read():  # type: ignore
+                continue
+
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+
+            self._pos = end
+            return value
+
+    def skip(self) -> None:
+        """Consume the next value without decoding it.
+
+        Strings, objects and arrays are scanned for their end, which resumes where the previous
+        chunk left off, so that skipping a value spanning many chunks takes linear time.
+
+        Raises:
+            ValueError: If the document ends within the value.
+        """
+        if self.peek() not in '"{[':
+            self.value()  # Numbers and literals are short
+            return
+
+        depth = 0
+        in_string = False
+
+        while True:
+            if in_string:
+                # Stops at the closing quote, or at the end of the buffer, possibly before a trailing backslash
+                self._pos = _string_body.match(self._buffer, self._pos).end()  # type: ignore
+                if self._pos < len(self._buffer) and self._buffer[self._pos] == '"':
+                    self._pos += 1
+                    in_string = False
+                    if depth == 0:
+                        return
+                    continue
+
+            elif match := _structural.search(self._buffer, self._pos):
+                self._pos = match.end()
+                if match.group() == '"':
+                    in_string = True
+                    continue
+
+                depth += 1 if match.group() in '{[' else -1
+                if depth == 0:
+                    return
+                continue
+
+            else:
+                self._pos = len(self._buffer)
+
+            if not self._read():
+                raise ValueError("Malformed activity JSON: document ends within a value")
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, dropping the consumed part.
+
+        Returns:
+            bool: False at the end of the document.
+        """
+        for chunk in self._chunks:
+            if text := self._text.decode(chunk):
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+        return False
+
+
+def iter_segment_efforts(chunks: Iterable[bytes], segment_ids: Collection[int]) -> Iterator[EffortRecord]:
+    """Extract the segment efforts on the given segments from an activity document.
+
+    Args:
+        chunks (Iterable[bytes]): The activity JSON, e.g. ``response.iter_content(...)``.
+        segment_ids (Collection[int]): IDs of the segments whose efforts to keep.
+
+    Yields:
+        EffortRecord: Efforts on the given segments, in document order.
+
+    Raises:
+        ValueError: If the document is not a well-formed JSON object.
+    """
+    reader = _JSONReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+
+        if key == 'segment_efforts' and reader.peek() == '[':
+            reader.expect('[')
+            while reader.peek() != ']':
+                effort_data = reader.value()
+                if effort_data.get('segment', {}).get('id') in segment_ids:
+                    yield EffortRecord.from_json(effort_data)
+                if reader.peek() != ']':
+                    reader.expect(',')
+            return  # Nothing after the segment efforts is needed
+
+        reader.skip()  # Any other value
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
@@ -1,18 +1,45 @@
-"""Athlete Repository Module"""
+"""Athlete Repository Module
+
+Profiles of authenticated athletes are kept in a process-wide cache keyed by athlete ID for
+``AUTH_SESSION_TTL`` seconds, so that authenticated requests do not query the database each time.
+An athlete is dropped from the cache once a change of its record is committed, e.g. a sign-out;
+other processes see the change after the TTL at the latest.
+"""
 import logging
+import threading
+import time
 
 from datetime import datetime, timezone
-
-import requests
+from typing import NamedTuple
 
 from app.database import get_db_session, retry_db_operation
 from app.models.athlete import Athlete
+from app.services import strava
 from app.services.utilities import decrypt_token, encrypt_token
 from config import config
+from sqlalchemy import event
 
 logger = logging.getLogger(__name__)
 
 
+class AthleteProfile(NamedTuple):
+    """Profile of an athlete with a valid session."""
+    id       : int
+    firstname: str | None
+    lastname : str | None
+    sex      : str | None
+
+
+_sessions_lock = threading.Lock()
+_sessions: dict[int, tuple[AthleteProfile, float]] = {}  # Maps athlete ID to its profile and the monotonic time it was loaded
+
+
+def invalidate_session(athlete_id: int) -> None:
+    """Drop an athlete from the session cache, so that it is read again on its next request."""
+    with _sessions_lock:
+        _sessions.pop(athlete_id, None)
+
+
 class AthleteRepository:
     """Repository for managing Athlete records in the database."""
 
@@ -39,6 +66,7 @@ class AthleteRepository:
             athlete.refresh_token = encrypt_token(token_data['refresh_token'])
             athlete.expires_at    = token_data['expires_at']
 
+        self._invalidate_session_on_commit(athlete.id)  # type: ignore
         return athlete
 
     @retry_db_operation(max_retries=3, delay=1)
@@ -61,12 +89,14 @@ class AthleteRepository:
         athlete.access_token  = None
         athlete.refresh_token = None
         athlete.expires_at    = 0
+        self._invalidate_session_on_commit(athlete_id)
         return True
 
     @retry_db_operation(max_retries=3, delay=1)
     def delete_by_id(self, athlete_id: int) -> bool:
         """Delete athlete by ID."""
         deleted_count = self.session.query(Athlete).filter_by(id=athlete_id).delete()
+        self._invalidate_session_on_commit(athlete_id)
         return deleted_count > 0
 
     def update_token(self, athlete: Athlete, token_data: dict) -> Athlete:
@@ -86,11 +116,41 @@ class AthleteRepository:
         """Get athlete by ID."""
         return self.session.query(Athlete).filter_by(id=athlete_id).first()
 
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_session_profile(self, athlete_id: int) -> AthleteProfile | None:
+        """Get the profile of an athlete whose tokens were not revoked, from the session cache if loaded within the TTL.
+
+        Returns:
+            AthleteProfile | None: The profile, None if the athlete does not exist or signed out.
+        """
+        with _sessions_lock:
+            if (entry := _sessions.get(athlete_id)) and time.monotonic() - entry[1] < config.AUTH_SESSION_TTL:
+                return entry[0]
+
+        row = self.session.query(Athlete.id, Athlete.firstname, Athlete.lastname, Athlete.sex).filter(
+            Athlete.id == athlete_id,
+            Athlete.refresh_token.isnot(None)
+        ).first()
+
+        if row is None:
+            return None
+
+        profile = AthleteProfile(*row)
+        with _sessions_lock:
+            _sessions[athlete_id] = (profile, time.monotonic())
+
+        return profile
+
     @retry_db_operation(max_retries=3, delay=1)
     def get_all(self) -> list[Athlete]:
         """Get all athletes."""
         return self.session.query(Athlete).all()
 
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_authorized_ids(self) -> list[int]:
+        """Get the IDs of the athletes whose Strava tokens were not revoked."""
+        return [athlete_id for (athlete_id,) in self.session.query(Athlete.id).filter(Athlete.refresh_token.isnot(None))]
+
     def get_access_token(self, athlete_id: int) -> str | None:
         """Get access token for an athlete
 
@@ -108,21 +168,8 @@ class AthleteRepository:
             return None
 
         if athlete.expires_at < datetime.now(timezone.utc).timestamp():  # type: ignore
-            token_url = "https://www.strava.com/oauth/token"
             refresh_token = decrypt_token(athlete.refresh_token)  # type: ignore
-            request_body = {
-                'client_id': config.CLIENT_ID,
-                'client_secret': config.CLIENT_SECRET,
-                'refresh_token': refresh_token,
-                'grant_type': 'refresh_token'
-            }
-
-            response = requests.post(
-                url     = token_url,
-                data    = request_body,
-                timeout = 100,
-                verify  = config.SSL_ENABLE
-            )
+            response = strava.client.refresh_token(refresh_token)
 
             if not response.ok:
                 logger.error("Failed to refresh token for athlete %d: %s", athlete_id, response.text)
@@ -133,6 +180,10 @@ class AthleteRepository:
 
         return decrypt_token(athlete.access_token)  # type: ignore
 
+    def _invalidate_session_on_commit(self, athlete_id: int) -> None:
+        """Drop the athlete from the session cache once the change of its record is committed."""
+        event.listen(self.session, "after_commit", lambda _session: invalidate_session(athlete_id), once=True)
+
     @retry_db_operation(max_retries=3, delay=1)
     def _save_athlete(self, athlete_data: dict, token_data: dict):
         athlete = Athlete(
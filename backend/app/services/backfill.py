@@ -0,0 +1,232 @@
+"""Backfill of efforts missed by the webhook into a challenge.
+
+Efforts are missed when a challenge is created after its activities were uploaded, or while the
+webhook subscription was down. ``ChallengeBackfill`` imports them from Strava instead:
+
+- The activities of every authorized athlete started within the challenge window are listed,
+  and those without stored efforts are fetched with their segment efforts. Athletes are processed
+  concurrently by a bounded pool of threads, each in an application context of its own.
+- All Strava calls have low priority (see ``app.services.rate_limit``), so a backfill never takes
+  the budget reserved for the webhook. Once the budget is spent the backfill stops taking athletes
+  and reports when it can be resumed.
+- The efforts of an athlete are inserted in bulk and committed together with a checkpoint, so a
+  backfill interrupted half-way resumes with the athletes not processed yet.
+
+Derived data (versions, snapshots, standings, live leaderboards) is refreshed once at the end.
+"""
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from app.database import get_db_session, retry_db_operation
+from app.models.backfill_checkpoint import BackfillCheckpoint
+from app.services import strava
+from app.services.activity import EffortRecord, iter_segment_efforts
+from app.services.athlete import AthleteRepository
+from app.services.challenge import ChallengeRepository, ChallengeWindow
+from app.services.effort import EffortFilter, EffortRepository
+from app.services.rate_limit import Priority, RateLimitDeferred
+from config import config
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+logger = logging.getLogger(__name__)
+
+# Activities started this long before a challenge may still hold efforts within it, e.g. long rides
+ACTIVITY_LEAD_TIME = timedelta(days=1)
+
+
+class BackfillResult(NamedTuple):
+    """Outcome of a backfill run."""
+    athletes      : int  # Authorized athletes
+    skipped       : int  # Athletes already backfilled by an earlier run
+    completed     : int  # Athletes backfilled by this run, including those without a usable token
+    failed        : int  # Athletes not backfilled, e.g. unreadable or left at the rate limit, retried by the next run
+    efforts       : int  # Efforts added by this run
+    deferred_until: datetime | None  # Set if the run stopped at the rate limit, resume it afterwards
+
+
+class BackfillCheckpointRepository:
+    """Repository for managing BackfillCheckpoint records in the database."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_athlete_ids(self, challenge_id: int) -> set[int]:
+        """Get the IDs of the athletes already backfilled into a challenge."""
+        return set(self.session.scalars(select(BackfillCheckpoint.athlete_id).where(BackfillCheckpoint.challenge_id == challenge_id)))
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def save(self, challenge_id: int, athlete_id: int, efforts_count: int) -> None:
+        """Record an athlete as backfilled into a challenge."""
+        self.session.execute(insert(BackfillCheckpoint).values(
+            challenge_id  = challenge_id,
+            athlete_id    = athlete_id,
+            efforts_count = efforts_count
+        ).on_conflict_do_nothing())
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def delete(self, challenge_id: int) -> int:
+        """Remove the checkpoints of a challenge, so that the next backfill starts over."""
+        return self.session.query(BackfillCheckpoint).filter_by(challenge_id=challenge_id).delete()
+
+
+class ChallengeBackfill:
+    """Imports the efforts of all authorized athletes into a challenge."""
+
+    def __init__(self, flask_app: Flask, challenge_id: int, max_workers: int | None = None):
+        self.flask_app = flask_app
+        self.challenge_id = challenge_id
+        self.max_workers = max_workers or config.BACKFILL_WORKERS
+        self._stop = threading.Event()
+        self._deferred_until: datetime | None = None
+
+    def run(self) -> BackfillResult:
+        """Backfill the athletes not backfilled yet.
+
+        Raises:
+            ValueError: If the challenge does not exist.
+        """
+        with self.flask_app.app_context():
+            challenge = ChallengeRepository().get_by_id(self.challenge_id)
+            if challenge is None:
+                raise ValueError(f"Challenge {self.challenge_id} does not exist")
+
+            window = ChallengeWindow.from_challenge(challenge)
+            athlete_ids = AthleteRepository().get_authorized_ids()
+            done = BackfillCheckpointRepository().get_athlete_ids(self.challenge_id)
+
+        pending = [athlete_id for athlete_id in athlete_ids if athlete_id not in done]
+        logger.info("Backfilling challenge %d: %d athlete(s), %d already done", self.challenge_id, len(athlete_ids), len(done))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backfill") as executor:
+            counts = list(executor.map(lambda athlete_id: self._backfill_athlete(window, athlete_id), pending))
+
+        completed = [count for count in counts if count is not None]
+        efforts_count = sum(completed)
+
+        # Also refreshes efforts committed by an earlier run which was interrupted or deferred before refreshing
+        if completed or done:
+            with self.flask_app.app_context():
+                EffortRepository().refresh_challenges([ChallengeRepository().get_by_id(self.challenge_id)])  # type: ignore
+
+        result = BackfillResult(
+            athletes       = len(athlete_ids),
+            skipped        = len(done),
+            completed      = len(completed),
+            failed         = len(pending) - len(completed),
+            efforts        = efforts_count,
+            deferred_until = self._deferred_until
+        )
+        logger.info("Backfill of challenge %d finished: %s", self.challenge_id, result)
+        return result
+
+    def _backfill_athlete(self, window: ChallengeWindow, athlete_id: int) -> int | None:
+        """Import the efforts of one athlete, committed together with the checkpoint.
+
+        Returns:
+            int | None: Number of efforts added, None if the athlete was not backfilled.
+        """
+        if self._stop.is_set():
+            return None
+
+        try:
+            with self.flask_app.app_context():
+                if (access_token := AthleteRepository().get_access_token(athlete_id)) is None:
+                    # Checkpointed, so that later runs do not retry an athlete whose authorization was revoked
+                    logger.warning("Backfill of athlete %d skipped: no valid access token", athlete_id)
+                    BackfillCheckpointRepository().save(self.challenge_id, athlete_id, 0)
+                    return 0
+
+                effort_repo = EffortRepository()
+                known_activity_ids = effort_repo.get_activity_ids(athlete_id, window.start_date, window.end_date)
+                efforts = []
+
+                for activity_id in self._list_activity_ids(access_token, window):
+                    if activity_id not in known_activity_ids:
+                        efforts.extend(self._fetch_efforts(access_token, activity_id, window))
+
+                efforts_count = len(effort_repo.add_efforts(efforts))
+                BackfillCheckpointRepository().save(self.challenge_id, athlete_id, efforts_count)
+                return efforts_count
+
+        except RateLimitDeferred as e:
+            logger.warning("Backfill of challenge %d stopped: %s", self.challenge_id, e)
+            self._deferred_until = e.retry_at
+            self._stop.set()
+
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Backfill of athlete %d into challenge %d failed: %s", athlete_id, self.challenge_id, e)
+
+        return None
+
+    @staticmethod
+    def _list_activity_ids(access_token: str, window: ChallengeWindow) -> list[int]:
+        """List the IDs of the public activities of the athlete which may hold efforts within the window."""
+        after = int((window.start_date - ACTIVITY_LEAD_TIME).timestamp())
+        before = int(window.end_date.timestamp())
+        activity_ids = []
+
+        for page in range(1, 1000):
+            response = strava.client.list_activities(access_token, after, before, page, config.BACKFILL_PAGE_SIZE, Priority.LOW)
+            response.raise_for_status()
+            activities = response.json()
+
+            # Private activities are never on the leaderboard, manual ones have no segment efforts
+            activity_ids.extend(
+                activity['id'] for activity in activities
+                if not activity.get('private') and not activity.get('manual')
+            )
+
+            if len(activities) < config.BACKFILL_PAGE_SIZE:
+                break
+
+        return activity_ids
+
+    @staticmethod
+    def _fetch_efforts(access_token: str, activity_id: int, window: ChallengeWindow) -> list[EffortRecord]:
+        """Fetch the efforts of an activity on the challenge segments within the window."""
+        segment_ids = {window.climb_segment_id, window.sprint_segment_id}
+        effort_filter = EffortFilter([window])
+
+        with strava.client.get_activity(activity_id, access_token, Priority.LOW, stream=True) as response:
+            if response.status_code == 404:
+                return []  # Deleted since it was listed
+            response.raise_for_status()
+
+            return [
+                effort for effort in iter_segment_efforts(response.iter_content(config.STRAVA_STREAM_CHUNK_SIZE), segment_ids)
+                if effort_filter(effort)
+            ]
+
+
+_running_lock = threading.Lock()
+_running: set[int] = set()  # IDs of the challenges being backfilled by this process
+
+
+def start_backfill(flask_app: Flask, challenge_id: int) -> threading.Thread | None:
+    """Run a backfill in a background thread of this process, unless the challenge is already being backfilled.
+
+    Returns:
+        threading.Thread | None: The thread running the backfill, None if one of the challenge is already running.
+    """
+    with _running_lock:
+        if challenge_id in _running:
+            return None
+        _running.add(challenge_id)
+
+    def run() -> None:
+        try:
+            ChallengeBackfill(flask_app, challenge_id).run()
+        finally:
+            with _running_lock:
+                _running.discard(challenge_id)
+
+    thread = threading.Thread(target=run, name=f"backfill-{challenge_id}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,161 @@
+"""Best Effort Repository for the best-effort storage mode.
+
+Only the fastest effort of an athlete on a segment counts towards a challenge. With
+``BEST_EFFORTS_ENABLED`` the ``best_efforts`` table keeps just that effort per challenge, segment
+and athlete, and results and the classification are read from it, so reads scale with the number
+of participants instead of the number of efforts ridden:
+
+- Ingested efforts are offered with a single upsert, which replaces a stored best effort in place
+  only when the new one is faster.
+- Raw efforts are still stored in ``efforts``. When efforts are deleted, e.g. the activity of a
+  best effort, the best efforts of their athletes on their segments are rebuilt from them, so the
+  athlete falls back to the next best effort instead of dropping out. Rebuilds merge with
+  concurrent offers like offers do with each other.
+
+Run ``flask --app app rebuild-best-efforts`` after enabling the mode on an existing database.
+"""
+from typing import Iterable
+
+from app.database import get_db_session, retry_db_operation
+from app.models.best_effort import BestEffort
+from app.models.challenge import Challenge
+from app.models.effort import Effort
+from app.services.activity import EffortRecord
+from sqlalchemy import Row, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import Insert, insert
+
+# Columns of a best effort named like those of an Effort, so rows can be ranked like efforts
+EFFORT_COLUMNS = (
+    BestEffort.effort_id.label('id'),
+    BestEffort.activity_id,
+    BestEffort.athlete_id,
+    BestEffort.segment_id,
+    BestEffort.start_date,
+    BestEffort.elapsed_time
+)
+
+
+# Order of best efforts handed to the rankings: equal times are ranked by the earlier start, then
+# by the effort ID, like in every results backend
+RANK_ORDER = (BestEffort.elapsed_time, BestEffort.start_date, BestEffort.effort_id)
+
+
+def rank_key(effort: EffortRecord | Effort) -> tuple:
+    """Order in which efforts are ranked, the best first, the Python counterpart of ``RANK_ORDER``."""
+    return effort.elapsed_time, effort.start_date, effort.id
+
+
+class BestEffortRepository:
+    """Repository for managing BestEffort records in the database."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def offer(self, efforts: Iterable[tuple[EffortRecord, Iterable[int]]]) -> None:
+        """Store efforts which beat the best effort of their athlete on their segment.
+
+        Args:
+            efforts (Iterable[tuple[EffortRecord, Iterable[int]]]): Efforts with the IDs of the challenges they count for.
+        """
+        best: dict[tuple[int, int, int], EffortRecord] = {}  # Maps (challenge ID, segment ID, athlete ID) to the best offered effort
+        for effort, challenge_ids in efforts:
+            for challenge_id in challenge_ids:
+                key = (challenge_id, effort.segment_id, effort.athlete_id)
+                if key not in best or rank_key(effort) < rank_key(best[key]):
+                    best[key] = effort
+
+        if not best:
+            return
+
+        statement = insert(BestEffort).values([
+            {
+                "challenge_id": challenge_id,
+                "segment_id"  : effort.segment_id,
+                "athlete_id"  : effort.athlete_id,
+                "effort_id"   : effort.id,
+                "activity_id" : effort.activity_id,
+                "start_date"  : effort.start_date,
+                "elapsed_time": effort.elapsed_time
+            }
+            for (challenge_id, _, _), effort in best.items()
+        ])
+
+        self.session.execute(_keep_best(statement))
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def rebuild(self, challenges: Iterable[Challenge], athletes: Iterable[tuple[int, int]] | None = None) -> None:
+        """Recompute the best efforts of challenges from the raw efforts.
+
+        Rows offered concurrently are merged like in ``offer``, keeping the better effort.
+
+        Args:
+            challenges (Iterable[Challenge]): The challenges to rebuild.
+            athletes (Iterable[tuple[int, int]] | None): Pairs of segment ID and athlete ID to rebuild, defaults to all.
+        """
+        pairs = list(set(athletes)) if athletes is not None else None
+
+        for challenge in challenges:
+            stored = self.session.query(BestEffort).filter_by(challenge_id=challenge.id)
+            best_efforts = select(
+                literal(challenge.id), Effort.segment_id, Effort.athlete_id, Effort.id,
+                Effort.activity_id, Effort.start_date, Effort.elapsed_time
+            ).where(
+                Effort.segment_id.in_({challenge.climb_segment_id, challenge.sprint_segment_id}),
+                Effort.start_date >= challenge.start_date,
+                Effort.start_date <= challenge.end_date
+            ).distinct(
+                Effort.segment_id, Effort.athlete_id
+            ).order_by(
+                Effort.segment_id, Effort.athlete_id, Effort.elapsed_time, Effort.start_date, Effort.id
+            )
+
+            if pairs is not None:
+                stored = stored.filter(tuple_(BestEffort.segment_id, BestEffort.athlete_id).in_(pairs))
+                best_efforts = best_efforts.where(tuple_(Effort.segment_id, Effort.athlete_id).in_(pairs))
+
+            stored.delete(synchronize_session=False)
+            self.session.execute(_keep_best(insert(BestEffort).from_select(
+                ["challenge_id", "segment_id", "athlete_id", "effort_id", "activity_id", "start_date", "elapsed_time"],
+                best_efforts
+            )))
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def delete_by_challenge_id(self, challenge_id: int) -> int:
+        """Remove the best efforts of a challenge."""
+        return self.session.query(BestEffort).filter_by(challenge_id=challenge_id).delete()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_by_challenge_id(self, challenge_id: int) -> list[Row]:
+        """Get the best efforts of a challenge, with the attributes of an Effort, fastest first."""
+        return list(self.session.execute(
+            select(*EFFORT_COLUMNS).where(BestEffort.challenge_id == challenge_id).order_by(*RANK_ORDER)
+        ))
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_by_challenge_ids(self, challenge_ids: Iterable[int]) -> list[Row]:
+        """Get the best efforts of challenges, with the attributes of an Effort.
+
+        An effort counting for several overlapping challenges is returned once.
+        """
+        return list(self.session.execute(
+            select(*EFFORT_COLUMNS).where(BestEffort.challenge_id.in_(set(challenge_ids))).distinct().order_by(*RANK_ORDER)
+        ))
+
+
+def _keep_best(statement: Insert) -> Insert:
+    """Make an insert of best efforts replace a stored one only with a better effort."""
+    excluded = statement.excluded
+
+    return statement.on_conflict_do_update(
+        index_elements = [BestEffort.challenge_id, BestEffort.segment_id, BestEffort.athlete_id],
+        set_           = {
+            "effort_id"   : excluded.effort_id,
+            "activity_id" : excluded.activity_id,
+            "start_date"  : excluded.start_date,
+            "elapsed_time": excluded.elapsed_time,
+            "updated_at"  : func.now()
+        },
+        where          = tuple_(excluded.elapsed_time, excluded.start_date, excluded.effort_id)
+                         < tuple_(BestEffort.elapsed_time, BestEffort.start_date, BestEffort.effort_id)
+    )
@@ -0,0 +1,167 @@
+"""Fan-out of live leaderboard changes to streaming clients.
+
+Changes are published with PostgreSQL ``NOTIFY`` inside the transaction that ingests the effort,
+so they are delivered only once it commits, and to every worker process. Each process holds a
+single listening connection (opened while it has subscribers) and dispatches every notification
+to the in-memory queues of its connected clients. The event is serialized once and shared by all
+subscribers; no client holds a database session.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from typing import Any
+
+from app.database import engine
+from config import config
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "leaderboard_changes"
+MAX_PAYLOAD_SIZE = 7900  # PostgreSQL rejects NOTIFY payloads of 8000 bytes and more
+
+
+def publish(session: Session, event: dict[str, Any]) -> None:
+    """Publish an event to all streaming clients once the session commits.
+
+    Events too large for a notification are replaced by a ``reset`` event asking clients to reload.
+
+    Args:
+        session (Session): The session of the transaction that caused the change.
+        event (dict[str, Any]): The event, must contain ``challenge_id`` and ``type``.
+    """
+    payload = json.dumps(event, separators=(',', ':'), default=str)
+
+    if len(payload.encode()) > MAX_PAYLOAD_SIZE:
+        payload = json.dumps({key: event[key] for key in ("challenge_id", "version") if key in event} | {"type": "reset"})
+
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+class Subscription:
+    """Queue of formatted server-sent events for one connected client."""
+
+    def __init__(self, challenge_id: int):
+        self.challenge_id = challenge_id
+        self._events: queue.Queue[str] = queue.Queue(maxsize=config.SSE_QUEUE_SIZE)
+
+    def put(self, frame: str) -> None:
+        """Queue an event. A client too slow to keep up is told to reload instead of buffering without bound."""
+        try:
+            self._events.put_nowait(frame)
+        except queue.Full:
+            while not self._events.empty():
+                self._events.get_nowait()
+            self._events.put_nowait(_format_frame({"challenge_id": self.challenge_id, "type": "reset"}))
+
+    def get(self, timeout: float) -> str | None:
+        """Wait for the next event, None on timeout."""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def _format_frame(event: dict[str, Any]) -> str:
+    """Format an event as a server-sent event frame."""
+    frame = f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+    return f"id: {event['version']}\n{frame}" if "version" in event else frame
+
+
+class Broadcaster:
+    """Dispatches notifications of the database to the subscribers of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscription]] = {}  # Maps challenge ID to its subscribers
+        self._listener: threading.Thread | None = None
+
+    def subscribe(self, challenge_id: int) -> Subscription:
+        """Register a client for the changes of a challenge, starting the listener if needed."""
+        subscription = Subscription(challenge_id)
+
+        with self._lock:
+            self._subscribers.setdefault(challenge_id, set()).add(subscription)
+
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="leaderboard-listener", daemon=True)
+                self._listener.start()
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a disconnected client."""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.challenge_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.challenge_id, None)
+
+    def dispatch(self, payload: str) -> None:
+        """Format a notification once and queue it for every subscriber of its challenge."""
+        try:
+            event = json.loads(payload)
+        except json.JSONDecodeError:
+            logger.warning("Ignoring malformed leaderboard notification: %s", payload)
+            return
+
+        frame = _format_frame(event)
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.get("challenge_id"), ()))
+
+        for subscription in subscribers:
+            subscription.put(frame)
+
+    def _keeps_listening(self) -> bool:
+        """Whether the calling listener should go on, i.e. it is the current one and any client is connected.
+
+        A listener stopping without clients clears itself first, so the next subscriber starts a new one
+        while this one returns.
+        """
+        with self._lock:
+            if self._listener is not threading.current_thread():
+                return False
+            if not self._subscribers:
+                self._listener = None
+                return False
+            return True
+
+    def _listen(self) -> None:
+        """Receive notifications on a dedicated connection while there are subscribers."""
+        delay = 1
+
+        while self._keeps_listening():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                connection.detach()  # Do not return a connection in LISTEN state to the pool
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True  # type: ignore
+                dbapi_connection.cursor().execute(f"LISTEN {CHANNEL}")  # type: ignore
+                delay = 1
+
+                while self._keeps_listening():
+                    if select.select([dbapi_connection], [], [], config.SSE_HEARTBEAT) == ([], [], []):
+                        continue
+
+                    dbapi_connection.poll()  # type: ignore
+                    while dbapi_connection.notifies:  # type: ignore
+                        self.dispatch(dbapi_connection.notifies.pop(0).payload)  # type: ignore
+
+            except Exception as e:
+                logger.error("Leaderboard listener failed, reconnecting in %d s: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+broadcaster = Broadcaster()
@@ -1,9 +1,26 @@
-"""Challenge Repository Module"""
+"""Challenge Repository Module
+
+Besides the repository, this module keeps a calendar of all challenges in memory, so that the
+webhook can match efforts to challenges without querying the database on every event. The
+calendar is reloaded after a TTL and whenever this process adds or deletes a challenge.
+"""
+import threading
+import time
+
+from bisect import bisect_right
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Iterable, NamedTuple
 
 from app.database import get_db_session, retry_db_operation
 from app.models.challenge import Challenge
+from app.services.best_effort import BestEffortRepository
+from app.services.jobs import FETCH_SEGMENT, JobRepository
+from app.services.partitions import ensure_partitions
 from app.services.segment import SegmentRepository
+from config import config
+from sqlalchemy import event, or_
 
 
 class ChallengeRepository:
@@ -19,10 +36,13 @@ class ChallengeRepository:
         sprint_segment_id = challenge_data.get('sprint_segment_id', 0)
 
         segment_repo = SegmentRepository()
-        if segment_repo.create(climb_segment_id) is None:
-            return None
-        if segment_repo.create(sprint_segment_id) is None:
-            return None
+        for segment_id in (climb_segment_id, sprint_segment_id):
+            if config.JOB_QUEUE_ENABLED:
+                # Fetch missing segments from Strava in the background
+                if segment_repo.get_by_id(segment_id) is None:
+                    JobRepository().enqueue(FETCH_SEGMENT, {"segment_id": segment_id}, dedup_key=f"fetch_segment:{segment_id}")
+            elif segment_repo.create(segment_id) is None:
+                return None
 
         challenge = Challenge(
             climb_segment_id  = climb_segment_id,
@@ -31,6 +51,17 @@ class ChallengeRepository:
             end_date          = challenge_data.get('end_date', datetime.now(timezone.utc) + timedelta(days=14))
         )
         self.session.add(challenge)
+        event.listen(self.session, "after_commit", lambda _session: invalidate_calendar(), once=True)
+
+        # Efforts of the challenge are stored in the partitions of its seasons
+        self.session.flush()
+        self.session.refresh(challenge)  # Dates as stored, they may be given as ISO strings
+        start_year, end_year = (date.astimezone(timezone.utc).year for date in (challenge.start_date, challenge.end_date))
+        ensure_partitions(self.session, range(start_year, end_year + 1))
+
+        if config.BEST_EFFORTS_ENABLED:
+            # Efforts on the segments may already be stored for other challenges
+            BestEffortRepository().rebuild([challenge])
 
         return challenge
 
@@ -38,8 +69,14 @@ class ChallengeRepository:
     def delete_by_id(self, challenge_id: int) -> bool:
         """Delete challenge by ID."""
         deleted_count = self.session.query(Challenge).filter_by(id=challenge_id).delete()
+        event.listen(self.session, "after_commit", lambda _session: invalidate_calendar(), once=True)
         return deleted_count > 0
 
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_all(self) -> list[Challenge]:
+        """Get all challenges."""
+        return self.session.query(Challenge).all()
+
     @retry_db_operation(max_retries=3, delay=1)
     def get_by_id(self, challenge_id: int) -> Challenge | None:
         """Get challenge by ID."""
@@ -63,7 +100,7 @@ class ChallengeRepository:
 
     @retry_db_operation(max_retries=3, delay=1)
     def get_by_year(self, year: int) -> list[Challenge]:
-        """Get challenges by year."""
+        """Get challenges by year, those lying entirely within it (see ``season_of``)."""
         start_of_year = datetime(year, 1, 1, tzinfo=timezone.utc)
         end_of_year   = datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
 
@@ -71,3 +108,145 @@ class ChallengeRepository:
             Challenge.start_date >= start_of_year,
             Challenge.end_date <= end_of_year
         ).all()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_for_efforts(self, efforts: Iterable[tuple[int, datetime]]) -> list[Challenge]:
+        """Get challenges which any of the given efforts counts towards.
+
+        Args:
+            efforts (Iterable[tuple[int, datetime]]): Pairs of segment ID and effort start date.
+
+        Returns:
+            list[Challenge]: Challenges having the effort's segment and containing its start date.
+        """
+        if not (efforts := list(efforts)):
+            return []
+
+        segment_ids = {segment_id for segment_id, _ in efforts}
+        candidates = self.session.query(Challenge).filter(
+            or_(Challenge.climb_segment_id.in_(segment_ids), Challenge.sprint_segment_id.in_(segment_ids)),
+            Challenge.start_date <= max(start_date for _, start_date in efforts),
+            Challenge.end_date >= min(start_date for _, start_date in efforts)
+        ).all()
+
+        return [
+            challenge for challenge in candidates
+            if any(
+                segment_id in (challenge.climb_segment_id, challenge.sprint_segment_id) and
+                challenge.start_date <= start_date <= challenge.end_date
+                for segment_id, start_date in efforts
+            )
+        ]
+
+
+def season_of(challenge: "Challenge | ChallengeWindow") -> int | None:
+    """Season a challenge counts towards, None if it spans New Year and thus belongs to no season.
+
+    Matches ``ChallengeRepository.get_by_year``.
+    """
+    year = challenge.start_date.astimezone(timezone.utc).year  # type: ignore
+    return year if challenge.end_date.astimezone(timezone.utc).year == year else None  # type: ignore
+
+
+class ChallengeWindow(NamedTuple):
+    """Immutable copy of a challenge, safe to keep across sessions."""
+    id               : int
+    climb_segment_id : int
+    sprint_segment_id: int
+    start_date       : datetime
+    end_date         : datetime
+
+    @classmethod
+    def from_challenge(cls, challenge: "Challenge | ChallengeWindow") -> "ChallengeWindow":
+        """Create a window from a challenge."""
+        return cls(
+            id                = challenge.id,                 # type: ignore
+            climb_segment_id  = challenge.climb_segment_id,   # type: ignore
+            sprint_segment_id = challenge.sprint_segment_id,  # type: ignore
+            start_date        = challenge.start_date,         # type: ignore
+            end_date          = challenge.end_date            # type: ignore
+        )
+
+
+class ChallengeCalendar:
+    """Interval index of challenges, overall and per segment.
+
+    Windows are sorted by start date, along with the running maximum of their end dates. A lookup
+    bisects the start dates and walks back only while an earlier window can still contain the
+    timestamp, which is O(log n) unless challenges overlap.
+    """
+
+    def __init__(self, challenges: Iterable[Challenge | ChallengeWindow]):
+        """Initialize the calendar with the given challenges."""
+        windows = sorted((ChallengeWindow.from_challenge(challenge) for challenge in challenges), key=lambda window: window.start_date)
+
+        by_segment: dict[int | None, list[ChallengeWindow]] = defaultdict(list)  # None holds all challenges
+        for window in windows:
+            by_segment[None].append(window)
+            for segment_id in {window.climb_segment_id, window.sprint_segment_id}:
+                by_segment[segment_id].append(window)
+
+        self._index: dict[int | None, tuple[list[ChallengeWindow], list[datetime], list[datetime]]] = {
+            key: (
+                key_windows,
+                [window.start_date for window in key_windows],
+                list(accumulate((window.end_date for window in key_windows), max))
+            )
+            for key, key_windows in by_segment.items()
+        }
+
+    def find(self, segment_id: int, timestamp: datetime) -> list[ChallengeWindow]:
+        """Get challenges having the segment and containing the timestamp."""
+        return self._search(segment_id, timestamp, timedelta(0))
+
+    def open_at(self, timestamp: datetime, grace_period: timedelta = timedelta(0)) -> list[ChallengeWindow]:
+        """Get challenges running at the timestamp or ended less than the grace period before it."""
+        return self._search(None, timestamp, grace_period)
+
+    def _search(self, key: int | None, timestamp: datetime, grace_period: timedelta) -> list[ChallengeWindow]:
+        """Get windows of the index key containing the timestamp, with end dates extended by the grace period."""
+        if (entry := self._index.get(key)) is None:
+            return []
+
+        windows, starts, max_ends = entry
+        found = []
+
+        for i in range(bisect_right(starts, timestamp) - 1, -1, -1):
+            if max_ends[i] + grace_period < timestamp:
+                break
+            if timestamp <= windows[i].end_date + grace_period:
+                found.append(windows[i])
+
+        return found[::-1]
+
+
+_calendar_lock = threading.Lock()
+_calendar: ChallengeCalendar | None = None
+_calendar_loaded_at = 0.0  # Monotonic time of the last load
+
+
+def get_calendar() -> ChallengeCalendar:
+    """Get the calendar of all challenges, loading it if missing or older than the TTL.
+
+    Must be called within an application context.
+    """
+    global _calendar, _calendar_loaded_at  # pylint: disable=global-statement
+
+    with _calendar_lock:
+        if _calendar is not None and time.monotonic() - _calendar_loaded_at < config.CHALLENGE_CALENDAR_TTL:
+            return _calendar
+
+    calendar = ChallengeCalendar(ChallengeRepository().get_all())
+
+    with _calendar_lock:
+        _calendar, _calendar_loaded_at = calendar, time.monotonic()
+
+    return calendar
+
+
+def invalidate_calendar() -> None:
+    """Drop the calendar, so that it is reloaded on next use."""
+    global _calendar  # pylint: disable=global-statement
+
+    with _calendar_lock:
+        _calendar = None
@@ -1,4 +1,8 @@
 """Classification Service for retrieving the general classification of athletes over a season."""
+import heapq
+
+from bisect import bisect_right
+from collections import defaultdict
 from typing import Any, Generator
 
 from app.database import get_db_session, retry_db_operation
@@ -6,31 +10,83 @@ from app.helpers import Gender, TimeSpan
 from app.models.athlete import Athlete
 from app.models.challenge import Challenge
 from app.models.effort import Effort
+from app.services.best_effort import BestEffortRepository
+from app.services.columnar import EffortColumns, np, top_n
 from app.services.results import ResultService
 from config import Config
 
 
 class ClassificationResults:
-    """Class for handling classification results for a specific athlete."""
+    """Class for handling classification results for a specific athlete.
+
+    Only the best N results per category are kept in a min-heap, where N is defined in
+    Config.MAX_COUNTED_RESULTS, and the totals are updated as results are added. Reading the
+    totals is therefore O(1) and memory per athlete stays bounded however many challenges are added.
+    """
+    __slots__ = (
+        "athlete_id",
+        "_counted_sprints", "_counted_climbs",
+        "_sprint_points", "_climb_points",
+        "_completed_sprints", "_completed_climbs"
+    )
 
     def __init__(self, athlete_id: int):
         self.athlete_id = athlete_id
 
-        self._completed_sprints : list[tuple[int, int]] = []  # List like (challenge_id, points)
-        self._completed_climbs  : list[tuple[int, int]] = []  # List like (challenge_id, points)
+        self._counted_sprints  : list[int] = []  # Min-heap of the best sprint points
+        self._counted_climbs   : list[int] = []  # Min-heap of the best climb points
+        self._sprint_points    : int       = 0   # Sum of the counted sprint points
+        self._climb_points     : int       = 0   # Sum of the counted climb points
+        self._completed_sprints: int       = 0
+        self._completed_climbs : int       = 0
+
+    @staticmethod
+    def _push(counted: list[int], points: int) -> int:
+        """Push points to a bounded heap of counted results and return the change of their sum."""
+        if len(counted) < Config.MAX_COUNTED_RESULTS:
+            heapq.heappush(counted, points)
+            return points
+
+        if counted and points > counted[0]:
+            return points - heapq.heapreplace(counted, points)
+
+        return 0
 
-    def add_result(self, challenge_id: int, segment_type: str, points: int) -> None:
+    def add_result(self, challenge_id: int, segment_type: str, points: int) -> None:  # pylint: disable=unused-argument
         """Add a result for the athlete.
 
         Args:
+            challenge_id (int): The ID of the challenge the result comes from.
             segment_type (str): The type of segment ("sprint" or "climb").
             points (int): The points earned in the segment.
         """
         if segment_type == "sprint":
-            self._completed_sprints.append((challenge_id, points))
+            self._completed_sprints += 1
+            self._sprint_points += self._push(self._counted_sprints, points)
+
+        elif segment_type == "climb":
+            self._completed_climbs += 1
+            self._climb_points += self._push(self._counted_climbs, points)
+
+        else:
+            raise ValueError(f"Invalid segment type: {segment_type}")
+
+    def set_counted(self, segment_type: str, counted: list[int], completed: int) -> None:
+        """Set already selected results of a category, replacing previously added ones.
+
+        Args:
+            segment_type (str): The type of segment ("sprint" or "climb").
+            counted (list[int]): Points of the counted results, at most Config.MAX_COUNTED_RESULTS.
+            completed (int): Number of all completed results in the category.
+        """
+        counted = counted[:Config.MAX_COUNTED_RESULTS]
+        heapq.heapify(counted)
+
+        if segment_type == "sprint":
+            self._counted_sprints, self._sprint_points, self._completed_sprints = counted, sum(counted), completed
 
         elif segment_type == "climb":
-            self._completed_climbs.append((challenge_id, points))
+            self._counted_climbs, self._climb_points, self._completed_climbs = counted, sum(counted), completed
 
         else:
             raise ValueError(f"Invalid segment type: {segment_type}")
@@ -41,8 +97,7 @@ class ClassificationResults:
 
         Only the top N results are counted, where N is defined in Config.MAX_COUNTED_RESULTS.
         """
-        self._completed_sprints.sort(key=lambda x: x[1], reverse=True)
-        return sum(points for _, points in self._completed_sprints[:Config.MAX_COUNTED_RESULTS])
+        return self._sprint_points
 
     @property
     def climb_points(self) -> int:
@@ -50,28 +105,27 @@ class ClassificationResults:
 
         Only the top N results are counted, where N is defined in Config.MAX_COUNTED_RESULTS.
         """
-        self._completed_climbs.sort(key=lambda x: x[1], reverse=True)
-        return sum(points for _, points in self._completed_climbs[:Config.MAX_COUNTED_RESULTS])
+        return self._climb_points
 
     @property
     def completed_sprints_count(self) -> int:
         """Get count of completed sprints."""
-        return len(self._completed_sprints)
+        return self._completed_sprints
 
     @property
     def completed_climbs_count(self) -> int:
         """Get count of completed climbs."""
-        return len(self._completed_climbs)
+        return self._completed_climbs
 
     @property
     def counted_sprints_count(self) -> int:
         """Get count of counted sprints."""
-        return min(len(self._completed_sprints), Config.MAX_COUNTED_RESULTS)
+        return len(self._counted_sprints)
 
     @property
     def counted_climbs_count(self) -> int:
         """Get count of counted climbs."""
-        return min(len(self._completed_climbs), Config.MAX_COUNTED_RESULTS)
+        return len(self._counted_climbs)
 
 
 class ClassificationService:
@@ -84,7 +138,8 @@ class ClassificationService:
         self.athletes        : list[tuple[int, str, str, str]] = []   # List of tuples (athlete_id, firstname, lastname, sex)
         self.challenges      : list[Challenge]                 = []   # Challenges within the season time span
 
-        self._results : dict[int, ClassificationResults] = {}  # Maps athlete_id to classification results for that athlete
+        self._results   : dict[int, ClassificationResults] = {}     # Maps athlete_id to classification results for that athlete
+        self._classified: bool                             = False  # Whether standings were already computed
 
     @retry_db_operation(max_retries=3, delay=1)
     def query_from_db(self) -> None:
@@ -99,10 +154,13 @@ class ClassificationService:
         if not self.challenges:
             return
 
-        self.efforts = session.query(Effort).filter(
-            Effort.start_date >= self.season_time_span.start,
-            Effort.start_date <= self.season_time_span.end
-        ).all()
+        if Config.BEST_EFFORTS_ENABLED:
+            self.efforts = BestEffortRepository().get_by_challenge_ids([challenge.id for challenge in self.challenges])  # type: ignore
+        else:
+            self.efforts = session.query(Effort).filter(
+                Effort.start_date >= self.season_time_span.start,
+                Effort.start_date <= self.season_time_span.end
+            ).all()
 
         if not self.efforts:
             return
@@ -126,19 +184,62 @@ class ClassificationService:
         """Get a dictionary mapping athlete IDs to their genders."""
         return {athlete[0]: athlete[3] for athlete in self.athletes}
 
-    def yield_classification(self, gender: Gender) -> Generator[dict[str, Any], None, None]:
-        """Yield classification results for each challenge."""
+    def _partition_efforts(self) -> dict[int, list[Effort]]:
+        """Split season efforts into per-challenge buckets in a single pass.
+
+        An index mapping each segment ID to the windows of the challenges using it
+        (sorted by start date) is built first. Every effort is then matched only
+        against the windows of its own segment which started before it, instead of
+        scanning the whole season once per challenge.
+
+        Returns:
+            dict[int, list[Effort]]: Maps challenge ID to the efforts recorded within that challenge.
+        """
+        windows: dict[int, list[tuple[Any, Any, int]]] = defaultdict(list)  # segment_id -> [(start, end, challenge_id)]
+        for challenge in self.challenges:
+            for segment_id in {challenge.climb_segment_id, challenge.sprint_segment_id}:
+                windows[segment_id].append((challenge.start_date, challenge.end_date, challenge.id))  # type: ignore
+
+        starts: dict[int, list[Any]] = {}
+        for segment_id, segment_windows in windows.items():
+            segment_windows.sort(key=lambda window: window[0])
+            starts[segment_id] = [window[0] for window in segment_windows]
+
+        partitions: dict[int, list[Effort]] = {challenge.id: [] for challenge in self.challenges}  # type: ignore
+        for effort in self.efforts:
+            if not (segment_windows := windows.get(effort.segment_id)):    # type: ignore
+                continue
+
+            # Only windows starting at or before the effort can contain it
+            for i in range(bisect_right(starts[effort.segment_id], effort.start_date) - 1, -1, -1):  # type: ignore
+                _, end_date, challenge_id = segment_windows[i]
+                if effort.start_date <= end_date:
+                    partitions[challenge_id].append(effort)
+
+        return partitions
+
+    def classify(self) -> None:
+        """Compute sprint and climb standings for all genders in a single pass over the season.
+
+        Every challenge is ranked once and the points of all genders are accumulated together.
+        Subsequent calls are no-ops, so per-gender views can be read repeatedly at no extra cost.
+        """
+        if self._classified:
+            return
+
+        if Config.RESULTS_BACKEND == 'numpy':
+            self._classify_columnar()
+            self._classified = True
+            return
+
         challenge_types = ["sprint", "climb"]
+        partitions = self._partition_efforts()
 
         for challenge in self.challenges:
             climb_segment = challenge.climb_segment_id
             sprint_segment = challenge.sprint_segment_id
 
-            challenge_efforts = [
-                effort for effort in self.efforts
-                if effort.segment_id in (climb_segment, sprint_segment) and     # type: ignore
-                challenge.start_date <= effort.start_date <= challenge.end_date
-            ]
+            challenge_efforts = partitions[challenge.id]     # type: ignore
             challenge_athletes = {effort.athlete_id for effort in challenge_efforts}
 
             result_service = ResultService(challenge.id)    # type: ignore
@@ -150,13 +251,48 @@ class ClassificationService:
             )
 
             for segment_type in challenge_types:
-                for result_data in result_service.yield_simplified_results(segment_type, gender):
-                    athlete_id = result_data[0]
-
+                for _, athlete_id, _, points in result_service.yield_simplified_results_by_gender(segment_type):
                     if not athlete_id in self._results:
                         self._results[athlete_id] = ClassificationResults(athlete_id)
 
-                    self._results[athlete_id].add_result(challenge.id, segment_type, result_data[2])
+                    self._results[athlete_id].add_result(challenge.id, segment_type, points)     # type: ignore
+
+        self._classified = True
+
+    def _classify_columnar(self) -> None:
+        """Compute the standings with the columnar engine, see ``app.services.columnar``.
+
+        Season efforts are loaded into arrays once. Every challenge is ranked with vectorized
+        selections and the best results of every athlete are picked with group reductions.
+        """
+        columns = EffortColumns(self.efforts, self.athletes)
+        results: dict[str, tuple[list, list]] = {"sprint": ([], []), "climb": ([], [])}  # category -> (athlete_ids, points)
+
+        for challenge in self.challenges:
+            window = columns.window(challenge.start_date.timestamp(), challenge.end_date.timestamp())
+
+            for category, segment_id in (("sprint", challenge.sprint_segment_id), ("climb", challenge.climb_segment_id)):
+                for gender in Gender:
+                    ranked = columns.rank(segment_id, gender, window)    # type: ignore
+                    results[category][0].append(columns.athlete_ids[ranked])
+                    results[category][1].append(columns.points(ranked.size, ResultService.points))
+
+        for category, (athlete_ids, points) in results.items():
+            if not athlete_ids:
+                continue
+
+            for athlete_id, counted, completed in top_n(np.concatenate(athlete_ids), np.concatenate(points), Config.MAX_COUNTED_RESULTS):
+                if not athlete_id in self._results:
+                    self._results[athlete_id] = ClassificationResults(athlete_id)
+
+                self._results[athlete_id].set_counted(category, counted, completed)
+
+    def yield_classification(self, gender: Gender) -> Generator[dict[str, Any], None, None]:
+        """Yield classification results of the given gender.
+
+        The standings are computed once for all genders (see ``classify``), this only yields the requested view.
+        """
+        self.classify()
 
         athlete_names = self.athlete_names
         athlete_genders = self.athlete_genders
@@ -0,0 +1,118 @@
+"""Columnar scoring engine for results and classification.
+
+Efforts are loaded into parallel NumPy arrays so that best-effort selection, ranking, points
+assignment and top-N summation are done with vectorized sorts and group reductions instead of
+per-object Python loops. It is used when ``config.RESULTS_BACKEND`` is ``'numpy'``.
+
+NumPy is an optional dependency, install it with ``pip install numpy`` to enable this backend.
+"""
+from typing import Iterable
+
+from app.helpers import Gender
+from app.models.effort import Effort
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+GENDER_CODES = {gender: code for code, gender in enumerate(Gender)}  # Gender -> small integer code
+UNKNOWN_GENDER = -1
+
+
+class EffortColumns:
+    """Efforts stored as parallel arrays, indexed by the position of the effort in the source list."""
+
+    def __init__(self, efforts: list[Effort], athletes: Iterable[tuple[int, str, str, str]]):
+        """Initialize the columns from efforts and (athlete_id, firstname, lastname, sex) tuples.
+
+        Raises:
+            RuntimeError: If NumPy is not installed.
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for the columnar results backend")
+
+        count = len(efforts)
+        athlete_genders = {athlete[0]: GENDER_CODES.get(athlete[3], UNKNOWN_GENDER) for athlete in athletes}  # type: ignore
+
+        self.effort_ids    = np.fromiter((e.id for e in efforts), dtype=np.int64, count=count)
+        self.athlete_ids   = np.fromiter((e.athlete_id for e in efforts), dtype=np.int64, count=count)
+        self.segment_ids   = np.fromiter((e.segment_id for e in efforts), dtype=np.int64, count=count)
+        self.start_ts      = np.fromiter((e.start_date.timestamp() for e in efforts), dtype=np.float64, count=count)
+        self.elapsed_times = np.fromiter((e.elapsed_time for e in efforts), dtype=np.int64, count=count)
+        self.genders       = np.fromiter(
+            (athlete_genders.get(e.athlete_id, UNKNOWN_GENDER) for e in efforts), dtype=np.int8, count=count  # type: ignore
+        )
+
+    def window(self, start_ts: float, end_ts: float) -> "np.ndarray":
+        """Boolean mask of efforts started within the given timestamps (inclusive)."""
+        return (self.start_ts >= start_ts) & (self.start_ts <= end_ts)
+
+    def rank(self, segment_id: int, gender: Gender, selection: "np.ndarray | None" = None) -> "np.ndarray":
+        """Rank the best effort of each athlete on a segment.
+
+        Ties are resolved like in every results backend: equal times are ordered by the earlier
+        start, then by the effort ID.
+
+        Args:
+            segment_id (int): The segment to rank.
+            gender (Gender): Only athletes of this gender are ranked.
+            selection (np.ndarray | None): Optional boolean mask restricting the efforts, e.g. a challenge window.
+
+        Returns:
+            np.ndarray: Indices of the best efforts, fastest first.
+        """
+        mask = (self.segment_ids == segment_id) & (self.genders == GENDER_CODES[gender])
+        if selection is not None:
+            mask &= selection
+
+        if not (indices := np.flatnonzero(mask)).size:
+            return indices
+
+        # Sort by athlete, then time, start and ID, and keep the first row of every athlete
+        order = np.lexsort((self.effort_ids[indices], self.start_ts[indices], self.elapsed_times[indices], self.athlete_ids[indices]))
+        indices = indices[order]
+        athletes = self.athlete_ids[indices]
+        group_starts = np.flatnonzero(np.r_[True, athletes[1:] != athletes[:-1]])
+
+        best = indices[group_starts]
+
+        return best[np.lexsort((self.effort_ids[best], self.start_ts[best], self.elapsed_times[best]))]
+
+    @staticmethod
+    def points(count: int, points: list[int]) -> "np.ndarray":
+        """Points awarded to the first ``count`` positions."""
+        awarded = np.zeros(count, dtype=np.int64)
+        awarded[:min(count, len(points))] = points[:count]
+        return awarded
+
+
+def top_n(athlete_ids: "np.ndarray", points: "np.ndarray", limit: int) -> Iterable[tuple[int, list[int], int]]:
+    """Select the best ``limit`` points of every athlete.
+
+    Args:
+        athlete_ids (np.ndarray): Athlete ID of every result.
+        points (np.ndarray): Points of every result.
+        limit (int): Maximum number of results counted per athlete.
+
+    Yields:
+        (int): Athlete ID,
+        (list[int]): Counted points, best first,
+        (int): Number of completed results.
+    """
+    if not athlete_ids.size:
+        return
+
+    order = np.lexsort((-points, athlete_ids))
+    athlete_ids, points = athlete_ids[order], points[order]
+
+    new_group = np.r_[True, athlete_ids[1:] != athlete_ids[:-1]]
+    group_starts = np.flatnonzero(new_group)
+    groups = np.cumsum(new_group) - 1
+    completed = np.diff(np.r_[group_starts, athlete_ids.size])
+
+    counted = (np.arange(athlete_ids.size) - group_starts[groups]) < limit
+    counted_points = np.split(points[counted], np.cumsum(np.minimum(completed, limit))[:-1])
+
+    for athlete_id, athlete_points, athlete_completed in zip(athlete_ids[group_starts], counted_points, completed):
+        yield int(athlete_id), athlete_points.tolist(), int(athlete_completed)
@@ -0,0 +1,54 @@
+"""Data Version Repository for cheap change detection of results and classification.
+
+Every challenge and season has a version counter which is incremented whenever efforts
+counting towards it are saved or deleted. Comparing it to the version a client has already
+seen is enough to answer conditional requests without querying efforts.
+"""
+from app.database import get_db_session, retry_db_operation
+from app.models.challenge import Challenge
+from app.models.data_version import DataVersion
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+
+def challenge_version_key(challenge_id: int) -> str:
+    """Version key of the efforts of a challenge."""
+    return f"challenge:{challenge_id}"
+
+
+def season_version_key(year: int) -> str:
+    """Version key of the efforts of a season."""
+    return f"season:{year}"
+
+
+class DataVersionRepository:
+    """Repository for managing DataVersion records in the database."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get(self, key: str) -> DataVersion | None:
+        """Get data version by key, None if the data never changed."""
+        return self.session.query(DataVersion).filter_by(key=key).first()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def bump(self, challenges: list[Challenge]) -> dict[str, int]:
+        """Increment the versions of the given challenges and of the seasons they belong to.
+
+        Returns:
+            dict[str, int]: Maps the bumped keys to their new versions.
+        """
+        keys = {challenge_version_key(challenge.id) for challenge in challenges}     # type: ignore
+        keys |= {season_version_key(challenge.start_date.year) for challenge in challenges}  # type: ignore
+
+        if not keys:
+            return {}
+
+        statement = insert(DataVersion).values([{"key": key, "version": 1} for key in sorted(keys)])
+        rows = self.session.execute(statement.on_conflict_do_update(
+            index_elements = [DataVersion.key],
+            set_           = {"version": DataVersion.version + 1, "updated_at": func.now()}
+        ).returning(DataVersion.key, DataVersion.version)).all()
+
+        return {key: version for key, version in rows}
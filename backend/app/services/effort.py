@@ -1,15 +1,25 @@
 """Effort Repository for managing Strava segment efforts in the database."""
-from datetime import datetime
-
-import requests
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
 
 from app.database import get_db_session, retry_db_operation
-from app.helpers import TimeSpan
+from app.helpers import Gender
 from app.models.challenge import Challenge
 from app.models.effort import Effort
+from app.services.activity import EffortRecord, iter_segment_efforts
 from app.services.athlete import AthleteRepository
-from app.services.challenge import ChallengeRepository
+from app.services.best_effort import BestEffortRepository
+from app.services import live, strava
+from app.services.challenge import ChallengeCalendar, ChallengeRepository, ChallengeWindow, get_calendar
+from app.services.data_version import DataVersionRepository, challenge_version_key
+from app.services.snapshot import SnapshotRepository
+from app.services.standings import StandingsRepository
 from config import config
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+EFFORT_INSERT_BATCH_SIZE = 5000  # Efforts per INSERT statement, well within the 65535 bind parameters of PostgreSQL
 
 
 class EffortRepository:
@@ -26,58 +36,133 @@ class EffortRepository:
             athlete_id (int): The ID of the athlete.
 
         Returns:
-            bool: True if the effort was added, False if it already exists or current challenge not among segment efforts.
+            bool: True if any effort was added, False if all already exist or no open challenge among segment efforts.
         """
 
-        # If there are already efforts for this activity, do not add again
-        if self.get_efforts_by_activity_id(activity_id):
-            return False
-
-        # Check if any challenge is currently active
-        if not (current_challenge := ChallengeRepository().get_current()):
+        # Check if any challenge accepts efforts: running, or ended recently enough for late uploads
+        grace_period = timedelta(seconds=config.LATE_EFFORT_GRACE_PERIOD)
+        if not (open_challenges := get_calendar().open_at(datetime.now(timezone.utc), grace_period)):
             return False
 
-        # Fetch activity data from Strava API
+        # Fetch activity data from Strava API, keeping only the efforts on segments of open challenges
         athlete_repo = AthleteRepository()
         access_token = athlete_repo.get_access_token(athlete_id)
-        response = requests.get(
-            url     = f"{config.STRAVA_API_URL}/activities/{activity_id}?include_all_efforts=true",
-            headers = {"Authorization": f"Bearer {access_token}"},
-            timeout = 100,
-            verify  = config.SSL_ENABLE)
+        segment_ids = {segment_id for challenge in open_challenges for segment_id in (challenge.climb_segment_id, challenge.sprint_segment_id)}
 
-        if not response.ok:
-            return False
+        with strava.client.get_activity(activity_id, access_token, stream=True) as response:  # type: ignore
+            if not response.ok:
+                return False
 
-        activity_data = response.json()
+            segment_efforts = list(iter_segment_efforts(response.iter_content(config.STRAVA_STREAM_CHUNK_SIZE), segment_ids))
 
-        # Check if the activity has any segment efforts
-        if not (segment_efforts := activity_data.get('segment_efforts')):
-            return False
+        # Check any segment effort belongs to an open challenge
+        effort_filter = EffortFilter(open_challenges)
+        matched_efforts = [(effort, matched_challenges) for effort in segment_efforts if (matched_challenges := effort_filter.match(effort))]
 
-        # Check any segment effort belongs to the current challenge
-        effort_saved = False
-        effort_filter = EffortFilter(current_challenge)
+        # Bring the leaderboards of running challenges up to date before the efforts change them
+        if config.LIVE_LEADERBOARD_ENABLED:
+            now = datetime.now(timezone.utc)
+            for challenge in {challenge for _, matched_challenges in matched_efforts for challenge in matched_challenges}:
+                if challenge.start_date <= now <= challenge.end_date:
+                    live.refresh(challenge.id)
+
+        # Insert them at once; efforts already stored, e.g. by a concurrent delivery of the event, are skipped
+        inserted_ids = self.add_efforts([effort for effort, _ in matched_efforts])
+
+        challenges: dict[int, ChallengeWindow] = {}
+        saved_efforts: dict[int, list[EffortRecord]] = defaultdict(list)  # Maps challenge ID to its saved efforts
+
+        for effort, matched_challenges in matched_efforts:
+            if effort.id in inserted_ids:
+                for challenge in matched_challenges:
+                    challenges[challenge.id] = challenge
+                    saved_efforts[challenge.id].append(effort)
+
+        if not saved_efforts:
+            return False
 
-        for effort_data in segment_efforts:
-            if effort_filter(effort_data):
-                self._save_effort(effort_data)
-                effort_saved = True
+        if config.BEST_EFFORTS_ENABLED:
+            BestEffortRepository().offer(
+                (effort, [challenge.id for challenge in matched_challenges])
+                for effort, matched_challenges in matched_efforts if effort.id in inserted_ids
+            )
+
+        versions = self._on_efforts_changed(list(challenges.values()))  # type: ignore
+
+        # Keep the in-memory leaderboard of the active challenge and its streaming clients in step
+        if config.LIVE_LEADERBOARD_ENABLED and (athlete := athlete_repo.get_by_id(athlete_id)) and athlete.sex in Gender.values():
+            for challenge_id, challenge_efforts in saved_efforts.items():
+                live.record(
+                    session      = self.session,
+                    challenge_id = challenge_id,
+                    version      = versions[challenge_version_key(challenge_id)],
+                    gender       = Gender(athlete.sex),
+                    entries      = [live.LiveEntry.from_effort(effort, f"{athlete.firstname} {athlete.lastname}") for effort in challenge_efforts]
+                )
 
-        return effort_saved
+        return True
 
     @retry_db_operation(max_retries=3, delay=1)
     def delete_efforts_by_activity_id(self, activity_id: int) -> int:
         """Remove all effort records related with given activity ID."""
-        deleted_count = self.session.query(Effort).filter_by(activity_id=activity_id).delete()
+        query = self.session.query(Effort).filter_by(activity_id=activity_id)
+        deleted_efforts = query.with_entities(Effort.segment_id, Effort.start_date, Effort.athlete_id).all()
+        deleted_count = query.delete()
+
+        if deleted_count:
+            self.refresh_challenges(
+                ChallengeRepository().get_for_efforts((segment_id, start_date) for segment_id, start_date, _ in deleted_efforts),  # type: ignore
+                athletes = {(segment_id, athlete_id) for segment_id, _, athlete_id in deleted_efforts}
+            )
+
         return deleted_count
 
     @retry_db_operation(max_retries=3, delay=1)
     def delete_efforts_by_athlete_id(self, athlete_id: int) -> int:
         """Remove all effort records related with given athlete ID."""
-        deleted_count = self.session.query(Effort).filter_by(athlete_id=athlete_id).delete()
+        query = self.session.query(Effort).filter_by(athlete_id=athlete_id)
+        deleted_efforts = query.with_entities(Effort.segment_id, Effort.start_date, Effort.athlete_id).all()
+        deleted_count = query.delete()
+
+        if deleted_count:
+            self.refresh_challenges(
+                ChallengeRepository().get_for_efforts((segment_id, start_date) for segment_id, start_date, _ in deleted_efforts),  # type: ignore
+                athletes = {(segment_id, athlete_id) for segment_id, _, athlete_id in deleted_efforts}
+            )
+
         return deleted_count
 
+    @retry_db_operation(max_retries=3, delay=1)
+    def add_efforts(self, efforts: list[EffortRecord]) -> set[int]:
+        """Insert efforts in bulk with ``INSERT ... ON CONFLICT (id, start_date) DO NOTHING``, skipping those already stored.
+
+        Efforts never change once recorded, so inserting them again is a no-op and concurrent
+        ingestions of the same activity are safe. Unlike ``add`` this does not update the data
+        derived from the efforts; call ``refresh_challenges`` once all efforts are added.
+
+        Returns:
+            set[int]: IDs of the efforts inserted.
+        """
+        inserted_ids: set[int] = set()
+
+        for start in range(0, len(efforts), EFFORT_INSERT_BATCH_SIZE):
+            batch = efforts[start:start + EFFORT_INSERT_BATCH_SIZE]
+            statement = insert(Effort).values([effort._asdict() for effort in batch])
+            # The start date of an effort never changes, so the primary key of the partitioned table identifies it like its ID
+            statement = statement.on_conflict_do_nothing(index_elements=[Effort.id, Effort.start_date]).returning(Effort.id)
+            inserted_ids.update(self.session.scalars(statement))
+
+        return inserted_ids
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_activity_ids(self, athlete_id: int, start_date: datetime, end_date: datetime) -> set[int]:
+        """Retrieve the IDs of the activities of an athlete with efforts stored within a date range."""
+        return set(self.session.scalars(select(Effort.activity_id).distinct().where(
+            Effort.athlete_id == athlete_id,
+            Effort.start_date >= start_date,
+            Effort.start_date <= end_date
+        )))
+
     @retry_db_operation(max_retries=3, delay=1)
     def get_efforts_by_activity_id(self, activity_id: int) -> list[Effort]:
         """Retrieve all efforts related to a specific activity ID."""
@@ -92,44 +177,55 @@ class EffortRepository:
             Effort.start_date <= end_date
         ).all()
 
-    @retry_db_operation(max_retries=3, delay=1)
-    def _save_effort(self, data: dict) -> None:
-        """Save a single effort record to the database."""
+    def _on_efforts_changed(self, challenges: list[Challenge]) -> dict[str, int]:
+        """Propagate changed efforts of the given challenges to the data derived from them.
 
-        effort = Effort(
-            id=data.get('id'),
-            activity_id=data.get('activity', {}).get('id'),
-            athlete_id=data.get('athlete', {}).get('id'),
-            segment_id=data.get('segment', {}).get('id'),
-            start_date=data.get('start_date'),
-            elapsed_time=data.get('elapsed_time', 0),
-        )
+        Returns:
+            dict[str, int]: New data versions of the challenges and their seasons.
+        """
+        versions = DataVersionRepository().bump(challenges)
+        SnapshotRepository().invalidate(challenges)
 
-        self.session.add(effort)
+        if config.STANDINGS_ENABLED:
+            self.session.flush()
+            standings_repo = StandingsRepository()
+            for challenge in challenges:
+                standings_repo.refresh_challenge(challenge)
+
+        return versions
+
+    def refresh_challenges(self, challenges: list[Challenge], athletes: Iterable[tuple[int, int]] | None = None) -> None:
+        """Propagate efforts removed or added in bulk and tell streaming clients of the challenges to reload.
+
+        Args:
+            challenges (list[Challenge]): The challenges whose efforts changed.
+            athletes (Iterable[tuple[int, int]] | None): Pairs of segment ID and athlete ID whose efforts changed, defaults to all.
+        """
+        if config.BEST_EFFORTS_ENABLED:
+            BestEffortRepository().rebuild(challenges, athletes)
+
+        versions = self._on_efforts_changed(challenges)
+
+        if config.LIVE_LEADERBOARD_ENABLED:
+            for challenge in challenges:
+                live.publish_reset(self.session, challenge.id, versions[challenge_version_key(challenge.id)])  # type: ignore
 
 
 class EffortFilter:
-    """Filter the effort based on given challange."""
-
-    def __init__(self, challenge: Challenge):
-        """Initialize with challenge."""
-        self.challenge = challenge
-        self._segment_ids = {challenge.climb_segment_id, challenge.sprint_segment_id}
-        self._challenge_timespan = TimeSpan(
-            start = challenge.start_date,  # type: ignore
-            end   = challenge.end_date     # type: ignore
-        )
-
-    def __call__(self, effort_data: dict) -> bool:
-        """Check if the effort matches the challenge filter criteria."""
+    """Filter the effort based on given challenges."""
 
-        effort_segment_id: int | None = effort_data.get('segment', {}).get('id')
-        effort_start_date: datetime | None = effort_data.get('start_date')
+    def __init__(self, challenges: list[ChallengeWindow]):
+        """Initialize with challenges."""
+        self.challenges = challenges
+        self._calendar = ChallengeCalendar(challenges)
 
-        if not effort_segment_id or effort_segment_id not in self._segment_ids:
-            return False
+    def __call__(self, effort: EffortRecord) -> bool:
+        """Check if the effort matches the challenge filter criteria."""
+        return bool(self.match(effort))
 
-        if not effort_start_date or effort_start_date not in self._challenge_timespan:
-            return False
+    def match(self, effort: EffortRecord) -> list[ChallengeWindow]:
+        """Get the challenges having the effort's segment and containing its start date."""
+        if not effort.segment_id:
+            return []
 
-        return True
+        return self._calendar.find(effort.segment_id, effort.start_date)
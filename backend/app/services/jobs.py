@@ -0,0 +1,206 @@
+"""Job Repository for the durable job queue.
+
+Background work is stored in the ``jobs`` table, so it survives restarts and can be drained by
+any number of worker processes on any node (see ``app.services.worker``):
+
+- Jobs are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent workers never wait
+  for each other nor claim the same job.
+- A claimed job is invisible to other workers until its visibility timeout passes, renewed by
+  its worker while the job runs. A worker dying mid-job therefore only delays it.
+- A claim is identified by the job and its attempt. Once a job is claimed again, e.g. after its
+  worker stalled past the timeout, the former worker can no longer renew, complete or retry it.
+- Jobs with the same dedup key are enqueued once, e.g. a webhook event delivered twice.
+- Jobs with the same coalesce key are merged while pending, e.g. a burst of webhook events of one
+  activity is processed as a single job once its debounce window has passed.
+- Failed jobs are retried with exponential backoff and dead-lettered (kept with status ``dead``)
+  after ``JOB_MAX_ATTEMPTS`` attempts.
+"""
+import logging
+
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+
+from app.database import get_db_session, retry_db_operation
+from app.models.job import Job
+from config import config
+from sqlalchemy import ColumnElement, and_, func, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENT = "webhook_event"  # Payload is the webhook event sent by Strava
+WEBHOOK_EVENTS = "webhook_events"  # Payload holds the coalesced webhook events of one object in "events"
+FETCH_SEGMENT = "fetch_segment"  # Payload holds the segment_id to fetch from Strava
+REFRESH_TOKEN = "refresh_token"  # Payload holds the athlete_id whose tokens to refresh
+BACKFILL_CHALLENGE = "backfill_challenge"  # Payload holds the challenge_id to backfill efforts into
+
+
+class ClaimedJob(NamedTuple):
+    """Job claimed by a worker."""
+    id      : int
+    kind    : str
+    payload : dict[str, Any]
+    attempts: int  # Including the current one
+
+
+class JobRepository:
+    """Repository for managing Job records in the database."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def enqueue(self, kind: str, payload: dict[str, Any], dedup_key: str | None = None, delay: float = 0) -> bool:
+        """Add a job to the queue.
+
+        Args:
+            kind (str): The kind of job, selects its handler.
+            payload (dict[str, Any]): Arguments of the handler.
+            dedup_key (str | None): Key identifying the job, it is not enqueued again while a job with the same key exists.
+            delay (float): Seconds before the job may run.
+
+        Returns:
+            bool: True if the job was enqueued, False if it is a duplicate.
+        """
+        statement = insert(Job).values(
+            kind      = kind,
+            payload   = payload,
+            dedup_key = dedup_key,
+            run_after = func.now() + timedelta(seconds=delay)
+        ).on_conflict_do_nothing(index_elements=[Job.dedup_key]).returning(Job.id)
+
+        return self.session.execute(statement).first() is not None
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def coalesce(self, kind: str, coalesce_key: str, event: dict[str, Any], delay: float) -> bool:
+        """Append an event to the pending job with the same coalesce key, or enqueue a new job.
+
+        A new job holds the event in ``payload["events"]`` and runs after ``delay`` seconds. Events
+        arriving until then are appended to it; once it is claimed, the next event starts a new job.
+
+        Returns:
+            bool: True if a new job was enqueued, False if the event was merged into a pending one.
+        """
+        statement = insert(Job).values(
+            kind         = kind,
+            payload      = {"events": [event]},
+            coalesce_key = coalesce_key,
+            run_after    = func.now() + timedelta(seconds=delay)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements = [Job.coalesce_key],
+            index_where    = Job.status == 'pending',
+            set_           = {
+                "payload": func.jsonb_set(Job.payload, '{events}', Job.payload['events'].op('||')(statement.excluded.payload['events'])),
+                "updated_at": func.now()
+            }
+        ).returning(literal_column("xmax = 0"))  # True if inserted, False if merged by the update
+
+        return bool(self.session.execute(statement).scalar())
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def claim(self, limit: int = 1) -> list[ClaimedJob]:
+        """Claim due jobs, including running ones whose visibility timeout passed.
+
+        The claim is visible to other workers once the session commits.
+        """
+        now = func.now()
+        due = select(Job.id).where(or_(
+            and_(Job.status == 'pending', Job.run_after <= now),
+            and_(Job.status == 'running', Job.locked_until < now)
+        )).order_by(Job.run_after).limit(limit).with_for_update(skip_locked=True)
+
+        rows = self.session.execute(update(Job).where(Job.id.in_(due.scalar_subquery())).values(
+            status       = 'running',
+            attempts     = Job.attempts + 1,
+            locked_until = now + timedelta(seconds=config.JOB_VISIBILITY_TIMEOUT),
+            updated_at   = now
+        ).returning(Job.id, Job.kind, Job.payload, Job.attempts)).all()
+
+        return [ClaimedJob(*row) for row in rows]
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def renew(self, job: ClaimedJob) -> bool:
+        """Extend the visibility timeout of a job still held by the worker.
+
+        Returns:
+            bool: False if the job was claimed again meanwhile.
+        """
+        result = self.session.execute(update(Job).where(_held(job)).values(
+            locked_until = func.now() + timedelta(seconds=config.JOB_VISIBILITY_TIMEOUT),
+            updated_at   = func.now()
+        ))
+
+        return result.rowcount > 0
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def complete(self, job: ClaimedJob) -> bool:
+        """Remove a finished job from the queue.
+
+        Returns:
+            bool: False if the job was claimed again meanwhile, it is then left to the new claim.
+        """
+        return self.session.query(Job).filter(_held(job)).delete() > 0
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def fail(self, job: ClaimedJob, error: str) -> bool:
+        """Schedule a retry of a failed job, or dead-letter it after too many attempts.
+
+        A job claimed again meanwhile is left to the new claim.
+
+        Returns:
+            bool: True if the job will be retried, False if it was dead-lettered.
+        """
+        retry = job.attempts < config.JOB_MAX_ATTEMPTS
+        delay = timedelta(seconds=config.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+
+        result = self.session.execute(update(Job).where(_held(job)).values(
+            coalesce_key = None,  # Do not merge new events into a job which already ran
+            status       = 'pending' if retry else 'dead',
+            run_after    = func.now() + delay if retry else Job.run_after,
+            locked_until = None,
+            last_error   = error,
+            updated_at   = func.now()
+        ))
+
+        if not result.rowcount:
+            logger.warning("Job %d (%s) was claimed again, attempt %d not recorded", job.id, job.kind, job.attempts)
+            return True
+
+        if not retry:
+            logger.error("Job %d (%s) dead-lettered after %d attempts: %s", job.id, job.kind, job.attempts, error)
+
+        return retry
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def defer(self, job: ClaimedJob, run_after: datetime) -> None:
+        """Put a claimed job back without counting the attempt, e.g. when Strava's rate limit is spent.
+
+        A job claimed again meanwhile is left to the new claim.
+        """
+        self.session.execute(update(Job).where(_held(job)).values(
+            coalesce_key = None,  # Do not merge new events into a job which already ran
+            status       = 'pending',
+            attempts     = Job.attempts - 1,
+            run_after    = run_after,
+            locked_until = None,
+            updated_at   = func.now()
+        ))
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def requeue_dead(self, kind: str | None = None) -> int:
+        """Give dead-lettered jobs a fresh set of attempts.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        query = self.session.query(Job).filter_by(status='dead')
+        if kind:
+            query = query.filter_by(kind=kind)
+
+        return query.update({"status": 'pending', "attempts": 0, "run_after": func.now()}, synchronize_session=False)
+
+
+def _held(job: ClaimedJob) -> ColumnElement[bool]:
+    """Condition matching a job while it is still held by the claim of the worker."""
+    return and_(Job.id == job.id, Job.status == 'running', Job.attempts == job.attempts)
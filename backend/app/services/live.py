@@ -0,0 +1,341 @@
+"""Live leaderboard of the active challenge kept in memory.
+
+The results of the challenge currently running are requested far more often than any other,
+and they only change when the webhook ingests a new effort. Each worker process keeps the best
+time of every athlete per segment type and gender in a sorted list:
+
+- It is built from the database when the active challenge is first requested (or at startup).
+- New efforts ingested by this process are inserted with a binary search once their
+  transaction commits. A process holding no leaderboard, or an outdated one, e.g. a job worker
+  or a process missing the changes of another one, rebuilds it before saving the efforts, so
+  that it still publishes their rank changes instead of a reset.
+- It is tied to the data version of the challenge (see ``app.services.data_version``). When any
+  process changes the efforts, e.g. a deletion or an ingestion handled by another worker, the
+  version no longer matches and the leaderboard is rebuilt on the next request.
+
+Every ingestion also publishes the resulting rank changes to the streaming clients (see
+``app.services.broadcast``), computed once by the process that ingested the effort.
+"""
+import logging
+import threading
+
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Any, Generator, NamedTuple
+
+from app.helpers import Gender
+from app.services.activity import EffortRecord
+from app.services import broadcast
+from app.services.challenge import ChallengeRepository
+from app.services.data_version import DataVersionRepository, challenge_version_key
+from app.services.results import ResultService
+from config import config
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class LiveEntry(NamedTuple):
+    """Best effort of an athlete.
+
+    Entries are ordered by their leading fields ``(elapsed_time, start_date, effort_id)``, the rank
+    order of every results backend (see ``app.services.best_effort.RANK_ORDER``).
+    """
+    elapsed_time: int
+    start_date  : datetime
+    effort_id   : int
+    activity_id : int
+    athlete_id  : int
+    athlete_name: str
+    segment_id  : int
+
+    @classmethod
+    def from_effort(cls, effort: EffortRecord, athlete_name: str) -> "LiveEntry":
+        """Create an entry from a segment effort of the STRAVA activity API."""
+        return cls(
+            elapsed_time = effort.elapsed_time,
+            start_date   = effort.start_date,
+            effort_id    = effort.id,
+            activity_id  = effort.activity_id,
+            athlete_id   = effort.athlete_id,
+            athlete_name = athlete_name,
+            segment_id   = effort.segment_id
+        )
+
+    @property
+    def rank_key(self) -> tuple[int, datetime, int]:
+        """Fields ranking the entry, the best first."""
+        return self.elapsed_time, self.start_date, self.effort_id
+
+
+class LiveRanking:
+    """Best effort per athlete on one segment for one gender, kept sorted by time."""
+
+    def __init__(self):
+        self._sorted : list[LiveEntry]     = []  # Best entries, fastest first
+        self._entries: dict[int, LiveEntry] = {}  # Maps athlete ID to the athlete's best entry
+
+    def __iter__(self):
+        return iter(self._sorted)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def offer(self, entry: LiveEntry) -> int | None:
+        """Insert an effort if it ranks before the athlete's best one.
+
+        An effort of equal time replaces the best one if it started earlier, like in the results backends.
+
+        Returns:
+            int | None: New zero-based position of the athlete, None if the effort is not an improvement.
+        """
+        if (current := self._entries.get(entry.athlete_id)) is not None:
+            if current.rank_key <= entry.rank_key:
+                return None
+            del self._sorted[bisect_left(self._sorted, current)]
+
+        self._entries[entry.athlete_id] = entry
+        insort(self._sorted, entry)
+
+        return bisect_left(self._sorted, entry)
+
+    def copy(self) -> "LiveRanking":
+        """Shallow copy of the ranking, the entries are immutable."""
+        ranking = LiveRanking()
+        ranking._sorted  = list(self._sorted)
+        ranking._entries = dict(self._entries)
+        return ranking
+
+    def position(self, athlete_id: int) -> int | None:
+        """Zero-based position of the athlete, None if not ranked."""
+        if (entry := self._entries.get(athlete_id)) is None:
+            return None
+        return bisect_left(self._sorted, entry)
+
+
+class LiveLeaderboard:
+    """Rankings of all segment types and genders of the active challenge."""
+
+    def __init__(self, challenge_id: int, segment_ids: dict[str, int], end_date: datetime, version: int):
+        """Initialize an empty leaderboard built from the given data version of the challenge."""
+        self.challenge_id = challenge_id
+        self.segment_ids  = segment_ids  # Maps segment type to segment ID
+        self.end_date     = end_date
+        self.version      = version
+        self.rankings: dict[tuple[str, Gender], LiveRanking] = {
+            (segment_type, gender): LiveRanking() for segment_type in segment_ids for gender in Gender
+        }
+
+    @classmethod
+    def from_result_service(cls, result_service: ResultService, version: int) -> "LiveLeaderboard":
+        """Build the leaderboard from a ResultService already populated from the database."""
+        leaderboard = cls(result_service._challenge_id, dict(result_service._segment_ids), result_service._end_date, version)  # type: ignore
+
+        for (segment_type, gender), ranking in leaderboard.rankings.items():
+            for result in result_service.yield_results(segment_type, gender):
+                ranking.offer(LiveEntry(
+                    elapsed_time = result["time"],
+                    start_date   = datetime.fromisoformat(result["recorded_at"]),
+                    effort_id    = result["id"],
+                    activity_id  = result["activity_id"],
+                    athlete_id   = result["athlete_id"],
+                    athlete_name = result["athlete_name"],
+                    segment_id   = result["segment_id"]
+                ))
+
+        return leaderboard
+
+    def is_current(self, challenge_id: int, version: int) -> bool:
+        """Whether the leaderboard still reflects the given challenge, its data version and is running."""
+        return self.challenge_id == challenge_id and self.version == version and datetime.now(timezone.utc) <= self.end_date
+
+    def segment_type_of(self, segment_id: int) -> str | None:
+        """Segment type of the given segment in this challenge."""
+        return next((segment_type for segment_type, id_ in self.segment_ids.items() if id_ == segment_id), None)
+
+    def offer_all(self, gender: Gender, entries: list[LiveEntry]) -> dict[tuple[str, Gender], LiveRanking]:
+        """Apply efforts to copies of the affected rankings, leaving the leaderboard untouched.
+
+        Returns:
+            dict[tuple[str, Gender], LiveRanking]: The updated rankings by segment type and gender.
+        """
+        updated: dict[tuple[str, Gender], LiveRanking] = {}
+
+        for entry in entries:
+            if segment_type := self.segment_type_of(entry.segment_id):
+                key = (segment_type, gender)
+                if key not in updated:
+                    updated[key] = self.rankings[key].copy()
+                updated[key].offer(entry)
+
+        return updated
+
+    def diff(self, updated: dict[tuple[str, Gender], LiveRanking]) -> list[dict[str, Any]]:
+        """List the rank changes between the current rankings and the updated ones.
+
+        Every athlete whose time, position or points differ is reported once, with ``change`` being
+        ``new`` for a first ranked effort, ``improved`` for a better time and ``moved`` for athletes
+        shifted by someone else.
+        """
+        changes = []
+
+        for (segment_type, gender), ranking in updated.items():
+            previous = {entry.athlete_id: (i, entry) for i, entry in enumerate(self.rankings[(segment_type, gender)])}
+
+            for i, entry in enumerate(ranking):
+                previous_position, previous_entry = previous.get(entry.athlete_id, (None, None))
+                if previous_position == i and previous_entry == entry:
+                    continue
+
+                changes.append({
+                    "segment_type": segment_type,
+                    "gender": gender,
+                    "change": "new" if previous_entry is None else "improved" if previous_entry != entry else "moved",
+                    "athlete_id": entry.athlete_id,
+                    "athlete_name": entry.athlete_name,
+                    "time": entry.elapsed_time,
+                    "previous_time": previous_entry.elapsed_time if previous_entry else None,
+                    "position": i + 1,
+                    "previous_position": previous_position + 1 if previous_position is not None else None,
+                    "points": _points(i),
+                    "previous_points": _points(previous_position) if previous_position is not None else None
+                })
+
+        return changes
+
+    def yield_results(self, segment_type: str, gender: Gender) -> Generator[dict[str, Any], None, None]:
+        """Yield results in the same format as ``ResultService.yield_results``."""
+        for i, entry in enumerate(self.rankings[(segment_type, gender)]):
+            yield {
+                "id": entry.effort_id,
+                "activity_id": entry.activity_id,
+                "athlete_id": entry.athlete_id,
+                "athlete_name": entry.athlete_name,
+                "athlete_gender": gender,
+                "challenge_id": self.challenge_id,
+                "segment_id": entry.segment_id,
+                "segment_type": segment_type,
+                "time": entry.elapsed_time,
+                "recorded_at": entry.start_date.isoformat(),
+                "points": _points(i),
+                "position": i + 1
+            }
+
+
+def _points(position: int) -> int:
+    """Points awarded to the given zero-based position."""
+    return config.POINTS[position] if position < len(config.POINTS) else 0
+
+
+_lock = threading.Lock()
+_leaderboard: LiveLeaderboard | None = None  # Leaderboard of the active challenge in this process
+
+
+def get_results(challenge_id: int, version: int, segment_types: list[str], genders: list[Gender]) -> list[dict[str, Any]] | None:
+    """Get results of the challenge from the live leaderboard.
+
+    Returns:
+        list[dict[str, Any]] | None: Results in the format of ``ResultService.yield_results``, or None
+            when the challenge is not the active one or the leaderboard is not at the given data version.
+    """
+    with _lock:
+        if _leaderboard is None or not _leaderboard.is_current(challenge_id, version):
+            return None
+
+        return [
+            result
+            for segment_type in segment_types
+            for gender in genders
+            for result in _leaderboard.yield_results(segment_type, gender)
+        ]
+
+
+def store_leaderboard(result_service: ResultService, version: int) -> LiveLeaderboard:
+    """Build the live leaderboard of the active challenge from a populated ResultService."""
+    global _leaderboard  # pylint: disable=global-statement
+
+    leaderboard = LiveLeaderboard.from_result_service(result_service, version)
+    with _lock:
+        _leaderboard = leaderboard
+
+    logger.info("Live leaderboard of challenge %d built at version %d", leaderboard.challenge_id, version)
+    return leaderboard
+
+
+def warm_up() -> None:
+    """Build the live leaderboard of the currently active challenge, if there is one.
+
+    Must be called within an application context.
+    """
+    if not (challenge := ChallengeRepository().get_current()):
+        return
+
+    data_version = DataVersionRepository().get(challenge_version_key(challenge.id))  # type: ignore
+    result_service = ResultService(challenge.id)  # type: ignore
+    result_service.query_from_db()
+    store_leaderboard(result_service, data_version.version if data_version else 0)  # type: ignore
+
+
+def refresh(challenge_id: int) -> None:
+    """Rebuild the live leaderboard of a running challenge unless it is at the stored data version.
+
+    Called before new efforts are saved, so that ``record`` can compute their rank changes. Must be
+    called within an application context.
+    """
+    data_version = DataVersionRepository().get(challenge_version_key(challenge_id))
+    version = data_version.version if data_version else 0
+
+    with _lock:
+        if _leaderboard is not None and _leaderboard.is_current(challenge_id, version):
+            return
+
+    result_service = ResultService(challenge_id)
+    result_service.query_from_db()
+    if result_service.is_active:
+        store_leaderboard(result_service, version)
+
+
+def record(session: Session, challenge_id: int, version: int, gender: Gender, entries: list[LiveEntry]) -> None:
+    """Publish the rank changes caused by newly saved efforts and apply them once the session commits.
+
+    The changes are computed only if the leaderboard is at the version directly preceding the given
+    one, i.e. no other change was missed, which ``refresh`` ensures unless another process saved
+    efforts meanwhile. Otherwise streaming clients are told to reload and the leaderboard stays
+    outdated until it is rebuilt.
+
+    Args:
+        session (Session): The session the efforts were saved in.
+        challenge_id (int): The challenge the efforts belong to.
+        version (int): The data version of the challenge after saving the efforts.
+        gender (Gender): Gender of the athlete who recorded the efforts.
+        entries (list[LiveEntry]): The saved efforts.
+    """
+    updated: dict[tuple[str, Gender], LiveRanking] = {}
+    changes: list[dict[str, Any]] = []
+
+    with _lock:
+        if (leaderboard := _leaderboard) is not None and leaderboard.is_current(challenge_id, version - 1):
+            updated = leaderboard.offer_all(gender, entries)
+            changes = leaderboard.diff(updated)
+        else:
+            leaderboard = None
+
+    if leaderboard is None:
+        publish_reset(session, challenge_id, version)
+        return
+
+    broadcast.publish(session, {"type": "delta", "challenge_id": challenge_id, "version": version, "changes": changes})
+
+    def apply(_session):
+        with _lock:
+            if _leaderboard is leaderboard and leaderboard.is_current(challenge_id, version - 1):
+                leaderboard.rankings.update(updated)
+                leaderboard.version = version
+
+    event.listen(session, "after_commit", apply, once=True)
+
+
+def publish_reset(session: Session, challenge_id: int, version: int) -> None:
+    """Tell streaming clients of the challenge to reload its results once the session commits."""
+    broadcast.publish(session, {"type": "reset", "challenge_id": challenge_id, "version": version})
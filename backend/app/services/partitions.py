@@ -0,0 +1,103 @@
+"""Yearly partitions of the efforts table.
+
+``efforts`` is range-partitioned by ``start_date``, one partition per season, e.g. ``efforts_y2025``
+for the efforts of 2025 (UTC), so that queries of a season or a challenge window only scan the
+partition of that season, and past seasons can be detached instead of deleted row by row:
+
+- Partitions are created for the seasons of every new challenge, and for the current and the next
+  season when the table is partitioned. Efforts outside all partitions go to ``efforts_default``
+  and are moved into the partition of their season once it is created.
+- A detached partition is kept as a plain table, e.g. to be archived with ``pg_dump`` and dropped,
+  or attached again. Its efforts are no longer read by results and the classification.
+
+Run ``flask --app app create-effort-partitions`` or ``flask --app app detach-effort-partition``.
+"""
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import Connection, text
+from sqlalchemy.orm import Session
+
+PARENT_TABLE = 'efforts'
+DEFAULT_PARTITION = 'efforts_default'
+
+_LOCK_KEY = 7_262_202  # Key of the PostgreSQL advisory lock serializing partition changes
+
+
+def partition_name(year: int) -> str:
+    """Name of the partition of a season."""
+    return f"{PARENT_TABLE}_y{year}"
+
+
+def season_bounds(year: int) -> tuple[datetime, datetime]:
+    """Start of a season and of the next one, the bounds of its partition."""
+    return datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+
+
+def ensure_partitions(connection: Connection | Session, years: Iterable[int], parent: str = PARENT_TABLE) -> list[str]:
+    """Create the partitions of seasons which have none yet.
+
+    Efforts of the season stored in the default partition meanwhile are moved into the new one.
+    Attaching a partition does not block reads or writes of the other partitions.
+
+    Args:
+        connection (Connection | Session): Connection or session, within a transaction.
+        years (Iterable[int]): Seasons to create partitions of.
+        parent (str): Partitioned table, another one than ``efforts`` only while it is rebuilt.
+
+    Returns:
+        list[str]: Names of the partitions created.
+    """
+    created = []
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+
+    for year in sorted(set(years)):
+        name = partition_name(year)
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+            continue  # Attached, or detached and kept as an archive
+
+        start, end = season_bounds(year)
+        connection.execute(text(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)"))
+        connection.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE start_date >= :start AND start_date < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), {"start": start, "end": end})
+        # Indexes, the primary key and foreign keys of the parent are created on the partition as it is attached
+        connection.execute(text(
+            f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        created.append(name)
+
+    return created
+
+
+def detach_partition(connection: Connection | Session, year: int, drop: bool = False) -> bool:
+    """Detach the partition of a season, keeping it as a table unless dropped.
+
+    Returns:
+        bool: False if the season has no attached partition.
+    """
+    name = partition_name(year)
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+
+    attached = connection.execute(text(
+        "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name) AND inhparent = to_regclass(:parent)"
+    ), {"name": name, "parent": PARENT_TABLE}).scalar()
+
+    if not attached:
+        return False
+
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+
+    if drop:
+        connection.execute(text(f"DROP TABLE {name}"))
+        return True
+
+    # An archive must not reference athletes, or deleting an athlete would fail on its efforts
+    foreign_keys = connection.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:name) AND contype = 'f'"
+    ), {"name": name}).scalars().all()
+    for foreign_key in foreign_keys:
+        connection.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {foreign_key}"))
+
+    return True
@@ -0,0 +1,174 @@
+"""Scheduling of Strava API calls within the rate limits.
+
+Strava limits API usage per 15-minute window (reset on every quarter hour) and per day (reset at
+midnight UTC), overall and for read requests, and reports the application's usage in the
+``X-RateLimit-*`` and ``X-ReadRateLimit-*`` response headers. ``StravaRateLimiter`` tracks every
+window from these headers and counts calls sent since the last response:
+
+- High priority calls (activity fetches driven by webhooks) may use the whole budget.
+- Low priority calls (segment fetches, backfills) are refused with ``RateLimitDeferred`` once the
+  usage reaches the share of the budget reserved for high priority calls, so that they can be
+  retried after the window resets instead of causing 429 responses.
+- Calls Strava refuses with 429 anyway raise ``RateLimitDeferred`` as well.
+"""
+import enum
+import logging
+import threading
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    """Priority of a Strava call."""
+    LOW = 0   # Backfills, segment fetches
+    HIGH = 1  # Webhook-driven activity fetches
+
+
+class RateLimitDeferred(Exception):
+    """Raised instead of sending a Strava call which would exceed the rate limit budget."""
+
+    def __init__(self, window: str, retry_at: datetime):
+        super().__init__(f"Strava {window} rate limit budget spent, retry at {retry_at.isoformat()}")
+        self.window = window
+        self.retry_at = retry_at
+
+
+def _next_quarter_hour(now: datetime) -> datetime:
+    """Start of the next 15-minute window."""
+    return now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0) + timedelta(minutes=15)
+
+
+def _next_midnight(now: datetime) -> datetime:
+    """Start of the next daily window."""
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+class RateWindow:
+    """Usage of one rate limit window."""
+
+    def __init__(self, name: str, limit: int, next_reset):
+        self.name = name
+        self.limit = limit
+        self.usage = 0
+        self._next_reset = next_reset
+        self.resets_at = next_reset(datetime.now(timezone.utc))
+
+    def roll(self, now: datetime) -> None:
+        """Reset the usage once the window has passed."""
+        if now >= self.resets_at:
+            self.usage = 0
+            self.resets_at = self._next_reset(now)
+
+
+class StravaRateLimiter:
+    """Tracks Strava rate limit windows and admits calls by priority."""
+
+    # Header prefix, window names and default limits of the windows, in header order
+    WINDOWS = {
+        "X-RateLimit": (("15min", 200, _next_quarter_hour), ("daily", 2000, _next_midnight)),
+        "X-ReadRateLimit": (("read_15min", 100, _next_quarter_hour), ("read_daily", 1000, _next_midnight))
+    }
+
+    def __init__(self, low_priority_reserve: float):
+        """Initialize the limiter.
+
+        Args:
+            low_priority_reserve (float): Share of every window kept for high priority calls, e.g. 0.2.
+        """
+        self.low_priority_reserve = low_priority_reserve
+        self._lock = threading.Lock()
+        self._windows: dict[str, RateWindow] = {
+            name: RateWindow(name, limit, next_reset)
+            for windows in self.WINDOWS.values()
+            for name, limit, next_reset in windows
+        }
+        self._sent: Counter[str] = Counter()
+        self._deferred: Counter[str] = Counter()
+        self._throttled = 0
+
+    def acquire(self, priority: Priority, read: bool = True) -> None:
+        """Admit a call, counting it against the windows until a response reports the real usage.
+
+        Args:
+            priority (Priority): Priority of the call.
+            read (bool): Whether the call is a read request, also limited by the read windows.
+
+        Raises:
+            RateLimitDeferred: If the budget available to the priority is spent.
+        """
+        now = datetime.now(timezone.utc)
+        windows = [window for name, window in self._windows.items() if read or not name.startswith("read_")]
+
+        with self._lock:
+            for window in windows:
+                window.roll(now)
+                budget = window.limit if priority == Priority.HIGH else window.limit * (1 - self.low_priority_reserve)
+
+                if window.usage >= budget:
+                    self._deferred[priority.name] += 1
+                    raise RateLimitDeferred(window.name, window.resets_at)
+
+            for window in windows:
+                window.usage += 1
+            self._sent[priority.name] += 1
+
+    def update(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Update the windows from the headers of a Strava response."""
+        with self._lock:
+            for prefix, windows in self.WINDOWS.items():
+                limits, usages = headers.get(f"{prefix}-Limit"), headers.get(f"{prefix}-Usage")
+                if not limits or not usages:
+                    continue
+
+                try:
+                    for (name, _, _), limit, usage in zip(windows, limits.split(','), usages.split(',')):
+                        self._windows[name].limit = int(limit)
+                        self._windows[name].usage = int(usage)
+                except ValueError:
+                    logger.warning("Malformed Strava rate limit headers: %s=%s, usage %s", prefix, limits, usages)
+
+            if status_code == 429:
+                self._throttled += 1
+                logger.warning("Strava rate limit exceeded: %s", self._usage_summary())
+
+    def throttled(self) -> RateLimitDeferred:
+        """Error to raise for a call Strava refused with 429, retried once the exhausted windows reset."""
+        with self._lock:
+            exhausted = [window for window in self._windows.values() if window.usage >= window.limit]
+            window = max(exhausted, key=lambda window: window.resets_at) if exhausted else self._windows["15min"]
+
+            # Without usage headers, assume the 15-minute window is spent
+            window.usage = max(window.usage, window.limit)
+            return RateLimitDeferred(window.name, window.resets_at)
+
+    def metrics(self) -> dict[str, Any]:
+        """Usage of the windows and counters of calls since the process started."""
+        now = datetime.now(timezone.utc)
+
+        with self._lock:
+            for window in self._windows.values():
+                window.roll(now)
+
+            return {
+                "windows": {
+                    window.name: {
+                        "limit": window.limit,
+                        "usage": window.usage,
+                        "remaining": max(window.limit - window.usage, 0),
+                        "resets_at": window.resets_at.isoformat()
+                    }
+                    for window in self._windows.values()
+                },
+                "sent": dict(self._sent),
+                "deferred": dict(self._deferred),
+                "throttled": self._throttled,
+                "low_priority_reserve": self.low_priority_reserve
+            }
+
+    def _usage_summary(self) -> str:
+        """Usage of all windows for logging."""
+        return ", ".join(f"{window.name} {window.usage}/{window.limit}" for window in self._windows.values())
@@ -1,12 +1,17 @@
 """Result Service for retrieving results of individual challenges."""
+from datetime import datetime, timedelta, timezone
 from typing import Any, Generator, Iterable
 
 from app.database import get_db_session, retry_db_operation
 from app.helpers import Gender
 from app.models.athlete import Athlete
+from app.models.best_effort import BestEffort
 from app.models.challenge import Challenge
 from app.models.effort import Effort
+from app.services.best_effort import EFFORT_COLUMNS, BestEffortRepository, rank_key
+from app.services.columnar import EffortColumns
 from config import config
+from sqlalchemy import case, func, select
 
 
 class ResultService:
@@ -18,8 +23,12 @@ class ResultService:
         self._segment_ids           : dict[str, int]                  = {}  # Maps segment type to segment ID
         self._challenge_efforts     : list[Effort]                    = []  # List of efforts for the challenge
         self._participating_athletes: list[tuple[int, str, str, str]] = []  # List of tuples containing athlete ID, first name, last
+        self._ranked_results        : dict[tuple[str, str], list] | None = None  # Rows ranked by the database (sql backend only)
+        self._columns               : EffortColumns | None            = None  # Columnar view of the efforts (numpy backend only)
 
         self._challenge_id = challenge_id
+        self._start_date   = None  # Start date of the challenge, known after querying the database
+        self._end_date     = None  # End date of the challenge, known after querying the database
         self.session = get_db_session()
 
     def populate(self, *,
@@ -45,6 +54,7 @@ class ResultService:
         }
         self._challenge_efforts = efforts
         self._participating_athletes = athletes
+        self._columns = None
 
     @retry_db_operation(max_retries=3, delay=1)
     def query_from_db(self) -> None:
@@ -55,6 +65,9 @@ class ResultService:
         2. Get all efforts for the challenge's segments within the time span.
         3. Get all athletes who have participated in the challenge.
 
+        When ``config.RESULTS_BACKEND`` is ``'sql'``, steps 2 and 3 are replaced by a single
+        query returning the final ranking, see ``_query_ranked_from_db``.
+
         Raises:
             ValueError: If the challenge is not found.
         """
@@ -67,16 +80,25 @@ class ResultService:
         if not challenge:
             raise ValueError("Challenge not found")
 
+        self._start_date = challenge.start_date
+        self._end_date = challenge.end_date
         self._segment_ids = {                   # type: ignore
             "climb": challenge.climb_segment_id,
             "sprint": challenge.sprint_segment_id
         }
 
-        self._challenge_efforts = self.session.query(Effort).filter(
-            Effort.segment_id.in_(self._segment_ids.values()),
-            Effort.start_date >= challenge.start_date,
-            Effort.start_date <= challenge.end_date
-        ).all()
+        if config.RESULTS_BACKEND == 'sql':
+            self._query_ranked_from_db(challenge)
+            return
+
+        if config.BEST_EFFORTS_ENABLED:
+            self._challenge_efforts = BestEffortRepository().get_by_challenge_id(challenge.id)  # type: ignore
+        else:
+            self._challenge_efforts = self.session.query(Effort).filter(
+                Effort.segment_id.in_(self._segment_ids.values()),
+                Effort.start_date >= challenge.start_date,
+                Effort.start_date <= challenge.end_date
+            ).all()
 
         if not self._challenge_efforts:
             return
@@ -86,6 +108,79 @@ class ResultService:
         ).filter(
             Athlete.id.in_({effort.athlete_id for effort in self._challenge_efforts})
         ).all()
+        self._columns = None
+
+    def _query_ranked_from_db(self, challenge: Challenge) -> None:
+        """Let the database select, rank and score the best efforts of the challenge.
+
+        The best effort per athlete and segment is picked with ``DISTINCT ON`` (or read from the
+        ``best_efforts`` table with ``BEST_EFFORTS_ENABLED``), then positions are
+        assigned with ``ROW_NUMBER`` partitioned by segment and gender, and points are mapped from
+        ``config.POINTS``. Only the final ranked rows are transferred.
+
+        Args:
+            challenge (Challenge): The challenge to rank.
+        """
+        if config.BEST_EFFORTS_ENABLED:
+            best_efforts = (
+                select(*EFFORT_COLUMNS, Athlete.firstname, Athlete.lastname, Athlete.sex)
+                .join(Athlete, Athlete.id == BestEffort.athlete_id)
+                .where(BestEffort.challenge_id == challenge.id, Athlete.sex.in_(Gender.values()))
+                .subquery()
+            )
+        else:
+            best_efforts = (
+                select(
+                    Effort.id, Effort.activity_id, Effort.athlete_id, Effort.segment_id,
+                    Effort.start_date, Effort.elapsed_time,
+                    Athlete.firstname, Athlete.lastname, Athlete.sex
+                )
+                .join(Athlete, Athlete.id == Effort.athlete_id)
+                .where(
+                    Effort.segment_id.in_(self._segment_ids.values()),
+                    Effort.start_date >= challenge.start_date,
+                    Effort.start_date <= challenge.end_date,
+                    Athlete.sex.in_(Gender.values())
+                )
+                .distinct(Effort.athlete_id, Effort.segment_id)
+                .order_by(Effort.athlete_id, Effort.segment_id, Effort.elapsed_time, Effort.start_date, Effort.id)
+                .subquery()
+            )
+
+        position = func.row_number().over(
+            partition_by = (best_efforts.c.segment_id, best_efforts.c.sex),
+            order_by     = (best_efforts.c.elapsed_time, best_efforts.c.start_date, best_efforts.c.id)
+        ).label("position")
+        ranked_efforts = select(best_efforts, position).subquery()
+
+        points = case(
+            {rank: awarded for rank, awarded in enumerate(self.points, start=1)},
+            value = ranked_efforts.c.position,
+            else_ = 0
+        ).label("points")
+
+        rows = self.session.execute(
+            select(ranked_efforts, points)
+            .order_by(ranked_efforts.c.segment_id, ranked_efforts.c.sex, ranked_efforts.c.position)
+        ).all()
+
+        self._ranked_results = {}
+        for segment_type, segment_id in self._segment_ids.items():
+            for gender in Gender:
+                self._ranked_results[(segment_type, gender)] = [
+                    row for row in rows if row.segment_id == segment_id and row.sex == gender
+                ]
+
+    @property
+    def is_completed(self) -> bool:
+        """Whether the challenge queried from the database has ended and no longer accepts late uploads."""
+        grace_period = timedelta(seconds=config.LATE_EFFORT_GRACE_PERIOD)
+        return self._end_date is not None and self._end_date + grace_period < datetime.now(timezone.utc)
+
+    @property
+    def is_active(self) -> bool:
+        """Whether the challenge queried from the database is currently running."""
+        return self._start_date is not None and self._start_date <= datetime.now(timezone.utc) <= self._end_date  # type: ignore
 
     @property
     def athlete_names(self) -> dict[int, str]:
@@ -102,7 +197,8 @@ class ResultService:
         """Filter the best efforts for each athlete and segment combination.
 
         This method ensures that for each athlete and segment, only the effort with the lowest elapsed time is kept.
-        It also sorts the results by elapsed time in ascending order.
+        It also sorts the results by elapsed time in ascending order. Equal times are ordered by the earlier
+        start, then by the effort ID, like in every results backend.
 
         Args:
             efforts (list[Effort]): List of Effort objects to filter.
@@ -114,10 +210,10 @@ class ResultService:
         best_efforts: dict[tuple[int, int], Effort] = {}
         for effort in efforts:
             key = (effort.athlete_id, effort.segment_id)
-            if key not in best_efforts or effort.elapsed_time < best_efforts[key].elapsed_time:  # type: ignore
+            if key not in best_efforts or rank_key(effort) < rank_key(best_efforts[key]):  # type: ignore
                 best_efforts[key] = effort  # type: ignore
 
-        return sorted(best_efforts.values(), key=lambda e: e.elapsed_time)  # type: ignore
+        return sorted(best_efforts.values(), key=rank_key)  # type: ignore
 
     def _get_best_efforts(self, segment_type: str, gender: Gender) -> list[Effort]:
         """A sorted list of best efforts for the specified segment type and gender."""
@@ -127,11 +223,74 @@ class ResultService:
         if gender not in Gender.values():
             raise ValueError(f"Invalid gender: {gender}. Must be {' or '.join(Gender.values())}.")
 
+        if config.RESULTS_BACKEND == 'numpy':
+            ranked = self._get_columns().rank(self._segment_ids[segment_type], gender)
+            return [self._challenge_efforts[i] for i in ranked]
+
         efforts_filter = ResultFilter(gender, segment_type, self)
         relevant_efforts = filter(efforts_filter, self._challenge_efforts)
 
         return self._filter_best_efforts(relevant_efforts)
 
+    def _get_columns(self) -> EffortColumns:
+        """Columnar view of the challenge efforts, built on first use."""
+        if self._columns is None:
+            self._columns = EffortColumns(self._challenge_efforts, self._participating_athletes)
+        return self._columns
+
+    def _get_best_efforts_by_gender(self, segment_type: str) -> dict[Gender, list[Effort]]:
+        """Sorted lists of best efforts for the specified segment type, one per gender.
+
+        The efforts are filtered and ranked once for all genders instead of once per gender.
+        """
+        if segment_type not in self._segment_ids:
+            raise ValueError("Invalid segment type. Must be 'climb' or 'sprint'.")
+
+        segment_id = self._segment_ids[segment_type]
+
+        if config.RESULTS_BACKEND == 'numpy':
+            columns = self._get_columns()
+            return {
+                gender: [self._challenge_efforts[i] for i in columns.rank(segment_id, gender)]
+                for gender in Gender
+            }
+
+        athlete_genders = self.athlete_genders
+
+        best_efforts: dict[Gender, list[Effort]] = {gender: [] for gender in Gender}
+        for effort in self._filter_best_efforts(e for e in self._challenge_efforts if e.segment_id == segment_id):  # type: ignore
+            if gender := athlete_genders.get(effort.athlete_id):  # type: ignore
+                best_efforts[gender].append(effort)
+
+        return best_efforts
+
+    def yield_simplified_results_by_gender(self, segment_type: str) -> Generator[tuple[Gender, int, int, int], None, None]:
+        """Yield simplified results for the specified segment type for all genders at once.
+
+        Args:
+            segment_type (str): The type of segment ('climb' or 'sprint').
+
+        Yields:
+            (Gender): Gender of the athlete,
+            (int): Athlete ID,
+            (int): Elapsed time,
+            (int): Points awarded for the position within the gender.
+        """
+        if self._ranked_results is not None:
+            for gender in Gender:
+                for row in self._ranked_results.get((segment_type, gender), []):
+                    yield gender, row.athlete_id, row.elapsed_time, row.points
+            return
+
+        for gender, best_efforts in self._get_best_efforts_by_gender(segment_type).items():
+            for i, effort in enumerate(best_efforts):
+                yield (                     # type: ignore
+                    gender,
+                    effort.athlete_id,
+                    effort.elapsed_time,
+                    self.points[i] if i < len(self.points) else 0
+                )
+
     def yield_simplified_results(self, segment_type: str, gender: Gender) -> Generator[tuple[int, int, int], None, None]:
         """Yield simplified results for the specified segment type and gender.
 
@@ -144,6 +303,11 @@ class ResultService:
             (int): Elapsed time,
             (int): Points awarded for the position.
         """
+        if self._ranked_results is not None:
+            for row in self._ranked_results.get((segment_type, gender), []):
+                yield row.athlete_id, row.elapsed_time, row.points
+            return
+
         best_efforts = self._get_best_efforts(segment_type, gender)
 
         for i, effort in enumerate(best_efforts):
@@ -163,6 +327,9 @@ class ResultService:
         Yields:
             dict[str, Any]: A dictionary containing the result data for each athlete.
         """
+        if self._ranked_results is not None:
+            yield from self._yield_ranked_results(segment_type, gender)
+            return
 
         best_efforts = self._get_best_efforts(segment_type, gender)
 
@@ -183,6 +350,27 @@ class ResultService:
             }
             yield result_dict
 
+    def _yield_ranked_results(self, segment_type: str, gender: Gender) -> Generator[dict[str, Any], None, None]:
+        """Yield results ranked by the database in the same format as ``yield_results``."""
+        if segment_type not in self._segment_ids:
+            raise ValueError("Invalid segment type. Must be 'climb' or 'sprint'.")
+
+        for row in self._ranked_results.get((segment_type, gender), []):  # type: ignore
+            yield {
+                "id": row.id,
+                "activity_id": row.activity_id,
+                "athlete_id": row.athlete_id,
+                "athlete_name": f"{row.firstname} {row.lastname}",
+                "athlete_gender": row.sex,
+                "challenge_id": self._challenge_id,
+                "segment_id": row.segment_id,
+                "segment_type": segment_type,
+                "time": row.elapsed_time,
+                "recorded_at": row.start_date.isoformat(),
+                "points": row.points,
+                "position": row.position
+            }
+
 
 class ResultFilter:
     """Filter results based on gender and segment id."""
@@ -1,10 +1,32 @@
-import requests
+"""Segment Repository for managing Strava segments in the database.
+
+Segment details (name, distance, elevation gain) do not change once stored, so they are kept
+in a process-wide cache keyed by segment ID. Only found segments are cached; entries are dropped
+explicitly with ``invalidate`` whenever a segment is written.
+"""
+import threading
+
+from typing import Any, Iterable
 
 from app.database import get_db_session, retry_db_operation
 from app.models.challenge import Challenge
 from app.models.segment import Segment
+from app.services import strava
 from app.services.athlete import AthleteRepository
-from config import config
+
+_cache_lock = threading.Lock()
+_cache: dict[int, dict[str, Any]] = {}  # Maps segment ID to the dictionary of the segment
+
+
+def invalidate(segment_ids: Iterable[int] | None = None) -> None:
+    """Drop the given segments from the cache, or all segments if none are given."""
+    with _cache_lock:
+        if segment_ids is None:
+            _cache.clear()
+            return
+
+        for segment_id in segment_ids:
+            _cache.pop(segment_id, None)
 
 
 class SegmentRepository:
@@ -37,6 +59,35 @@ class SegmentRepository:
         """Get segment by ID."""
         return self.session.query(Segment).filter_by(id=segment_id).first()
 
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_many(self, segment_ids: Iterable[int]) -> dict[int, dict[str, Any]]:
+        """Get segments by IDs, querying only those not cached yet, in a single query.
+
+        Args:
+            segment_ids (Iterable[int]): The IDs of the segments.
+
+        Returns:
+            dict[int, dict[str, Any]]: Maps segment ID to the segment in ``to_dict`` format, missing
+                segments are left out. The dictionaries are shared, copy them before modifying.
+        """
+        segment_ids = set(segment_ids)
+
+        with _cache_lock:
+            segments = {segment_id: _cache[segment_id] for segment_id in segment_ids if segment_id in _cache}
+
+        if missing := segment_ids - segments.keys():
+            queried = {
+                segment.id: self.to_dict(segment)
+                for segment in self.session.query(Segment).filter(Segment.id.in_(missing))
+            }
+
+            with _cache_lock:
+                _cache.update(queried)  # type: ignore
+
+            segments.update(queried)  # type: ignore
+
+        return segments
+
     def get_for_challenge(self, challenge: Challenge) -> tuple[Segment | None, Segment | None]:
         """Get segment details for a challenge."""
 
@@ -51,11 +102,7 @@ class SegmentRepository:
         athlete_repo = AthleteRepository()
         access_token = athlete_repo.get_access_token(17596625)  # TODO: Replace with admin athlete ID
 
-        response = requests.get(
-            url     = f"{config.STRAVA_API_URL}/segments/{segment_id}",
-            headers = {"Authorization": f"Bearer {access_token}"},
-            timeout = 100,
-            verify  = config.SSL_ENABLE)
+        response = strava.client.get_segment(segment_id, access_token)  # type: ignore
 
         if not response.ok:
             return None
@@ -79,6 +126,7 @@ class SegmentRepository:
             elevation_gain = elevation_gain
         )
         self.session.add(segment)
+        invalidate([segment.id])  # type: ignore
         return segment
 
     @staticmethod
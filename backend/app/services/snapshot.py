@@ -0,0 +1,77 @@
+"""Snapshot Repository for frozen results of completed challenges and seasons.
+
+Results of a challenge whose end date has passed, and the classification of a season whose
+year is over, do not change unless efforts are deleted. They are computed once, stored as
+JSON and served as-is until the efforts of the challenge change.
+"""
+import hashlib
+import json
+import logging
+
+from typing import Any
+
+from app.database import get_db_session, retry_db_operation
+from app.models.challenge import Challenge
+from app.models.snapshot import Snapshot
+from sqlalchemy.dialects.postgresql import insert
+
+logger = logging.getLogger(__name__)
+
+
+def challenge_results_key(challenge_id: int) -> str:
+    """Snapshot key of the results of a challenge."""
+    return f"challenge:{challenge_id}:results"
+
+
+def season_classification_key(year: int) -> str:
+    """Snapshot key of the classification of a season."""
+    return f"season:{year}:classification"
+
+
+class SnapshotRepository:
+    """Repository for managing Snapshot records in the database."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get(self, key: str) -> Snapshot | None:
+        """Get snapshot by key."""
+        return self.session.query(Snapshot).filter_by(key=key).first()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def save(self, key: str, payload: Any) -> Snapshot:
+        """Freeze the given JSON-serializable payload under the key.
+
+        If another request stored the same snapshot in the meantime, the existing one is kept.
+        """
+        serialized = json.dumps(payload, separators=(',', ':'))
+        snapshot = Snapshot(key=key, payload=serialized, etag=hashlib.sha256(serialized.encode()).hexdigest())
+
+        self.session.execute(
+            insert(Snapshot)
+            .values(key=snapshot.key, payload=snapshot.payload, etag=snapshot.etag)
+            .on_conflict_do_nothing(index_elements=[Snapshot.key])
+        )
+        logger.info("Snapshot %s frozen", key)
+
+        return snapshot
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def invalidate(self, challenges: list[Challenge]) -> int:
+        """Drop snapshots of the given challenges and of the seasons they belong to.
+
+        Returns:
+            int: Number of snapshots dropped.
+        """
+        keys = {challenge_results_key(challenge.id) for challenge in challenges}        # type: ignore
+        keys |= {season_classification_key(challenge.start_date.year) for challenge in challenges}  # type: ignore
+
+        if not keys:
+            return 0
+
+        deleted_count = self.session.query(Snapshot).filter(Snapshot.key.in_(keys)).delete(synchronize_session=False)
+        if deleted_count:
+            logger.info("Invalidated %d snapshot(s): %s", deleted_count, ", ".join(sorted(keys)))
+
+        return deleted_count
@@ -0,0 +1,247 @@
+"""Standings Repository for the materialized season classification.
+
+The general classification is persisted in two tables, so that reading it does not require
+ranking every challenge of the season again:
+
+- ``challenge_results`` holds the position and points of every ranked athlete per challenge
+  and segment type.
+- ``standings`` holds the season totals per athlete and category, computed from the rows above.
+
+Both are updated incrementally whenever efforts of a challenge change, touching only the
+athletes whose points in that challenge changed, once the season was materialized by its first
+refresh or by ``flask --app app rebuild-standings``. Like the computed classification, a season only
+counts the challenges lying entirely within it (see ``app.services.challenge.season_of``).
+"""
+import logging
+
+from collections import defaultdict
+from typing import Any
+
+from app.database import get_db_session, retry_db_operation
+from app.helpers import Gender
+from app.models.athlete import Athlete
+from app.models.challenge import Challenge
+from app.models.challenge_result import ChallengeResult
+from app.models.standing import Standing
+from app.services.challenge import ChallengeRepository, season_of
+from app.services.classification import ClassificationResults
+from app.services.results import ResultService
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("sprint", "climb")
+
+
+class StandingsRepository:
+    """Repository for maintaining and reading the materialized season standings."""
+
+    def __init__(self):
+        self.session = get_db_session()
+
+    def refresh_challenge(self, challenge: Challenge) -> None:
+        """Re-rank a single challenge and update the standings of athletes whose points changed.
+
+        Args:
+            challenge (Challenge): The challenge whose efforts changed.
+        """
+        if (season := season_of(challenge)) is None:
+            return
+
+        # Standings enabled in the middle of a season hold none of its earlier results yet
+        if not self.has_season(season):
+            self.rebuild(season)
+            return
+
+        changed = self._refresh_challenge_results(challenge, season)
+        self._refresh_standings(season, changed)
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def rebuild(self, season: int) -> int:
+        """Drop and recompute the materialized standings of a whole season.
+
+        Args:
+            season (int): The year of the season.
+
+        Returns:
+            int: Number of challenges ranked.
+        """
+        self.session.query(ChallengeResult).filter_by(season=season).delete()
+        self.session.query(Standing).filter_by(season=season).delete()
+
+        challenges = ChallengeRepository().get_by_year(season)
+        changed: set[tuple[str, int]] = set()
+
+        for challenge in challenges:
+            changed |= self._refresh_challenge_results(challenge, season)
+
+        self._refresh_standings(season, changed)
+        logger.info("Rebuilt standings of season %d from %d challenges", season, len(challenges))
+
+        return len(challenges)
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def has_season(self, season: int) -> bool:
+        """Whether standings of the season were materialized, e.g. not before its first rebuild."""
+        return self.session.query(self.session.query(Standing).filter_by(season=season).exists()).scalar()
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def get_classification(self, season: int, gender: Gender) -> list[dict[str, Any]]:
+        """Get the materialized classification of the given season and gender.
+
+        The output has the same format as ``ClassificationService.yield_classification``.
+        """
+        rows = self.session.query(
+            Standing, Athlete.firstname, Athlete.lastname
+        ).join(
+            Athlete, Athlete.id == Standing.athlete_id
+        ).filter(
+            Standing.season == season,
+            Standing.gender == gender
+        ).all()
+
+        classification: dict[int, dict[str, Any]] = {}
+        for standing, firstname, lastname in rows:
+            if (athlete_id := standing.athlete_id) not in classification:
+                classification[athlete_id] = {   # type: ignore
+                    "athlete_id": athlete_id,
+                    "athlete_name": f"{firstname} {lastname}",
+                    "gender": standing.gender,
+                    "total_sprint_points": 0,
+                    "total_climb_points": 0,
+                    "completed_sprints": 0,
+                    "completed_climbs": 0,
+                    "counted_sprints": 0,
+                    "counted_climbs": 0
+                }
+
+            athlete_data = classification[athlete_id]  # type: ignore
+            athlete_data[f"total_{standing.category}_points"] = standing.total_points
+            athlete_data[f"completed_{standing.category}s"] = standing.completed_count
+            athlete_data[f"counted_{standing.category}s"] = standing.counted_count
+
+        return list(classification.values())
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def _refresh_challenge_results(self, challenge: Challenge, season: int) -> set[tuple[str, int]]:
+        """Update the stored ranking of a challenge of the given season.
+
+        Only rows whose position or points differ from the stored ones are written.
+
+        Returns:
+            set[tuple[str, int]]: Pairs of category and athlete ID whose points changed.
+        """
+        result_service = ResultService(challenge.id)  # type: ignore
+        result_service.query_from_db()
+
+        ranking: dict[tuple[str, int], tuple[Gender, int, int]] = {}  # (category, athlete_id) -> (gender, position, points)
+        for category in CATEGORIES:
+            positions: dict[Gender, int] = defaultdict(int)
+            for gender, athlete_id, _, points in result_service.yield_simplified_results_by_gender(category):
+                positions[gender] += 1
+                ranking[(category, athlete_id)] = (gender, positions[gender], points)
+
+        stored = {
+            (row.segment_type, row.athlete_id): row
+            for row in self.session.query(ChallengeResult).filter_by(challenge_id=challenge.id)
+        }
+
+        removed = stored.keys() - ranking.keys()
+        changed: set[tuple[str, int]] = set(removed)
+        upserts = []
+
+        for key, (gender, position, points) in ranking.items():
+            if (row := stored.get(key)) and (row.gender, row.position, row.points) == (gender, position, points):
+                continue
+
+            if not row or (row.gender, row.points) != (gender, points):
+                changed.add(key)
+
+            upserts.append({
+                "challenge_id": challenge.id,
+                "segment_type": key[0],
+                "athlete_id": key[1],
+                "season": season,
+                "gender": gender,
+                "position": position,
+                "points": points
+            })
+
+        if removed:
+            self.session.query(ChallengeResult).filter(
+                ChallengeResult.challenge_id == challenge.id,
+                tuple_(ChallengeResult.segment_type, ChallengeResult.athlete_id).in_(list(removed))
+            ).delete(synchronize_session=False)
+
+        if upserts:
+            statement = insert(ChallengeResult).values(upserts)
+            self.session.execute(statement.on_conflict_do_update(
+                index_elements = [ChallengeResult.challenge_id, ChallengeResult.segment_type, ChallengeResult.athlete_id],
+                set_           = {
+                    "gender": statement.excluded.gender,
+                    "position": statement.excluded.position,
+                    "points": statement.excluded.points,
+                    "updated_at": func.now()
+                }
+            ))
+
+        return changed
+
+    @retry_db_operation(max_retries=3, delay=1)
+    def _refresh_standings(self, season: int, changed: set[tuple[str, int]]) -> None:
+        """Recompute the season totals of the given athletes from their stored challenge results.
+
+        Args:
+            season (int): The year of the season.
+            changed (set[tuple[str, int]]): Pairs of category and athlete ID to recompute.
+        """
+        athletes_by_category: dict[str, set[int]] = defaultdict(set)
+        for category, athlete_id in changed:
+            athletes_by_category[category].add(athlete_id)
+
+        for category, athlete_ids in athletes_by_category.items():
+            rows = self.session.query(
+                ChallengeResult.athlete_id, ChallengeResult.challenge_id, ChallengeResult.gender, ChallengeResult.points
+            ).filter(
+                ChallengeResult.season == season,
+                ChallengeResult.segment_type == category,
+                ChallengeResult.athlete_id.in_(athlete_ids)
+            ).all()
+
+            results: dict[int, ClassificationResults] = {}
+            genders: dict[int, str] = {}
+            for athlete_id, challenge_id, gender, points in rows:
+                results.setdefault(athlete_id, ClassificationResults(athlete_id)).add_result(challenge_id, category, points)
+                genders[athlete_id] = gender
+
+            if vanished := athlete_ids - results.keys():
+                self.session.query(Standing).filter(
+                    Standing.season == season,
+                    Standing.category == category,
+                    Standing.athlete_id.in_(vanished)
+                ).delete(synchronize_session=False)
+
+            if not results:
+                continue
+
+            statement = insert(Standing).values([{
+                "season": season,
+                "athlete_id": athlete_id,
+                "category": category,
+                "gender": genders[athlete_id],
+                "total_points": result.sprint_points if category == "sprint" else result.climb_points,
+                "completed_count": result.completed_sprints_count if category == "sprint" else result.completed_climbs_count,
+                "counted_count": result.counted_sprints_count if category == "sprint" else result.counted_climbs_count
+            } for athlete_id, result in results.items()])
+
+            self.session.execute(statement.on_conflict_do_update(
+                index_elements = [Standing.season, Standing.athlete_id, Standing.category],
+                set_           = {
+                    "gender": statement.excluded.gender,
+                    "total_points": statement.excluded.total_points,
+                    "completed_count": statement.excluded.completed_count,
+                    "counted_count": statement.excluded.counted_count,
+                    "updated_at": func.now()
+                }
+            ))
@@ -0,0 +1,120 @@
+"""Client for the Strava API and OAuth endpoints.
+
+All outbound Strava calls go through ``client``, which keeps a pool of persistent connections,
+so consecutive calls reuse TLS sessions instead of opening a new connection each time. Idempotent
+GET requests are retried on connection errors and 5xx responses. The base URLs are configurable,
+e.g. to point the application at a local stub server in tests. API calls are admitted by a
+``StravaRateLimiter`` (see ``app.services.rate_limit``) according to their priority.
+"""
+import requests
+
+from app.services.rate_limit import Priority, StravaRateLimiter
+from config import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class StravaClient:
+    """Pooled HTTP client for Strava."""
+
+    def __init__(self, api_url: str, oauth_url: str, pool_size: int, get_retries: int):
+        """Initialize the client.
+
+        Args:
+            api_url (str): Base URL of the Strava API, e.g. "https://www.strava.com/api/v3".
+            oauth_url (str): Base URL of the Strava OAuth endpoints, e.g. "https://www.strava.com/oauth".
+            pool_size (int): Maximum number of persistent connections kept per host.
+            get_retries (int): Number of retries of failed GET requests.
+        """
+        self.api_url = api_url.rstrip('/')
+        self.oauth_url = oauth_url.rstrip('/')
+        self.timeout = (config.STRAVA_CONNECT_TIMEOUT, config.STRAVA_READ_TIMEOUT)
+
+        retry = Retry(
+            total            = get_retries,
+            backoff_factor   = 0.5,
+            status_forcelist = (500, 502, 503, 504),
+            allowed_methods  = frozenset({'GET'}),  # POST requests are not idempotent
+            raise_on_status  = False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = config.SSL_ENABLE
+
+        self.rate_limiter = StravaRateLimiter(config.STRAVA_LOW_PRIORITY_RESERVE)
+
+    def get_activity(self, activity_id: int, access_token: str, priority: Priority = Priority.HIGH, stream: bool = False) -> requests.Response:
+        """Get an activity with all its segment efforts.
+
+        With ``stream`` the body is read while it is consumed, e.g. with ``iter_content``; the
+        response must then be closed to return its connection to the pool.
+        """
+        return self._get(f"/activities/{activity_id}", access_token, priority, params={"include_all_efforts": "true"}, stream=stream)
+
+    def list_activities(self, access_token: str, after: int, before: int, page: int, per_page: int, priority: Priority = Priority.LOW) -> requests.Response:
+        """List the summary activities of the athlete started between two epoch timestamps."""
+        params = {"after": after, "before": before, "page": page, "per_page": per_page}
+        return self._get("/athlete/activities", access_token, priority, params=params)
+
+    def get_segment(self, segment_id: int, access_token: str, priority: Priority = Priority.LOW) -> requests.Response:
+        """Get the details of a segment."""
+        return self._get(f"/segments/{segment_id}", access_token, priority)
+
+    def exchange_token(self, code: str) -> requests.Response:
+        """Exchange an OAuth authorization code for the tokens of an athlete."""
+        return self._post_token({'code': code, 'grant_type': 'authorization_code'})
+
+    def refresh_token(self, refresh_token: str) -> requests.Response:
+        """Get new tokens of an athlete with the refresh token."""
+        return self._post_token({'refresh_token': refresh_token, 'grant_type': 'refresh_token'})
+
+    def deauthorize(self, access_token: str) -> requests.Response:
+        """Revoke the access of the application to an athlete."""
+        return self.session.post(
+            url     = f"{self.oauth_url}/deauthorize",
+            headers = {"Authorization": f"Bearer {access_token}"},
+            timeout = self.timeout
+        )
+
+    def _get(self, path: str, access_token: str, priority: Priority, params: dict | None = None, stream: bool = False) -> requests.Response:
+        """Send an authorized GET request to the API.
+
+        Raises:
+            RateLimitDeferred: If the rate limit budget of the priority is spent, or Strava refused the call with 429.
+        """
+        self.rate_limiter.acquire(priority, read=True)
+
+        response = self.session.get(
+            url     = f"{self.api_url}{path}",
+            params  = params,
+            headers = {"Authorization": f"Bearer {access_token}"},
+            timeout = self.timeout,
+            stream  = stream
+        )
+
+        self.rate_limiter.update(response.status_code, response.headers)
+
+        if response.status_code == 429:
+            response.close()
+            raise self.rate_limiter.throttled()
+
+        return response
+
+    def _post_token(self, data: dict) -> requests.Response:
+        """Send a request to the OAuth token endpoint."""
+        return self.session.post(
+            url     = f"{self.oauth_url}/token",
+            data    = {'client_id': config.CLIENT_ID, 'client_secret': config.CLIENT_SECRET, **data},
+            timeout = self.timeout
+        )
+
+
+client = StravaClient(
+    api_url     = config.STRAVA_API_URL,
+    oauth_url   = config.STRAVA_OAUTH_URL,
+    pool_size   = config.STRAVA_POOL_SIZE,
+    get_retries = config.STRAVA_GET_RETRIES
+)
@@ -0,0 +1,249 @@
+"""Processing of Strava webhook events.
+
+Strava expects a webhook reply within about two seconds, while processing an event may fetch
+the activity from Strava, refresh tokens and write to the database. The webhook route therefore
+only validates an event and hands it to ``dispatcher``, a bounded pool of background workers which
+process it in an application context of their own, retrying failures with exponential backoff.
+Bursts of events of one activity are coalesced into their net event first. Queued events are
+drained when the process shuts down. With ``JOB_QUEUE_ENABLED`` events are
+instead stored in the durable job queue (see ``app.services.jobs``) and processed by workers.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from app.services.athlete import AthleteRepository
+from app.services.effort import EffortRepository
+from app.services.rate_limit import RateLimitDeferred
+from config import config
+from flask import Flask
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (SQLAlchemyError, requests.RequestException)
+
+
+class UnsupportedEvent(ValueError):
+    """Raised for webhook events the application does not handle."""
+
+
+def check_event(data: dict) -> None:
+    """Check the webhook event is one the application handles, without processing it.
+
+    Raises:
+        UnsupportedEvent: If the object or aspect type of the event is not supported.
+    """
+    object_type = data.get('object_type')
+    aspect_type = data.get('aspect_type')
+
+    if object_type == 'activity':
+        if aspect_type not in ('create', 'update', 'delete'):
+            raise UnsupportedEvent("Unsupported aspect type for activity")
+        return
+
+    if object_type == 'athlete':
+        if aspect_type != 'update':
+            raise UnsupportedEvent("Unsupported aspect type for athlete")
+        return
+
+    raise UnsupportedEvent("Unsupported object type")
+
+
+def dedup_key(data: dict) -> str:
+    """Key identifying a webhook event, equal for redeliveries of the same event."""
+    return f"webhook:{data.get('object_type')}:{data.get('object_id')}:{data.get('aspect_type')}:{data.get('event_time')}"
+
+
+def coalescing_key(data: dict) -> str | None:
+    """Key of the object whose events can be coalesced, None for events processed on their own."""
+    if data.get('object_type') == 'activity':
+        return f"activity:{data.get('object_id')}"
+    return None
+
+
+def net_event(events: list[dict]) -> dict | None:
+    """Collapse the events of one activity into the single event with the same net effect.
+
+    Only the last event adding (create, made public) or removing (delete, made private) the
+    efforts of the activity matters, as both are idempotent. Removing an activity which was
+    created within the same events is a no-op, as is any sequence of other updates.
+
+    Args:
+        events (list[dict]): Webhook events of one activity, in any order.
+
+    Returns:
+        dict | None: The event to process, None if nothing needs to be done.
+    """
+    events = sorted(events, key=lambda event: event.get('event_time') or 0)
+    net = None
+
+    for event in events:
+        aspect_type = event.get('aspect_type')
+        private = event.get('updates', {}).get('private')
+
+        if aspect_type in ('create', 'delete') or (aspect_type == 'update' and private in ("true", "false")):
+            net = event
+
+        if aspect_type == 'delete':
+            break  # Nothing can follow a deletion
+
+    if net is None:
+        return None
+
+    removes = net.get('aspect_type') == 'delete' or net.get('updates', {}).get('private') == "true"
+    if removes and events[0].get('aspect_type') == 'create':
+        return None
+
+    return net
+
+
+def handle_event(data: dict) -> tuple[str, int]:
+    """Process a webhook event. Must be called within an application context.
+
+    Args:
+        data (dict): The webhook event sent by Strava.
+
+    Returns:
+        tuple[str, int]: Message describing what was done and the matching HTTP status code.
+
+    Raises:
+        UnsupportedEvent: If the object or aspect type of the event is not supported.
+    """
+    check_event(data)
+
+    object_type = data.get('object_type')
+    aspect_type = data.get('aspect_type')
+    athlete_id = data.get('owner_id')
+    updates = data.get('updates', {})
+    effort_repo = EffortRepository()
+
+    # handle activity-related events
+    if object_type == 'activity':
+        activity_id = data.get('object_id')
+        private = updates.get('private', False)
+
+        if aspect_type == 'create' or (aspect_type == 'update' and private == "false"):
+            effort_added = effort_repo.add(activity_id, athlete_id)  # type: ignore
+
+            msg = f"New activity {activity_id} of athlete {athlete_id} registered. " if aspect_type == 'create' \
+                else f"Setting activity {activity_id} to public registered. "
+
+            if effort_added:
+                return msg + "Segment effort added to the database.", 201
+            return msg + "No segment effort was added.", 200
+
+        if aspect_type == 'update' and private == "true":
+            deleted_efforts = effort_repo.delete_efforts_by_activity_id(activity_id)  # type: ignore
+
+            msg = f"Setting activity {activity_id} to private registered. "
+            msg += f"{deleted_efforts} related efforts were deleted." if deleted_efforts else "No efforts to delete from leaderboard."
+            return msg, 200
+
+        if aspect_type == 'delete':
+            deleted_efforts = effort_repo.delete_efforts_by_activity_id(activity_id)  # type: ignore
+
+            msg = f"Deletion of activity {activity_id} registered."
+            msg += f"{deleted_efforts} efforts deleted." if deleted_efforts else "No efforts to delete."
+            return msg, 200
+
+        return f"Update of activity {activity_id} ignored.", 200
+
+    # handles the event of athlete deathorizating the application
+    if updates.get('authorized', False) == "false":
+        athlete_deleted = AthleteRepository().delete_by_id(athlete_id)  # type: ignore
+        deleted_efforts = effort_repo.delete_efforts_by_athlete_id(athlete_id)  # type: ignore
+
+        msg = f"Athlete {athlete_id} deauthorized the application. "
+        msg += "Athlete record deleted. " if athlete_deleted else "No athlete record to delete. "
+        msg += f"{deleted_efforts} his/her efforts deleted." if deleted_efforts else "No efforts to delete."
+        return msg, 200
+
+    return f"Update of athlete {athlete_id} ignored.", 200
+
+
+class EventDispatcher:
+    """Bounded pool of background workers processing webhook events.
+
+    Events of one activity arriving within ``WEBHOOK_COALESCE_WINDOW`` seconds of the first one
+    are collected and processed as their net event only.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+        self._lock = threading.Lock()
+        self._pending: dict[str, list[dict]] = {}  # Maps coalescing key to the events collected so far
+
+    def submit(self, flask_app: Flask, data: dict) -> None:
+        """Queue an event for processing in the background."""
+        if not config.WEBHOOK_COALESCE_WINDOW or (key := coalescing_key(data)) is None:
+            self._executor.submit(self._process, flask_app, data)
+            return
+
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(data)
+                return
+            self._pending[key] = [data]
+
+        threading.Timer(config.WEBHOOK_COALESCE_WINDOW, self._flush, (flask_app, key)).start()
+
+    def shutdown(self) -> None:
+        """Stop accepting events and wait until the queued ones are processed."""
+        logger.info("Draining webhook events before shutdown")
+        self._executor.shutdown(wait=True)
+
+    def _flush(self, flask_app: Flask, key: str) -> None:
+        """Queue the net event of the events collected for a key."""
+        with self._lock:
+            events = self._pending.pop(key)
+
+        if (event := net_event(events)) is None:
+            logger.info("Webhook events of %s cancel out, nothing to process", key)
+            return
+
+        try:
+            self._executor.submit(self._process, flask_app, event)
+        except RuntimeError:
+            self._process(flask_app, event)  # The pool is shutting down, process it here
+
+    @staticmethod
+    def _process(flask_app: Flask, data: dict) -> None:
+        """Process an event, retrying transient failures with exponential backoff."""
+        for attempt in range(1, config.WEBHOOK_MAX_RETRIES + 1):
+            try:
+                # Each attempt runs in its own context, so its session is committed or rolled back on exit
+                with flask_app.app_context():
+                    msg, _ = handle_event(data)
+                logger.info("Webhook event processed: %s", msg)
+                return
+
+            except RateLimitDeferred as e:
+                # Do not hold a worker until the rate limit window resets
+                delay = max((e.retry_at - datetime.now(timezone.utc)).total_seconds(), 1)
+                logger.warning("Webhook event processing deferred by %d s: %s", delay, e)
+                threading.Timer(delay, dispatcher.submit, (flask_app, data)).start()
+                return
+
+            except RETRYABLE_ERRORS as e:
+                if attempt == config.WEBHOOK_MAX_RETRIES:
+                    logger.error("Webhook event %s dropped after %d attempts: %s", data, attempt, e)
+                    return
+
+                delay = config.WEBHOOK_RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning("Webhook event processing failed (attempt %d), retrying in %d s: %s", attempt, delay, e)
+                time.sleep(delay)
+
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception("Webhook event %s could not be processed: %s", data, e)
+                return
+
+
+dispatcher = EventDispatcher(config.WEBHOOK_WORKERS)
+atexit.register(dispatcher.shutdown)
@@ -0,0 +1,164 @@
+"""Workers draining the durable job queue.
+
+Run them with ``flask --app app run-worker``. Every job is processed in an application context
+of its own, in which its handler and the removal of the job from the queue commit together. While
+the handler runs, a heartbeat renews the claim, so long jobs such as backfills are not claimed by
+another worker after the visibility timeout.
+"""
+import logging
+import signal
+import threading
+
+from typing import Any, Callable
+
+from app.services.jobs import BACKFILL_CHALLENGE, FETCH_SEGMENT, REFRESH_TOKEN, WEBHOOK_EVENT, WEBHOOK_EVENTS, ClaimedJob, JobRepository
+from app.services.rate_limit import RateLimitDeferred
+from config import config
+from flask import Flask, current_app
+
+logger = logging.getLogger(__name__)
+
+
+def _handle_webhook_event(payload: dict[str, Any]) -> None:
+    """Process a webhook event."""
+    from app.services.webhook import handle_event  # pylint: disable=import-outside-toplevel
+
+    msg, _ = handle_event(payload)
+    logger.info("Webhook event processed: %s", msg)
+
+
+def _handle_webhook_events(payload: dict[str, Any]) -> None:
+    """Process the net event of coalesced webhook events."""
+    from app.services.webhook import handle_event, net_event  # pylint: disable=import-outside-toplevel
+
+    if (event := net_event(payload['events'])) is None:
+        logger.info("%d coalesced webhook events cancel out, nothing to process", len(payload['events']))
+        return
+
+    msg, _ = handle_event(event)
+    logger.info("Webhook event processed from %d coalesced events: %s", len(payload['events']), msg)
+
+
+def _fetch_segment(payload: dict[str, Any]) -> None:
+    """Fetch a segment from Strava and store it."""
+    from app.services.segment import SegmentRepository  # pylint: disable=import-outside-toplevel
+
+    if SegmentRepository().create(payload['segment_id']) is None:
+        raise RuntimeError(f"Segment {payload['segment_id']} could not be fetched from Strava")
+
+
+def _refresh_token(payload: dict[str, Any]) -> None:
+    """Refresh the Strava tokens of an athlete if they are expired."""
+    from app.services.athlete import AthleteRepository  # pylint: disable=import-outside-toplevel
+
+    if AthleteRepository().get_access_token(payload['athlete_id']) is None:
+        raise RuntimeError(f"Tokens of athlete {payload['athlete_id']} could not be refreshed")
+
+
+def _backfill_challenge(payload: dict[str, Any]) -> None:
+    """Backfill the efforts of all athletes into a challenge, resumed later if the rate limit is reached."""
+    from app.services.backfill import ChallengeBackfill  # pylint: disable=import-outside-toplevel
+
+    result = ChallengeBackfill(current_app._get_current_object(), payload['challenge_id']).run()  # type: ignore # pylint: disable=protected-access
+    if result.deferred_until:
+        raise RateLimitDeferred("backfill", result.deferred_until)
+
+
+HANDLERS: dict[str, Callable[[dict[str, Any]], None]] = {
+    WEBHOOK_EVENT: _handle_webhook_event,
+    WEBHOOK_EVENTS: _handle_webhook_events,
+    FETCH_SEGMENT: _fetch_segment,
+    REFRESH_TOKEN: _refresh_token,
+    BACKFILL_CHALLENGE: _backfill_challenge
+}
+
+
+class JobWorker:
+    """Claims and processes jobs one at a time until stopped."""
+
+    def __init__(self, flask_app: Flask, stop: threading.Event):
+        self.flask_app = flask_app
+        self.stop = stop
+
+    def run(self) -> None:
+        """Process jobs, polling the queue while it is empty."""
+        while not self.stop.is_set():
+            try:
+                if not self.run_once():
+                    self.stop.wait(config.JOB_POLL_INTERVAL)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Job worker failed to access the queue: %s", e)
+                self.stop.wait(config.JOB_POLL_INTERVAL)
+
+    def run_once(self) -> bool:
+        """Claim and process a single job.
+
+        Returns:
+            bool: True if a job was processed, False if none was due.
+        """
+        with self.flask_app.app_context():
+            jobs = JobRepository().claim()
+
+        if not jobs:
+            return False
+
+        job = jobs[0]
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self.keep_claimed, args=(job, done), name=f"job-heartbeat-{job.id}", daemon=True)
+        heartbeat.start()
+        try:
+            with self.flask_app.app_context():
+                HANDLERS[job.kind](job.payload)
+                if not JobRepository().complete(job):
+                    logger.warning("Job %d (%s) finished after it was claimed again", job.id, job.kind)
+
+        except RateLimitDeferred as e:
+            logger.info("Job %d (%s) deferred: %s", job.id, job.kind, e)
+            with self.flask_app.app_context():
+                JobRepository().defer(job, e.retry_at)
+
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("Job %d (%s) failed on attempt %d: %s", job.id, job.kind, job.attempts, e)
+            with self.flask_app.app_context():
+                JobRepository().fail(job, f"{type(e).__name__}: {e}")
+
+        finally:
+            done.set()
+            heartbeat.join()
+
+        return True
+
+    def keep_claimed(self, job: ClaimedJob, done: threading.Event) -> None:
+        """Renew the claim of a job until its handler is done, or until the job was claimed again."""
+        while not done.wait(config.JOB_HEARTBEAT_INTERVAL):
+            try:
+                with self.flask_app.app_context():
+                    if not JobRepository().renew(job):
+                        logger.warning("Job %d (%s) was claimed again while running", job.id, job.kind)
+                        return
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Job %d (%s) claim could not be renewed: %s", job.id, job.kind, e)
+
+
+def run_workers(flask_app: Flask, concurrency: int) -> None:
+    """Run workers in threads until interrupted or terminated, then let them finish their current job."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    threads = [
+        threading.Thread(target=JobWorker(flask_app, stop).run, name=f"job-worker-{i}")
+        for i in range(concurrency)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    logger.info("Started %d job worker(s)", concurrency)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        logger.info("Stopping job workers after their current job")
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -5,13 +5,46 @@ import os
 
 class Config:
     """Base configuration"""
+    ADMIN_ATHLETE_ID = int(os.environ.get('ADMIN_ATHLETE_ID', 0))  # Athlete allowed to use admin endpoints, 0 for none
+    AUTH_SESSION_TTL = 60  # Seconds the profile of an authenticated athlete is cached before it is read again
     CLIENT_ID = os.environ.get('CLIENT_ID')
     CLIENT_SECRET = os.environ.get('CLIENT_SECRET')
     DATABASE_URL = os.environ.get('DATABASE_URL')
     STRAVA_VERIFY_TOKEN = os.environ.get('STRAVA_VERIFY_TOKEN')
-    STRAVA_API_URL = "https://www.strava.com/api/v3"
+    STRAVA_API_URL = os.environ.get('STRAVA_API_URL', "https://www.strava.com/api/v3")
+    STRAVA_OAUTH_URL = os.environ.get('STRAVA_OAUTH_URL', "https://www.strava.com/oauth")
+    STRAVA_POOL_SIZE = 10  # Persistent connections kept to Strava per process
+    STRAVA_CONNECT_TIMEOUT = 3.05  # Seconds to establish a connection to Strava
+    STRAVA_READ_TIMEOUT = 15  # Seconds to wait for a Strava response
+    STRAVA_GET_RETRIES = 2  # Retries of GET requests on connection errors and 5xx responses
+    STRAVA_LOW_PRIORITY_RESERVE = 0.2  # Share of every Strava rate limit window kept for webhook-driven calls
+    STRAVA_STREAM_CHUNK_SIZE = 65536  # Bytes read at a time when extracting segment efforts from an activity
     POINTS = [15, 12, 10, 8, 6, 4, 2, 1]  # Points for top 8 positions in a challenge
     MAX_COUNTED_RESULTS = 8  # Max number of results counted towards total classification
+    RESULTS_BACKEND = os.environ.get('RESULTS_BACKEND', 'python')  # 'python', 'sql' (ranking done by PostgreSQL) or 'numpy' (columnar)
+    BEST_EFFORTS_ENABLED = os.environ.get('BEST_EFFORTS_ENABLED', 'false').lower() == 'true'  # Keep and read only the best effort per challenge, segment and athlete
+    CHALLENGE_CALENDAR_TTL = 300  # Seconds before the in-memory challenge calendar is reloaded
+    BACKFILL_WORKERS = 8  # Athletes whose activities are backfilled concurrently
+    BACKFILL_PAGE_SIZE = 200  # Activities listed per Strava request during a backfill, at most 200
+    LATE_EFFORT_GRACE_PERIOD = 172800  # Seconds after a challenge ends during which late uploaded efforts are accepted
+    LIVE_LEADERBOARD_ENABLED = os.environ.get('LIVE_LEADERBOARD_ENABLED', 'true').lower() == 'true'  # Serve the active challenge from memory
+    MIGRATE_ON_STARTUP = os.environ.get('MIGRATE_ON_STARTUP', 'true').lower() == 'true'  # Apply pending migrations at startup, otherwise only check the schema version
+    SNAPSHOT_MAX_AGE = 86400  # Cache-Control max-age in seconds of frozen results of completed challenges and seasons
+    SSE_HEARTBEAT = 15  # Seconds between keep-alive comments on idle result streams
+    SSE_QUEUE_SIZE = 100  # Max pending events per streaming client before it is told to reload
+    SSE_RETRY = 5  # Seconds streaming clients wait before reconnecting
+    STANDINGS_ENABLED = os.environ.get('STANDINGS_ENABLED', 'false').lower() == 'true'  # Maintain and serve materialized season standings
+    WEBHOOK_ASYNC = os.environ.get('WEBHOOK_ASYNC', 'true').lower() == 'true'  # Acknowledge webhook events at once and process them in the background
+    WEBHOOK_WORKERS = 4  # Max webhook events processed concurrently per process
+    WEBHOOK_MAX_RETRIES = 3  # Attempts to process a webhook event before it is dropped
+    WEBHOOK_RETRY_DELAY = 2  # Seconds before the first retry of a webhook event, doubled on each further one
+    WEBHOOK_COALESCE_WINDOW = 10  # Seconds events of one activity are collected and collapsed into their net event, 0 to disable
+    JOB_QUEUE_ENABLED = os.environ.get('JOB_QUEUE_ENABLED', 'false').lower() == 'true'  # Store webhook events and segment fetches in the durable jobs table
+    JOB_VISIBILITY_TIMEOUT = 300  # Seconds a claimed job is hidden from other workers before it is retried
+    JOB_HEARTBEAT_INTERVAL = 60  # Seconds between renewals of the visibility timeout of a running job
+    JOB_MAX_ATTEMPTS = 5  # Attempts to process a job before it is dead-lettered
+    JOB_RETRY_DELAY = 10  # Seconds before the first retry of a job, doubled on each further one
+    JOB_POLL_INTERVAL = 1  # Seconds an idle worker waits before polling the queue again
     TOKEN_ENC_KEY = os.environ.get('TOKEN_ENC_KEY')  # Base64-encoded 32-byte key
 
     # Auth cookie configuration
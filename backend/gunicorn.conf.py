@@ -0,0 +1,36 @@
+"""Gunicorn settings, used with ``gunicorn -c gunicorn.conf.py run:app`` from the ``backend`` directory.
+
+The application is preloaded: the master process imports it once, checking or migrating the
+schema and building the live leaderboard, and forks the workers from it. Workers share the
+imported code and data copy-on-write and serve requests as soon as they are forked, so booting
+a worker or replacing workers on ``HUP`` makes no database round-trip.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')  # Asynchronous workers keep result streams open
+worker_connections = 1000
+preload_app = True
+
+if worker_class == 'gevent':
+    # Patch before the application is preloaded, so that the workers inherit cooperative locks and sockets
+    from gevent import monkey  # pylint: disable=import-outside-toplevel
+    from psycogreen.gevent import patch_psycopg  # pylint: disable=import-outside-toplevel
+
+    monkey.patch_all()
+    patch_psycopg()  # psycopg2 waits in C, queries and the LISTEN connection would otherwise block the whole worker
+
+
+def when_ready(server):  # pylint: disable=unused-argument
+    """Close the database connections opened by the master while loading the application."""
+    from app.database import engine  # pylint: disable=import-outside-toplevel
+
+    engine.dispose()
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Drop database connections inherited from the master without closing them, a worker opens its own."""
+    from app.database import engine  # pylint: disable=import-outside-toplevel
+
+    engine.dispose(close=False)